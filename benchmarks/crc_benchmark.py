@@ -0,0 +1,74 @@
+"""Compare the table-driven CRC in crc_util against the former bit-by-bit loop
+
+Run from the repository root: python -m benchmarks.crc_benchmark
+"""
+import os
+import timeit
+
+from modi2_firmware_updater.util.crc_util import calc_crc64, calc_page_crc
+
+
+def legacy_calc_crc32(data: bytes, crc: int) -> int:
+    crc ^= int.from_bytes(data, byteorder="little", signed=False)
+
+    for _ in range(32):
+        if crc & (1 << 31) != 0:
+            crc = (crc << 1) ^ 0x4C11DB7
+        else:
+            crc <<= 1
+        crc &= 0xFFFFFFFF
+
+    return crc
+
+
+def legacy_calc_crc64(data: bytes, checksum: int) -> int:
+    checksum = legacy_calc_crc32(data[:4], checksum)
+    checksum = legacy_calc_crc32(data[4:], checksum)
+    return checksum
+
+
+def legacy_page_crc(page: bytes, page_size: int) -> int:
+    checksum = 0
+    for curr_ptr in range(0, page_size, 8):
+        checksum = legacy_calc_crc64(page[curr_ptr: curr_ptr + 8], checksum)
+    return checksum
+
+
+def frame_page_crc(page: bytes, page_size: int) -> int:
+    checksum = 0
+    for curr_ptr in range(0, page_size, 8):
+        checksum = calc_crc64(page[curr_ptr: curr_ptr + 8], checksum)
+    return checksum
+
+
+def check_equivalence():
+    for length in list(range(0, 40)) + [0x3F9, 0x400, 0x7FB, 0x800]:
+        page = os.urandom(length)
+        page_size = max(0x400, (length + 7) // 8 * 8)
+        expected = legacy_page_crc(page, page_size)
+        assert frame_page_crc(page, page_size) == expected, length
+        assert calc_page_crc(page, page_size=page_size) == expected, length
+        assert calc_page_crc(page) == legacy_page_crc(page, (length + 7) // 8 * 8), length
+
+
+def main():
+    check_equivalence()
+    print("crc_util matches the legacy implementation")
+
+    for page_size in (0x400, 0x800):
+        page = os.urandom(page_size)
+        runs = 200
+        results = {
+            "legacy calc_crc64 per frame": timeit.timeit(lambda: legacy_page_crc(page, page_size), number=runs),
+            "calc_crc64 per frame": timeit.timeit(lambda: frame_page_crc(page, page_size), number=runs),
+            "calc_page_crc": timeit.timeit(lambda: calc_page_crc(page, page_size=page_size), number=runs),
+        }
+        baseline = results["legacy calc_crc64 per frame"]
+        print(f"\npage size: {page_size} bytes")
+        for name, elapsed in results.items():
+            per_page = elapsed / runs * 1e6
+            print(f"  {name:<28} {per_page:10.1f} us/page  x{baseline / elapsed:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
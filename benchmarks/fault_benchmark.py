@@ -0,0 +1,211 @@
+"""Cost of the retry paths, under faults injected between the updaters and simulated networks
+
+The module and network updaters run over ports wrapped in a FaultInjectingPort
+(see fault_util), against the virtual networks of network_simulator, once per
+fault scenario. The ports are wrapped from here as the updaters open them, the
+updaters know nothing of the faults. Each run reports:
+
+- wall time, and its increase over the run without faults
+- time spent in the erase, crc and end_flash phases, retries included
+- retries and exhausted budgets of each RetryPolicy operation
+- faults actually injected, and how many ports ended up at the new version
+
+The ESP32 updater speaks SLIP and is not covered.
+
+Run from the repository root:
+
+    python -m benchmarks.fault_benchmark --output faults.json
+    python -m benchmarks.fault_benchmark --scenarios none,crc_error --updaters module --retry-budgets crc=5:0.02
+"""
+import argparse
+import json
+import multiprocessing as mp
+import tempfile
+import threading as th
+import time
+from contextlib import contextmanager
+
+from benchmarks.scaling_benchmark import quiet_stdout, serve_networks, write_firmware_tree
+from modi2_firmware_updater.core.module_updater import ModuleFirmwareMultiUpdater
+from modi2_firmware_updater.core.network_updater import NetworkFirmwareMultiUpdater
+from modi2_firmware_updater.util.fault_util import FaultInjectingPort, FaultInjection
+from modi2_firmware_updater.util.modi_winusb.modi_serialport import ModiSerialPort
+
+UPDATERS = ("module", "network")
+
+# FaultInjection settings of each scenario, at rates that let most updates through. A page goes out
+# as about 256 data frames, so a frame level rate of 1% already fails nearly every page attempt
+SCENARIOS = {
+    "none": {},
+    "drop": {"drop_rate": 0.001},
+    "corrupt": {"corrupt_rate": 0.001},
+    "duplicate": {"duplicate_rate": 0.05},
+    "delay": {"delay_rate": 0.2, "delay": 0.05},
+    "stall": {"stall_rate": 0.05, "stall_time": 0.5},
+    "crc_error": {"crc_error_rate": 0.2},
+    "erase_error": {"erase_error_rate": 0.2},
+}
+
+RETRY_PHASES = ("erase", "crc", "end_flash")
+
+
+def parse_retry_budgets(value: str) -> dict:
+    # "crc=5:0.02,erase=4:0.01" to RetryPolicy budgets
+    retry_budgets = dict()
+    for budget in value.split(","):
+        if not budget:
+            continue
+        operation, attempts_delay = budget.split("=")
+        attempts, base_delay = attempts_delay.split(":")
+        retry_budgets[operation] = (int(attempts), float(base_delay))
+    return retry_budgets
+
+
+@contextmanager
+def inject_faults(fault_injection: FaultInjection):
+    # Wrap the serial port of every ModiSerialPort opened (or reopened) in this process, each port drawing its own faults
+    open_port = ModiSerialPort.open
+
+    def open_faulty_port(serial_port, port):
+        open_port(serial_port, port)
+        serial_port.serial_port = FaultInjectingPort(serial_port.serial_port, fault_injection.for_port(port))
+
+    ModiSerialPort.open = open_faulty_port
+    try:
+        yield
+    finally:
+        ModiSerialPort.open = open_port
+
+
+def run(updater_kind: str, scenario: str, firmware_path: str, firmware_version_info: dict, module_types: list, args) -> dict:
+    context = mp.get_context("spawn")
+    parent_connection, child_connection = context.Pipe()
+    network_options = {"latency": args.latency, "erase_time": args.erase_time, "crc_time": args.crc_time}
+    simulator = context.Process(
+        target=serve_networks,
+        args=(child_connection, args.ports, module_types, args.network_type, network_options),
+        daemon=True,
+    )
+    simulator.start()
+    ports = parent_connection.recv()
+
+    records = []
+
+    def on_signal(signal_name, index, signal_args):
+        if signal_name == "metrics_signal":
+            records.append(signal_args[0])
+
+    fault_injection = FaultInjection(seed=args.seed, **SCENARIOS[scenario])
+    updater_class = ModuleFirmwareMultiUpdater if updater_kind == "module" else NetworkFirmwareMultiUpdater
+    updater = updater_class(firmware_path)
+    updater.set_retry_budgets(args.retry_budgets)
+    updater.set_signal_callback(on_signal)
+
+    with quiet_stdout(not args.verbose), inject_faults(fault_injection):
+        init_wall = time.perf_counter()
+        update_thread = th.Thread(target=updater.update_module_firmware, args=(ports, firmware_version_info), daemon=True)
+        update_thread.start()
+        update_thread.join(args.timeout)
+        wall = time.perf_counter() - init_wall
+    timed_out = update_thread.is_alive()
+
+    parent_connection.send("stop")
+    simulator_result = parent_connection.recv()
+    simulator.join()
+
+    updated = simulator_result["modules_updated" if updater_kind == "module" else "network_updated"]
+    phase_seconds = {phase: 0.0 for phase in RETRY_PHASES}
+    retries = dict()
+    for record in records:
+        for phase in record["phases"]:
+            if phase["phase"] in phase_seconds:
+                phase_seconds[phase["phase"]] += phase["seconds"]
+        for operation, counters in record["retries"].items():
+            operation_retries = retries.setdefault(operation, {"retries": 0, "exhausted": 0})
+            operation_retries["retries"] += counters["retries"]
+            operation_retries["exhausted"] += counters["exhausted"]
+    return {
+        "updater": updater_kind,
+        "scenario": scenario,
+        "fault_settings": SCENARIOS[scenario],
+        "ports": args.ports,
+        "timed_out": timed_out,
+        "updated_ports": sum(updated),
+        "wall_seconds": round(wall, 3),
+        "phase_seconds": {phase: round(seconds, 3) for phase, seconds in phase_seconds.items()},
+        "retries": retries,
+        "faults": fault_injection.snapshot(),
+    }
+
+
+def print_header() -> None:
+    print(
+        f"{'updater':<8} {'scenario':<12} {'updated':>8} {'wall (s)':>9} {'vs none':>8} "
+        + " ".join(f"{phase + ' (s)':>13}" for phase in RETRY_PHASES)
+        + f" {'retries':>8} {'exhausted':>9} {'faults':>7}"
+    )
+
+
+def print_result(result: dict, baseline: dict = None) -> None:
+    updated = f"{result['updated_ports']}/{result['ports']}" + ("!" if result["timed_out"] else "")
+    change = f"{'-':>8}"
+    if baseline and baseline["wall_seconds"]:
+        change = f"{(result['wall_seconds'] / baseline['wall_seconds'] - 1) * 100:+7.1f}%"
+    retry_num = sum(counters["retries"] for counters in result["retries"].values())
+    exhausted_num = sum(counters["exhausted"] for counters in result["retries"].values())
+    print(
+        f"{result['updater']:<8} {result['scenario']:<12} {updated:>8} {result['wall_seconds']:9.2f} {change} "
+        + " ".join(f"{result['phase_seconds'][phase]:13.3f}" for phase in RETRY_PHASES)
+        + f" {retry_num:8d} {exhausted_num:9d} {sum(result['faults'].values()):7d}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of the retry paths of the updaters under injected faults")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma separated scenarios to run: " + ", ".join(SCENARIOS))
+    parser.add_argument("--updaters", default=",".join(UPDATERS), help="Comma separated updaters to run: " + ", ".join(UPDATERS))
+    parser.add_argument("--ports", type=int, default=1, help="Simulated networks updated at once")
+    parser.add_argument("--modules", default="button,led", help="Comma separated module types of each network")
+    parser.add_argument("--network-type", default="network", choices=("network", "camera"))
+    parser.add_argument("--firmware-size", type=lambda value: int(value, 0), default=0x4000, help="Bytes of each module firmware")
+    parser.add_argument("--retry-budgets", type=parse_retry_budgets, default=None, help="RetryPolicy budgets to try, as operation=attempts:base_delay,...")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the injected faults")
+    parser.add_argument("--latency", type=float, default=0.002)
+    parser.add_argument("--erase-time", type=float, default=0.02)
+    parser.add_argument("--crc-time", type=float, default=0.005)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds a run may take before it is abandoned")
+    parser.add_argument("--output", help="Save the results to this json file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the output of the updaters")
+    args = parser.parse_args()
+
+    scenarios = [scenario for scenario in args.scenarios.split(",") if scenario]
+    updater_kinds = [updater_kind for updater_kind in args.updaters.split(",") if updater_kind]
+    module_types = [module_type for module_type in args.modules.split(",") if module_type]
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario: {scenario}")
+    for updater_kind in updater_kinds:
+        if updater_kind not in UPDATERS:
+            parser.error(f"unknown updater: {updater_kind}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as firmware_path:
+        # The esp32 firmwares are not flashed here, keep them small
+        firmware_version_info = write_firmware_tree(firmware_path, module_types, args.firmware_size, 0x100)
+        print_header()
+        for updater_kind in updater_kinds:
+            baseline = None
+            for scenario in scenarios:
+                result = run(updater_kind, scenario, firmware_path, firmware_version_info, module_types, args)
+                if scenario == "none":
+                    baseline = result
+                print_result(result, baseline)
+                results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"run": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args), "results": results}, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
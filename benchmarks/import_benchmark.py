@@ -0,0 +1,94 @@
+"""Import time of the updater modules, each in a fresh interpreter
+
+Every module is imported in its own python -X importtime process, several
+times, and the median is reported: the time of the module's own body and the
+time including everything it imports. The .pyc files are compiled first,
+as an installed or frozen updater would have them.
+
+Results can be saved as json and compared against a saved run:
+
+    python -m benchmarks.import_benchmark --output baseline.json
+    python -m benchmarks.import_benchmark --baseline baseline.json
+
+Run from the repository root.
+"""
+import argparse
+import compileall
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = (
+    "modi2_firmware_updater.core.esp32_updater",
+    "modi2_firmware_updater.core.module_updater",
+    "modi2_firmware_updater.core.network_updater",
+    "modi2_firmware_updater.headless_updater",
+)
+
+
+def import_time(module: str) -> tuple:
+    # (self, cumulative) milliseconds of the module, as -X importtime reports them
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    ).stderr
+    for line in output.splitlines():
+        fields = line.split("|")
+        if line.startswith("import time:") and fields[2].strip() == module:
+            return int(fields[0].split(":")[1]) / 1000, int(fields[1]) / 1000
+    raise RuntimeError(f"{module} was not imported")
+
+
+def run(runs: int) -> dict:
+    compileall.compile_dir(os.path.join(os.path.dirname(__file__), "..", "modi2_firmware_updater"), quiet=1)
+    results = dict()
+    for module in MODULES:
+        timings = [import_time(module) for _ in range(runs)]
+        results[module] = {
+            "self_ms": round(statistics.median(self_ms for self_ms, _ in timings), 2),
+            "cumulative_ms": round(statistics.median(cumulative_ms for _, cumulative_ms in timings), 2),
+        }
+    return results
+
+
+def print_results(results: dict, baseline: dict = None):
+    header = f"{'module':<44} {'self (ms)':>10} {'total (ms)':>11}"
+    if baseline:
+        header += f" {'vs baseline':>12}"
+    print(header)
+    for module, result in results.items():
+        line = f"{module:<44} {result['self_ms']:10.2f} {result['cumulative_ms']:11.2f}"
+        if baseline:
+            base_result = baseline.get(module)
+            if base_result:
+                change = result["cumulative_ms"] / base_result["cumulative_ms"] - 1
+                line += f" {change * 100:+11.1f}%"
+            else:
+                line += f" {'new':>12}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of the MODI+ updater modules")
+    parser.add_argument("--output", help="Save the results to this json file")
+    parser.add_argument("--baseline", help="Compare against the results saved in this json file")
+    parser.add_argument("--runs", type=int, default=20, help="Imports of each module, the median is kept")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    results = run(args.runs)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"run": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0], "results": results}, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
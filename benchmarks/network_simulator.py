@@ -0,0 +1,674 @@
+"""Virtual MODI+ networks on Linux pseudo-terminals
+
+Each VirtualNetwork opens a pty pair and plays a network module and its
+modules on the master side, speaking the json protocol of the updaters:
+id requests (0x28, 0x08) are answered with 0x05, modules in their bootloader
+send 0x0A warnings with their update section and bootloader version, and
+erase, data and crc commands (0x0D, 0x0B) work on a flash image of each
+module, the crc being checked against what was actually written. End-flash
+data sets the version a module reports once it reboots.
+
+Asked for its usb mode (0x2B), the network hands the port to its ESP32,
+which answers esptool as a ROM loader and then as the flasher stub until
+its flashing ends. Every network also records the latency of each page it
+is flashed: for the modules, from the first erase or data frame of a page
+to its crc response; for the ESP32, from the ack of one flash block to the
+ack of the next.
+
+The slave side is a plain serial device, ModiSerialPort opens it directly:
+
+    with VirtualNetwork([VirtualModule("button"), VirtualModule("led")]) as network:
+        updater = ModuleFirmwareUpdater(device=network.port, module_firmware_path=...)
+
+Run from the repository root: python -m benchmarks.network_simulator --modules button,led
+"""
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import select
+import struct
+import threading as th
+import time
+import tty
+import zlib
+from base64 import b64decode, b64encode
+
+from modi2_firmware_updater.core.esp32_updater import ESP32ROM, ESP32S3ROM, ESPLoader
+from modi2_firmware_updater.util.crc_util import calc_page_crc
+from modi2_firmware_updater.util.firmware_util import FLASH_MEMORY_ADDRESS, get_flash_layout, get_module_mcu, get_version_value
+from modi2_firmware_updater.util.modi_winusb.modi_serialport import pop_frame
+from modi2_firmware_updater.util.module_util import Module, get_module_uuid_from_type
+
+BROADCAST_ID = 0xFFF
+
+# Firmware states of the 0x0C message, as in ModuleFirmwareUpdater
+CRC_ERROR = 4
+CRC_COMPLETE = 5
+ERASE_ERROR = 6
+ERASE_COMPLETE = 7
+
+# Update sections reported in the warnings, as in ModuleFirmwareUpdater
+SECTION_APPLICATION = 0
+SECTION_BOOTLOADER = 1
+SECTION_SECOND_BOOTLOADER = 2
+SECTION_DONE = 3
+
+FLASH_SIZES = {"e230": 0x10000, "e103": 0x20000}
+# Flash erased by one unit of the erase command
+ERASE_UNIT_SIZE = 0x400
+
+# JEDEC id read from the SPI flash of the ESP32: GigaDevice, 4MB
+ESP32_FLASH_ID = 0x1640C8
+
+# uuids of the generated modules, unique over every network of the process
+__uuid_serials = itertools.count(0x101)
+
+
+def next_uuid(module_type: str) -> int:
+    # network has no type code of its own, any unknown one reads as a network module
+    type_code = get_module_uuid_from_type(module_type)
+    type_code = 0 if type_code == "network" else type_code
+    return type_code << 32 | 0x5A000000 | next(__uuid_serials)
+
+
+class VirtualModule:
+    """A module of a virtual network, with the flash of its MCU
+
+    :param module_type: "button", "led", ..., "network" or "camera" for the network module itself
+    :param uuid: Uuid of the module, a fresh one of module_type if None
+    :param app_version: Application version the module starts with
+    :param boot_version: Bootloader version reported in the warnings
+    :param new_boot_version: Bootloader version reported once the bootloader is rewritten, boot_version if None
+    :param section: Update section reported in the warnings, see SECTION_*
+    :param max_erase_units: Erase units one erase command may cover, any number if None
+    """
+
+    def __init__(
+        self, module_type: str, uuid: int = None, app_version: str = "v1.0.0", boot_version: str = "v1.0.0",
+        new_boot_version: str = None, section: int = SECTION_APPLICATION, max_erase_units: int = None
+    ):
+        self.type = module_type
+        self.uuid = uuid if uuid is not None else next_uuid(module_type)
+        self.id = self.uuid & 0xFFF
+        self.boot_version = get_version_value(boot_version)
+        self.new_boot_version = get_version_value(new_boot_version or boot_version)
+        self.section = section
+        self.max_erase_units = max_erase_units
+
+        self.layout = get_flash_layout(module_type, "app")
+        self.flash = bytearray(b"\xFF" * FLASH_SIZES[get_module_mcu(module_type)])
+        # data frames received since the last erase or crc command, written by the crc command
+        self.page_buffer = bytearray()
+        # when the first command of the page being flashed came in, None between pages
+        self.page_begin = None
+
+        self.in_bootloader = False
+        self.ready = False
+        # warnings are sent from the update request until the first firmware command
+        self.warning = False
+        self.rebooting_until = 0.0
+
+        self.erase_num = 0
+        self.crc_num = 0
+        self.crc_error_num = 0
+        self.data_frame_num = 0
+
+        end_flash_data = bytearray(16)
+        end_flash_data[0] = 0xAA
+        self.__version_field(end_flash_data)[:] = get_version_value(app_version).to_bytes(2, "little")
+        self.__program(self.layout.end_flash_address, end_flash_data)
+
+    @property
+    def is_network(self) -> bool:
+        return self.type in ("network", "camera")
+
+    @property
+    def version(self) -> int:
+        # Application version held in the end-flash page
+        end_flash = self.__flash_slice(self.layout.end_flash_address, 16)
+        return int.from_bytes(self.__version_field(end_flash), "little")
+
+    def __version_field(self, end_flash_data):
+        # network and camera end-flash data keep their version where the modules keep their os version
+        return memoryview(end_flash_data)[6:8] if self.is_network else memoryview(end_flash_data)[8:10]
+
+    def __offset(self, address: int, length: int):
+        offset = address - FLASH_MEMORY_ADDRESS
+        if offset < 0 or offset + length > len(self.flash):
+            return None
+        return offset
+
+    def __flash_slice(self, address: int, length: int) -> bytearray:
+        offset = self.__offset(address, length)
+        return self.flash[offset:offset + length]
+
+    def __program(self, address: int, data: bytes) -> bool:
+        # Flash programming only clears bits, a page written without an erase holds garbage
+        offset = self.__offset(address, len(data))
+        if offset is None:
+            return False
+        for index, byte in enumerate(data):
+            self.flash[offset + index] &= byte
+        return True
+
+    def erase(self, address: int, unit_num: int) -> bool:
+        self.warning = False
+        self.page_buffer.clear()
+        self.erase_num += 1
+        if unit_num < 1 or (self.max_erase_units is not None and unit_num > self.max_erase_units):
+            return False
+        offset = self.__offset(address, unit_num * ERASE_UNIT_SIZE)
+        if offset is None:
+            return False
+        self.flash[offset:offset + unit_num * ERASE_UNIT_SIZE] = b"\xFF" * (unit_num * ERASE_UNIT_SIZE)
+        return True
+
+    def write_data(self, seq_num: int, data: bytes) -> None:
+        self.data_frame_num += 1
+        data_begin = seq_num * 8
+        if len(self.page_buffer) < data_begin + len(data):
+            self.page_buffer.extend(b"\xFF" * (data_begin + len(data) - len(self.page_buffer)))
+        self.page_buffer[data_begin:data_begin + len(data)] = data
+
+    def check_crc(self, address: int, checksum: int) -> bool:
+        """Write the data received since the last command at address, then check its crc
+
+        Without data the crc of the page at address is checked, as the delta mode does.
+        """
+        self.warning = False
+        self.crc_num += 1
+        written = bool(self.page_buffer)
+        length = len(self.page_buffer) if written else self.layout.page_size
+        if written and not self.__program(address, self.page_buffer):
+            self.page_buffer.clear()
+            self.crc_error_num += 1
+            return False
+        self.page_buffer.clear()
+        if self.__offset(address, length) is None:
+            self.crc_error_num += 1
+            return False
+
+        matching = calc_page_crc(bytes(self.__flash_slice(address, length))) == checksum
+        if not matching:
+            self.crc_error_num += 1
+        elif written and address == self.layout.end_flash_address:
+            self.__end_flash_written()
+        return matching
+
+    def __end_flash_written(self) -> None:
+        # The end-flash data tells the section just written, the next one is asked for after it
+        end_flash = self.__flash_slice(self.layout.end_flash_address, 16)
+        if end_flash[0] != 0xAA:
+            return
+        if self.is_network:
+            self.section = SECTION_DONE
+        elif int.from_bytes(end_flash[12:16], "little") == get_flash_layout(self.type, "bootloader").boot_address:
+            self.boot_version = self.new_boot_version
+            self.section = SECTION_APPLICATION
+        elif not int.from_bytes(end_flash[6:10], "little"):
+            # the second bootloader is written without any version
+            self.section = SECTION_BOOTLOADER
+        else:
+            self.section = SECTION_DONE
+
+    def request_update(self) -> None:
+        self.in_bootloader = True
+        self.ready = False
+        self.warning = True
+        if self.section == SECTION_DONE:
+            self.section = SECTION_APPLICATION
+
+    def reboot(self) -> None:
+        # A module back from a bootloader section stays in its bootloader for the next one
+        self.page_buffer.clear()
+        self.page_begin = None
+        self.warning = False
+        if self.section == SECTION_DONE:
+            self.in_bootloader = False
+            self.ready = False
+
+    def warning_data(self) -> bytes:
+        warning_type = 2 if self.ready else 1
+        return self.uuid.to_bytes(6, "little") + bytes((warning_type, self.section)) + self.boot_version.to_bytes(2, "little")
+
+    def id_data(self) -> bytes:
+        return self.uuid.to_bytes(6, "little") + self.version.to_bytes(2, "little")
+
+
+class VirtualEsp32:
+    """The ESP32 of a network or camera module, as esptool sees it
+
+    It starts as the ROM loader, runs the flasher stub once esptool has
+    loaded it, and keeps what is written to its flash for the md5 checks.
+    Register writes are ignored and reads return 0, so SPI flash commands
+    complete at once, except for the chip magic value and the flash id.
+
+    :param chip_class: ESP32ROM, or ESP32S3ROM for the camera module
+    """
+
+    def __init__(self, chip_class=ESP32ROM):
+        self.chip_class = chip_class
+        self.registers = {
+            ESPLoader.CHIP_DETECT_MAGIC_REG_ADDR: chip_class.CHIP_DETECT_MAGIC_VALUE[0],
+            chip_class.SPI_REG_BASE + chip_class.SPI_W0_OFFS: ESP32_FLASH_ID,
+        }
+        # address written by each flash begin to the data written there
+        self.flash = dict()
+        self.app_version = None
+        self.ota_version = None
+        self.reset()
+
+    def reset(self) -> None:
+        # Back to the ROM loader
+        self.stub = False
+        self.flash_region = None
+        self.decompressor = None
+        self.block_num = 0
+
+    def command(self, op: int, data: bytes):
+        """Run one esptool command
+
+        :return: (value, result data, error code) of the response, error code 0 on success
+        """
+        if op == ESPLoader.ESP_SYNC:
+            return 0 if self.stub else 0x20120707, b"", 0
+        if op == ESPLoader.ESP_READ_REG and len(data) >= 4:
+            return self.registers.get(struct.unpack("<I", data[:4])[0], 0), b"", 0
+        if op == ESPLoader.ESP_GET_SECURITY_INFO:
+            if self.chip_class is ESP32ROM:
+                return 0, b"", ESPLoader.ROM_INVALID_RECV_MSG
+            return 0, struct.pack("<IBBBBBBBBII", 0, 0, 0, 0, 0, 0, 0, 0, 0, self.chip_class.IMAGE_CHIP_ID, 1), 0
+        if op in (ESPLoader.ESP_FLASH_BEGIN, ESPLoader.ESP_FLASH_DEFL_BEGIN) and len(data) >= 16:
+            size, _, _, offset = struct.unpack("<IIII", data[:16])
+            self.flash_region = None
+            if size:
+                self.flash_region = self.flash[offset] = bytearray()
+                self.decompressor = zlib.decompressobj() if op == ESPLoader.ESP_FLASH_DEFL_BEGIN else None
+            return 0, b"", 0
+        if op in (ESPLoader.ESP_FLASH_DATA, ESPLoader.ESP_FLASH_DEFL_DATA) and len(data) >= 16:
+            if self.flash_region is None:
+                return 0, b"", 0x02
+            block = data[16:16 + struct.unpack("<I", data[:4])[0]]
+            try:
+                self.flash_region += self.decompressor.decompress(block) if self.decompressor else block
+            except zlib.error:
+                return 0, b"", 0x03
+            self.block_num += 1
+            return 0, b"", 0
+        if op == ESPLoader.ESP_SPI_FLASH_MD5 and len(data) >= 8:
+            address, size = struct.unpack("<II", data[:8])
+            written = bytes(self.flash.get(address, b""))[:size]
+            digest = hashlib.md5(written + b"\xFF" * (size - len(written)))
+            # the stub sends the digest, the ROM loader its hex text
+            return 0, digest.digest() if self.stub else digest.hexdigest().encode("ascii"), 0
+        if op in (
+            ESPLoader.ESP_WRITE_REG, ESPLoader.ESP_MEM_BEGIN, ESPLoader.ESP_MEM_DATA, ESPLoader.ESP_MEM_END,
+            ESPLoader.ESP_SPI_ATTACH, ESPLoader.ESP_SPI_SET_PARAMS, ESPLoader.ESP_CHANGE_BAUDRATE,
+            ESPLoader.ESP_FLASH_END, ESPLoader.ESP_FLASH_DEFL_END, ESPLoader.ESP_ERASE_FLASH, ESPLoader.ESP_ERASE_REGION,
+        ):
+            return 0, b"", 0
+        return 0, b"", ESPLoader.ROM_INVALID_RECV_MSG
+
+    def response(self, op: int, value: int, data: bytes, error: int) -> bytes:
+        # the status takes 4 bytes from the ROM loader of these chips, 2 from the stub
+        status = bytes((1 if error else 0, error)) + (b"" if self.stub else b"\x00\x00")
+        return struct.pack("<BBHI", 1, op, len(data) + len(status), value) + data + status
+
+
+def pop_slip_packet(buffer: bytearray):
+    """Remove the first complete SLIP packet from buffer, bytes before it are dropped
+
+    :return: Unescaped packet, or None if no packet is complete yet
+    """
+    begin = buffer.find(b"\xc0")
+    if begin < 0:
+        buffer.clear()
+        return None
+    del buffer[:begin]
+    end = buffer.find(b"\xc0", 1)
+    while end == 1:
+        # two delimiters in a row, the first one ended a packet we did not see begin
+        del buffer[:1]
+        end = buffer.find(b"\xc0", 1)
+    if end < 0:
+        return None
+    packet = bytes(buffer[1:end])
+    del buffer[:end + 1]
+    return packet.replace(b"\xdb\xdc", b"\xc0").replace(b"\xdb\xdd", b"\xdb")
+
+
+def slip_encode(packet: bytes) -> bytes:
+    return b"\xc0" + packet.replace(b"\xdb", b"\xdb\xdd").replace(b"\xc0", b"\xdb\xdc") + b"\xc0"
+
+
+class VirtualNetwork:
+    """A network module and its modules behind a pseudo-terminal
+
+    Responses are delayed by latency, and erase and crc commands also by the
+    time the flash takes, so several modules work in parallel as on a real
+    network. Everything runs in one thread per network.
+
+    :param modules: VirtualModule of each module on the network
+    :param network_type: "network", or "camera" for a camera network module
+    :param network_version: Application version of the network module
+    :param latency: Delay of every response, in seconds
+    :param erase_time: Time to erase one erase unit, in seconds
+    :param crc_time: Time to check the crc of a page, in seconds
+    :param reboot_time: Time a module takes to reboot, in seconds
+    :param warning_interval: Time between two warnings of a module, in seconds
+    :param esp_block_time: Time the ESP32 takes to write one flash block, in seconds
+    """
+
+    def __init__(
+        self, modules=(), network_type: str = "network", network_version: str = "v1.0.0", latency: float = 0.002,
+        erase_time: float = 0.02, crc_time: float = 0.005, reboot_time: float = 0.1, warning_interval: float = 0.2,
+        esp_block_time: float = 0.005
+    ):
+        self.network_module = VirtualModule(network_type, app_version=network_version)
+        self.modules = list(modules)
+        self.esp32 = VirtualEsp32(ESP32ROM if network_type == "network" else ESP32S3ROM)
+        self.latency = latency
+        self.erase_time = erase_time
+        self.crc_time = crc_time
+        self.reboot_time = reboot_time
+        self.warning_interval = warning_interval
+        self.esp_block_time = esp_block_time
+
+        self.master_fd, self.slave_fd = os.openpty()
+        # raw from the start, the updater may write before pyserial sets its own mode
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port = os.ttyname(self.slave_fd)
+
+        self.frames_received = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        # seconds taken by each page of the modules, and by each flash block of the ESP32
+        self.page_latencies = []
+        self.esp_block_latencies = []
+        self.__events = []
+        self.__event_order = itertools.count()
+        self.__recv_buffer = bytearray()
+        # the port is talking to esptool rather than to the network module
+        self.__esp_mode = False
+        # an ESP32 back from its flashing waits for the update finish bytes of the camera
+        self.__esp_finish_pending = False
+        self.__esp_last_ack = None
+        self.__running = False
+        self.__thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def all_modules(self) -> list:
+        return [self.network_module] + self.modules
+
+    def start(self) -> None:
+        self.__running = True
+        self.__thread = th.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def close(self) -> None:
+        self.__running = False
+        if self.__thread:
+            self.__thread.join()
+        # the slave stays open on our side so the master never sees a hang-up while the updater reconnects
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def __run(self) -> None:
+        while self.__running:
+            timeout = 0.05
+            if self.__events:
+                timeout = min(timeout, max(0, self.__events[0][0] - time.perf_counter()))
+            readable, _, _ = select.select([self.master_fd], [], [], timeout)
+            if readable:
+                self.__read()
+            now = time.perf_counter()
+            while self.__events and self.__events[0][0] <= now:
+                _, _, action = heapq.heappop(self.__events)
+                action()
+
+    def __read(self) -> None:
+        try:
+            data = os.read(self.master_fd, 65536)
+        except (BlockingIOError, OSError):
+            return
+        self.__recv_buffer += data
+        sync_begin = -1 if self.__esp_mode else self.__recv_buffer.find(b"\xc0\x00" + bytes((ESPLoader.ESP_SYNC, )))
+        if sync_begin >= 0:
+            # esptool flushes the output of the port right after its usb mode request, which a pty may lose
+            del self.__recv_buffer[:sync_begin]
+            self.__enter_esp_mode()
+        if self.__esp_mode:
+            packet = pop_slip_packet(self.__recv_buffer)
+            while packet is not None:
+                self.frames_received += 1
+                self.__handle_esp(packet)
+                packet = pop_slip_packet(self.__recv_buffer)
+            return
+        if self.__esp_finish_pending and b"\xAA" * 15 in self.__recv_buffer:
+            self.__esp_finish_pending = False
+            self.__schedule(self.latency, self.__send_esp_boot)
+        frame = pop_frame(self.__recv_buffer, 4096)
+        while frame is not None:
+            self.frames_received += 1
+            try:
+                message = json.loads(frame)
+                self.__handle(message["c"], message["s"], message["d"], b64decode(message["b"])[:message["l"]])
+            except (ValueError, KeyError, TypeError):
+                pass
+            frame = pop_frame(self.__recv_buffer, 4096)
+
+    def __schedule(self, delay: float, action) -> None:
+        heapq.heappush(self.__events, (time.perf_counter() + delay, next(self.__event_order), action))
+
+    def __send(self, command: int, source: int, destination: int, data: bytes) -> None:
+        frame = json.dumps(
+            {"c": command, "s": source, "d": destination, "b": b64encode(data).decode("utf8"), "l": len(data)},
+            separators=(",", ":"),
+        ).encode("utf8")
+        self.__write(frame)
+
+    def __write(self, frame: bytes) -> None:
+        try:
+            os.write(self.master_fd, frame)
+            self.frames_sent += 1
+        except (BlockingIOError, OSError):
+            # nobody reads the port, as a full usb buffer the frame is lost
+            self.frames_dropped += 1
+
+    def __targets(self, destination: int, modules: list) -> list:
+        now = time.perf_counter()
+        return [
+            module for module in modules
+            if (destination == BROADCAST_ID or destination == module.id) and module.rebooting_until <= now
+        ]
+
+    def __handle(self, command: int, source: int, destination: int, data: bytes) -> None:
+        if command == 0x28:
+            # network id request
+            for module in self.__targets(destination, [self.network_module]):
+                self.__respond_id(module)
+        elif command == 0x08:
+            # module id request
+            for module in self.__targets(destination, self.modules):
+                self.__respond_id(module)
+        elif command in (0x09, 0xA4) and len(data) >= 1:
+            # set module state, 0xA4 addresses the network module only
+            modules = [self.network_module] if command == 0xA4 else self.all_modules
+            for module in self.__targets(destination, modules):
+                self.__set_state(module, data[0])
+        elif command == 0x0D and len(data) >= 8:
+            rot_scmd = source >> 8
+            crc_val = int.from_bytes(data[:4], "little")
+            address = int.from_bytes(data[4:8], "little")
+            for module in self.__targets(destination, self.all_modules):
+                if module.in_bootloader:
+                    self.__firmware_command(module, rot_scmd, crc_val, address)
+        elif command == 0x0B:
+            for module in self.__targets(destination, self.all_modules):
+                if module.in_bootloader:
+                    if module.page_begin is None:
+                        module.page_begin = time.perf_counter()
+                    module.write_data(source, data)
+        elif command == 0x2B:
+            # usb mode, the port now reaches the ROM loader of the ESP32
+            self.__recv_buffer.clear()
+            self.__enter_esp_mode()
+        elif command == 0xA0 and source in (24, 70, 80):
+            # esp app version, esp ota version and interpreter reset, each acknowledged with 0xA1
+            version = data.lstrip(b"\x00").decode("ascii", "replace")
+            if source == 24:
+                self.esp32.app_version = version
+            elif source == 70:
+                self.esp32.ota_version = version
+            self.__schedule(self.latency, lambda: self.__send(0xA1, source, BROADCAST_ID, data))
+
+    def __respond_id(self, module: VirtualModule) -> None:
+        if module.in_bootloader:
+            # a module in its bootloader answers with its warning
+            self.__schedule(self.latency, lambda: self.__send(0x0A, module.id, BROADCAST_ID, module.warning_data()))
+        else:
+            self.__schedule(self.latency, lambda: self.__send(0x05, module.id, BROADCAST_ID, module.id_data()))
+
+    def __set_state(self, module: VirtualModule, module_state: int) -> None:
+        if module_state == Module.UPDATE_FIRMWARE and not module.in_bootloader:
+            # the module reboots into its bootloader
+            module.rebooting_until = time.perf_counter() + self.reboot_time
+            module.request_update()
+            self.__schedule(self.reboot_time, lambda: self.__warn(module))
+        elif module_state == Module.UPDATE_FIRMWARE_READY and module.in_bootloader:
+            module.ready = True
+            module.warning = True
+            self.__schedule(self.latency, lambda: self.__send(0x0A, module.id, BROADCAST_ID, module.warning_data()))
+        elif module_state == Module.REBOOT:
+            module.rebooting_until = time.perf_counter() + self.reboot_time
+            module.reboot()
+
+    def __warn(self, module: VirtualModule) -> None:
+        if not module.in_bootloader or not module.warning:
+            return
+        self.__send(0x0A, module.id, BROADCAST_ID, module.warning_data())
+        self.__schedule(self.warning_interval, lambda: self.__warn(module))
+
+    def __firmware_command(self, module: VirtualModule, rot_scmd: int, crc_val: int, address: int) -> None:
+        page_begin = None
+        if rot_scmd == 2:
+            if module.page_begin is None:
+                module.page_begin = time.perf_counter()
+            success = module.erase(address, crc_val)
+            state = ERASE_COMPLETE if success else ERASE_ERROR
+            delay = self.latency + self.erase_time * max(1, crc_val)
+        else:
+            # a page ends with its crc, pages checked without any data are not counted
+            page_begin, module.page_begin = module.page_begin, None
+            success = module.check_crc(address, crc_val)
+            state = CRC_COMPLETE if success else CRC_ERROR
+            delay = self.latency + self.crc_time
+        response = address.to_bytes(4, "little") + bytes((state, ))
+
+        def respond():
+            self.__send(0x0C, module.id, 0, response)
+            if page_begin is not None:
+                self.page_latencies.append(time.perf_counter() - page_begin)
+
+        self.__schedule(delay, respond)
+
+    def __handle_esp(self, packet: bytes) -> None:
+        if len(packet) < 8 or packet[0] != 0:
+            return
+        _, op, length, _ = struct.unpack("<BBHI", packet[:8])
+        was_stub = self.esp32.stub
+        value, data, error = self.esp32.command(op, packet[8:8 + length])
+        response = self.esp32.response(op, value, data, error)
+        delay = self.latency
+        if op in (ESPLoader.ESP_FLASH_DATA, ESPLoader.ESP_FLASH_DEFL_DATA):
+            delay += self.esp_block_time
+        responses = [response]
+        if op == ESPLoader.ESP_SYNC:
+            # the ROM loader answers a sync 8 times
+            responses *= 8
+        elif op == ESPLoader.ESP_MEM_END and not was_stub:
+            # the stub greets once it runs
+            self.esp32.stub = True
+            responses.append(b"OHAI")
+
+        def respond():
+            for packet in responses:
+                self.__write(slip_encode(packet))
+            if op in (ESPLoader.ESP_FLASH_BEGIN, ESPLoader.ESP_FLASH_DEFL_BEGIN):
+                self.__esp_last_ack = time.perf_counter()
+            elif op in (ESPLoader.ESP_FLASH_DATA, ESPLoader.ESP_FLASH_DEFL_DATA) and not error:
+                now = time.perf_counter()
+                if self.__esp_last_ack is not None:
+                    self.esp_block_latencies.append(now - self.__esp_last_ack)
+                self.__esp_last_ack = now
+            elif op in (ESPLoader.ESP_FLASH_END, ESPLoader.ESP_FLASH_DEFL_END):
+                # esptool resets the chip with the RTS line next, which no pty carries
+                self.__schedule(self.reboot_time, self.__esp_rebooted)
+
+        self.__schedule(delay, respond)
+
+    def __enter_esp_mode(self) -> None:
+        self.__esp_mode = True
+        self.__esp_finish_pending = False
+        self.esp32.reset()
+
+    def __esp_rebooted(self) -> None:
+        self.__esp_mode = False
+        self.__recv_buffer.clear()
+        self.esp32.reset()
+        if self.network_module.type == "network":
+            self.__send_esp_boot()
+        else:
+            # the camera boots its application once the updater sends the update finish bytes
+            self.__esp_finish_pending = True
+
+    def __send_esp_boot(self) -> None:
+        # esp app boot packet
+        self.__send(0xA1, 0x40, BROADCAST_ID, bytes(8))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve virtual MODI+ networks on pseudo-terminals")
+    parser.add_argument("--networks", type=int, default=1, help="Number of networks")
+    parser.add_argument("--modules", default="button,led", help="Comma separated module types of each network")
+    parser.add_argument("--network-type", default="network", choices=("network", "camera"))
+    parser.add_argument("--latency", type=float, default=0.002)
+    parser.add_argument("--erase-time", type=float, default=0.02)
+    parser.add_argument("--crc-time", type=float, default=0.005)
+    args = parser.parse_args()
+
+    module_types = [module_type for module_type in args.modules.split(",") if module_type]
+    networks = [
+        VirtualNetwork(
+            [VirtualModule(module_type) for module_type in module_types],
+            network_type=args.network_type, latency=args.latency, erase_time=args.erase_time, crc_time=args.crc_time,
+        )
+        for _ in range(args.networks)
+    ]
+    for network in networks:
+        network.start()
+        print(f"{network.port}: {args.network_type} 0x{network.network_module.uuid:X}, " + ", ".join(
+            f"{module.type} ({module.id})" for module in network.modules
+        ))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    for network in networks:
+        network.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""CPU cost of inter-frame pacing per flashing port
+
+Every port streams pages of 1 ms spaced frames from its own thread, as the
+updaters do, with the former busy-wait delay(), the former time.sleep mode
+and the deadline based Pacer.
+
+Run from the repository root: python -m benchmarks.pacing_benchmark
+"""
+import threading as th
+import time
+
+from modi2_firmware_updater.util.platform_util import Pacer, timer_resolution
+
+FRAME_INTERVAL = 0.001
+FRAME_NUM = 128 * 4
+
+
+def legacy_busy_wait(span):
+    init_time = time.perf_counter()
+    while time.perf_counter() - init_time < span:
+        pass
+
+
+def legacy_sleep(span):
+    time.sleep(span)
+
+
+def stream_frames(wait):
+    frame = b'{"c":11,"s":0,"d":1234,"b":"AAAAAAAAAAA=","l":8}'
+    sink = bytearray()
+    for _ in range(FRAME_NUM):
+        sink += frame
+        wait(FRAME_INTERVAL)
+
+
+def run(make_wait, port_num):
+    threads = [th.Thread(target=stream_frames, args=(make_wait(),)) for _ in range(port_num)]
+    init_wall = time.perf_counter()
+    init_cpu = time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - init_wall
+    cpu = time.process_time() - init_cpu
+    return wall, cpu
+
+
+def main():
+    print(f"timer resolution: {timer_resolution() * 1e6:.0f} us")
+    print(f"{FRAME_NUM} frames per port, {FRAME_INTERVAL * 1000:.0f} ms apart (ideal {FRAME_NUM * FRAME_INTERVAL:.2f} s)\n")
+    strategies = {
+        "busy-wait delay()": lambda: legacy_busy_wait,
+        "time.sleep": lambda: legacy_sleep,
+        "Pacer": lambda: Pacer().wait,
+    }
+    print(f"{'ports':>5} {'strategy':<18} {'wall (s)':>9} {'cpu/port (%)':>13}")
+    for port_num in (1, 4, 10):
+        for name, make_wait in strategies.items():
+            wall, cpu = run(make_wait, port_num)
+            print(f"{port_num:>5} {name:<18} {wall:9.2f} {100 * cpu / wall / port_num:13.1f}")
+
+
+if __name__ == "__main__":
+    main()
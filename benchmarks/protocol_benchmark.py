@@ -0,0 +1,216 @@
+"""Micro-benchmarks of the protocol hot paths, in isolation
+
+Each case is timed with timeit and reported as calls per second. Memory is
+traced with tracemalloc over single calls: the peak bytes a call allocates
+on top of what was already live, and the bytes still allocated after it
+returns (non-zero means the call leaks or caches).
+
+The serial cases run ModiSerialPort and slip_reader over an in-memory
+loopback port, so each call writes one frame and reads it back without the
+queue and per-byte locking of pyserial's loop:// weighing on the result.
+
+Results can be saved as json and compared against a saved run:
+
+    python -m benchmarks.protocol_benchmark --output baseline.json
+    python -m benchmarks.protocol_benchmark --baseline baseline.json
+
+Run from the repository root.
+"""
+import argparse
+import json
+import os
+import platform
+import time
+import timeit
+import tracemalloc
+
+from modi2_firmware_updater.core.esp32_updater import ESPLoader, slip_reader
+from modi2_firmware_updater.core.module_updater import ModuleFirmwareUpdater
+from modi2_firmware_updater.util.crc_util import calc_crc32, calc_crc64, calc_page_crc
+from modi2_firmware_updater.util.message_util import decode_message, parse_message, unpack_data
+from modi2_firmware_updater.util.modi_winusb.modi_serialport import ModiSerialPort
+
+MODULE_ID = 0x123
+RESPONSE_FRAME = parse_message(0x0C, MODULE_ID, 0, (5, 0, 0, 0, 0, 0, 0, 0))
+WARNING_FRAME = parse_message(0x0A, MODULE_ID, 0, (0x23, 0x01, 0, 0, 0x20, 0x40, 2, 1, 0, 0))
+
+
+class LoopbackPort:
+    """In-memory serial port, reading back what was written to it"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+
+    def inWaiting(self):
+        return len(self.buffer)
+
+    def read(self, size=1):
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def close(self):
+        pass
+
+
+def slip_encode(packet: bytes) -> bytes:
+    return b"\xc0" + packet.replace(b"\xdb", b"\xdb\xdd").replace(b"\xc0", b"\xdb\xdc") + b"\xc0"
+
+
+def loopback_port() -> ModiSerialPort:
+    port = ModiSerialPort()
+    port.serial_port = LoopbackPort()
+    port.is_open = True
+    return port
+
+
+def read_json(port: ModiSerialPort):
+    # Same path as the read_json of the updaters
+    json_pkt = port.read_frame()
+    return json_pkt.decode("utf8") if json_pkt else None
+
+
+def build_cases():
+    page = os.urandom(0x800)
+    frame_data = page[:8]
+    encoded_frame = RESPONSE_FRAME.encode("utf8")
+    _, _, _, response_data, _ = decode_message(RESPONSE_FRAME)
+    _, _, _, warning_data, _ = decode_message(WARNING_FRAME)
+
+    line_port = loopback_port()
+    line = encoded_frame + b"\n"
+
+    def read_until():
+        line_port.write(line)
+        return line_port.read_until(b"\n")
+
+    json_port = loopback_port()
+
+    def write_read_json():
+        json_port.write(encoded_frame)
+        return read_json(json_port)
+
+    # A flash_begin response of the ROM loader, escaped bytes included
+    slip_port = LoopbackPort()
+    slip_packet = slip_encode(b"\x01\x02\x02\x00\xc0\xdb\x00\x00\x00\x00")
+
+    def read_slip_packet():
+        slip_port.write(slip_packet)
+        return next(slip_reader(slip_port, lambda *args: None))
+
+    esp_block = os.urandom(0x400)
+
+    return {
+        "parse_message": lambda: parse_message(0x09, 0, MODULE_ID, (0, 4)),
+        "decode_message": lambda: decode_message(RESPONSE_FRAME),
+        "unpack_data (4, 1)": lambda: unpack_data(response_data, (4, 1)),
+        "unpack_data warning": lambda: unpack_data(warning_data, (6, 1, 1, 2)),
+        "calc_crc32": lambda: calc_crc32(frame_data[:4], 0x12345678),
+        "calc_crc64": lambda: calc_crc64(frame_data, 0x12345678),
+        "calc_page_crc 2 KiB": lambda: calc_page_crc(page),
+        "get_firmware_command": lambda: ModuleFirmwareUpdater.get_firmware_command(MODULE_ID, 1, 2, 0x12345678, 0x8001000),
+        "get_firmware_data": lambda: ModuleFirmwareUpdater.get_firmware_data(MODULE_ID, 17, frame_data),
+        "loopback read_until": read_until,
+        "loopback read_json": write_read_json,
+        "slip_reader packet": read_slip_packet,
+        "ESPLoader.checksum 1 KiB": lambda: ESPLoader.checksum(esp_block),
+    }
+
+
+def measure_rate(func, min_time: float) -> float:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = None
+    init_time = time.perf_counter()
+    while best is None or time.perf_counter() - init_time < min_time:
+        elapsed = timer.timeit(number) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return 1 / best
+
+
+def measure_allocations(func, calls: int = 200):
+    func()
+    peak_bytes = 0
+    retained_bytes = 0
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            init_size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func()
+            size, peak_size = tracemalloc.get_traced_memory()
+            peak_bytes += peak_size - init_size
+            retained_bytes += size - init_size
+    finally:
+        tracemalloc.stop()
+    return peak_bytes / calls, retained_bytes / calls
+
+
+def run(min_time: float) -> dict:
+    # What tracing an empty call already counts, taken off every case
+    empty_alloc_bytes, empty_retained_bytes = measure_allocations(lambda: None)
+    results = dict()
+    for name, func in build_cases().items():
+        alloc_bytes, retained_bytes = measure_allocations(func)
+        results[name] = {
+            "ops_per_sec": round(measure_rate(func, min_time), 1),
+            "alloc_bytes_per_call": round(max(0.0, alloc_bytes - empty_alloc_bytes), 1),
+            "retained_bytes_per_call": round(max(0.0, retained_bytes - empty_retained_bytes), 1),
+        }
+    return results
+
+
+def print_results(results: dict, baseline: dict = None):
+    header = f"{'case':<26} {'ops/s':>12} {'alloc B/call':>13} {'kept B/call':>12}"
+    if baseline:
+        header += f" {'vs baseline':>12}"
+    print(header)
+    for name, result in results.items():
+        line = (
+            f"{name:<26} {result['ops_per_sec']:12,.0f} "
+            f"{result['alloc_bytes_per_call']:13.1f} {result['retained_bytes_per_call']:12.1f}"
+        )
+        if baseline:
+            base_result = baseline.get(name)
+            if base_result:
+                change = result["ops_per_sec"] / base_result["ops_per_sec"] - 1
+                line += f" {change * 100:+11.1f}%"
+            else:
+                line += f" {'new':>12}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the MODI+ protocol hot paths")
+    parser.add_argument("--output", help="Save the results to this json file")
+    parser.add_argument("--baseline", help="Compare against the results saved in this json file")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds spent timing each case")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    results = run(args.min_time)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(
+                {
+                    "run": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "results": results,
+                },
+                output_file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
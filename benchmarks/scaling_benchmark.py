@@ -0,0 +1,340 @@
+"""Scaling of the multi updaters over many ports, against simulated networks
+
+For each port count, N virtual networks of M modules each are started on
+pseudo-terminals in a separate process (see network_simulator), and
+ModuleFirmwareMultiUpdater, NetworkFirmwareMultiUpdater and
+ESP32FirmwareMultiUploder update all of them without any ui. Each run
+reports:
+
+- wall time, and how many ports ended up at the new version
+- aggregate bytes/s, from the bytes_sent of the update metrics
+- cpu per port, the cpu time of this process and its worker processes over
+  the wall time, divided by the port count (100% is one core per port)
+- peak thread count of this process and its worker processes
+- p50/p99 page latency as the simulated modules see it, for the ESP32 the
+  time between the acks of two flash blocks
+- cpu of the simulator process, which must stay below one core for the
+  other figures to hold
+
+Run from the repository root:
+
+    python -m benchmarks.scaling_benchmark --ports 1,2,5,10,20,50 --output scaling.json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading as th
+import time
+from contextlib import contextmanager
+
+from benchmarks.network_simulator import VirtualModule, VirtualNetwork
+from modi2_firmware_updater.core.esp32_updater import ESP32FirmwareMultiUploder
+from modi2_firmware_updater.core.module_updater import ModuleFirmwareMultiUpdater
+from modi2_firmware_updater.core.network_updater import NetworkFirmwareMultiUpdater
+from modi2_firmware_updater.util.firmware_util import get_firmware_bin_path, get_version_value
+
+UPDATERS = ("module", "network", "esp32")
+
+# Versions the simulated networks start with, and the ones of the generated firmware tree
+INITIAL_VERSION = "v1.0.0"
+TARGET_VERSION = "v1.1.0"
+TARGET_OTA_VERSION = "v1.0.1"
+
+# Address and size of each file of the ESP32 firmwares, as esptool writes them
+ESP32_NETWORK_FILES = {
+    "app": {"ota_data_initial.bin": 0x2000, "bootloader.bin": 0x4000, "partitions.bin": 0xC00, "esp32.bin": None},
+    "ota": {"modi_ota_factory.bin": None},
+}
+ESP32_CAMERA_FILES = {"bootloader.bin": 0x4000, "partition-table.bin": 0xC00, "ota_data_initial.bin": 0x2000, "modi2_camera_esp32.bin": None}
+
+
+def __write_binary(file_path: str, size: int, rng: random.Random) -> None:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    # 4 random bits per byte, esptool compresses images about as well as real firmware
+    with open(file_path, "wb") as binary_file:
+        binary_file.write(bytes(rng.getrandbits(4) for _ in range(size)))
+
+
+def write_firmware_tree(root: str, module_types: list, firmware_size: int, esp_firmware_size: int) -> dict:
+    """Generate the firmwares of every updater under root
+
+    :return: firmware_version_info of the tree
+    """
+    rng = random.Random(0)
+    firmware_version_info = dict()
+    for module_type in module_types:
+        __write_binary(get_firmware_bin_path(root, module_type, "app", TARGET_VERSION), firmware_size, rng)
+        firmware_version_info[module_type] = {"app": TARGET_VERSION, "os": INITIAL_VERSION, "bootloader": INITIAL_VERSION}
+
+    for network_type in ("network", "camera"):
+        __write_binary(os.path.join(root, network_type, "e103", TARGET_VERSION, f"{network_type}.bin"), firmware_size, rng)
+
+    for name, size in ESP32_NETWORK_FILES["app"].items():
+        __write_binary(os.path.join(root, "network", "esp32", "app", TARGET_VERSION, name), size or esp_firmware_size, rng)
+    for name, size in ESP32_NETWORK_FILES["ota"].items():
+        __write_binary(os.path.join(root, "network", "esp32", "ota", TARGET_OTA_VERSION, name), size or esp_firmware_size, rng)
+    for name, size in ESP32_CAMERA_FILES.items():
+        __write_binary(os.path.join(root, "camera", "esp32s3", "app", TARGET_VERSION, name), size or esp_firmware_size, rng)
+
+    firmware_version_info["network"] = {"app": TARGET_VERSION, "sub": TARGET_VERSION, "ota": TARGET_OTA_VERSION}
+    firmware_version_info["camera"] = {"app": TARGET_VERSION, "sub": TARGET_VERSION}
+    return firmware_version_info
+
+
+def serve_networks(connection, network_num: int, module_types: list, network_type: str, network_options: dict) -> None:
+    # Entry point of the simulator process: sends the ports, serves them until told to stop, then sends the results
+    networks = [
+        VirtualNetwork(
+            [VirtualModule(module_type, app_version=INITIAL_VERSION) for module_type in module_types],
+            network_type=network_type, network_version=INITIAL_VERSION, **network_options,
+        )
+        for _ in range(network_num)
+    ]
+    for network in networks:
+        network.start()
+    connection.send([network.port for network in networks])
+
+    init_cpu = time.process_time()
+    connection.recv()
+    cpu = time.process_time() - init_cpu
+
+    target_version = get_version_value(TARGET_VERSION)
+    result = {
+        "cpu": cpu,
+        "page_latencies": [latency for network in networks for latency in network.page_latencies],
+        "esp_block_latencies": [latency for network in networks for latency in network.esp_block_latencies],
+        "modules_updated": [all(module.version == target_version for module in network.modules) for network in networks],
+        "network_updated": [network.network_module.version == target_version for network in networks],
+        "esp32_updated": [network.esp32.app_version == TARGET_VERSION.lstrip("v") for network in networks],
+        "frames_dropped": sum(network.frames_dropped for network in networks),
+    }
+    for network in networks:
+        network.close()
+    connection.send(result)
+    connection.close()
+
+
+class ThreadSampler:
+    """Peak thread count of this process and of its children, sampled in the background"""
+
+    def __init__(self, interval: float = 0.1, exclude_pids: tuple = ()):
+        self.interval = interval
+        self.exclude_pids = set(exclude_pids)
+        self.peak = 0
+        self.__stop = th.Event()
+        self.__thread = th.Thread(target=self.__run, daemon=True)
+
+    @staticmethod
+    def thread_count(pid) -> int:
+        # Linux reports every thread, elsewhere only the Python threads of this process are seen
+        try:
+            with open(f"/proc/{pid}/status") as status_file:
+                for line in status_file:
+                    if line.startswith("Threads:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return th.active_count() if pid == "self" else 0
+
+    def __run(self) -> None:
+        while not self.__stop.is_set():
+            count = self.thread_count("self") - 1
+            for child in mp.active_children():
+                if child.pid not in self.exclude_pids:
+                    count += self.thread_count(child.pid)
+            self.peak = max(self.peak, count)
+            self.__stop.wait(self.interval)
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__stop.set()
+        self.__thread.join()
+
+
+@contextmanager
+def quiet_stdout(enabled: bool = True):
+    # The updaters print progress bars, from this process and from their workers
+    if not enabled:
+        yield
+        return
+    sys.stdout.flush()
+    saved_fd = os.dup(1)
+    devnull_fd = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull_fd, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved_fd, 1)
+        os.close(saved_fd)
+        os.close(devnull_fd)
+
+
+def percentile(values: list, fraction: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def cpu_time() -> float:
+    # This process, and the worker processes it has joined
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self_usage.ru_utime + self_usage.ru_stime + children_usage.ru_utime + children_usage.ru_stime
+
+
+def make_updater(updater_kind: str, firmware_path: str, args):
+    updater_class = {
+        "module": ModuleFirmwareMultiUpdater,
+        "network": NetworkFirmwareMultiUpdater,
+        "esp32": ESP32FirmwareMultiUploder,
+    }[updater_kind]
+    updater = updater_class(firmware_path)
+    updater.set_max_concurrency(args.max_concurrency)
+    updater.set_process_num(args.processes)
+    if updater_kind == "module":
+        updater.set_interleave_mode(args.interleave)
+        updater.set_bulk_erase_mode(args.interleave)
+    return updater
+
+
+def run_update(updater_kind: str, updater, ports: list, firmware_version_info: dict) -> None:
+    if updater_kind == "esp32":
+        updater.update_firmware(ports, False, firmware_version_info)
+    else:
+        updater.update_module_firmware(ports, firmware_version_info)
+
+
+def run(updater_kind: str, port_num: int, firmware_path: str, firmware_version_info: dict, module_types: list, args) -> dict:
+    context = mp.get_context("spawn")
+    parent_connection, child_connection = context.Pipe()
+    network_options = {
+        "latency": args.latency, "erase_time": args.erase_time, "crc_time": args.crc_time, "esp_block_time": args.esp_block_time,
+    }
+    simulator = context.Process(
+        target=serve_networks,
+        args=(child_connection, port_num, module_types, args.network_type, network_options),
+        daemon=True,
+    )
+    simulator.start()
+    ports = parent_connection.recv()
+
+    records = []
+
+    def on_signal(signal_name, index, signal_args):
+        if signal_name == "metrics_signal":
+            records.append(signal_args[0])
+
+    updater = make_updater(updater_kind, firmware_path, args)
+    updater.set_signal_callback(on_signal)
+
+    with quiet_stdout(not args.verbose), ThreadSampler(exclude_pids=(simulator.pid, )) as thread_sampler:
+        init_cpu = cpu_time()
+        init_wall = time.perf_counter()
+        update_thread = th.Thread(target=run_update, args=(updater_kind, updater, ports, firmware_version_info), daemon=True)
+        update_thread.start()
+        update_thread.join(args.timeout)
+        wall = time.perf_counter() - init_wall
+        cpu = cpu_time() - init_cpu
+    timed_out = update_thread.is_alive()
+
+    parent_connection.send("stop")
+    simulator_result = parent_connection.recv()
+    simulator.join()
+
+    updated = simulator_result[f"{'modules' if updater_kind == 'module' else updater_kind}_updated"]
+    latencies = simulator_result["esp_block_latencies" if updater_kind == "esp32" else "page_latencies"]
+    bytes_sent = sum(bytes_sent["bytes"] for record in records for bytes_sent in record["bytes_sent"])
+    p50 = percentile(latencies, 0.5)
+    p99 = percentile(latencies, 0.99)
+    return {
+        "updater": updater_kind,
+        "ports": port_num,
+        "timed_out": timed_out,
+        "updated_ports": sum(updated),
+        "wall_seconds": round(wall, 3),
+        "bytes_sent": bytes_sent,
+        "bytes_per_second": round(bytes_sent / wall, 1) if wall else 0.0,
+        "cpu_per_port_percent": round(100 * cpu / wall / port_num, 2) if wall else 0.0,
+        "peak_threads": thread_sampler.peak,
+        "page_latency_p50_ms": None if p50 is None else round(p50 * 1000, 2),
+        "page_latency_p99_ms": None if p99 is None else round(p99 * 1000, 2),
+        "page_num": len(latencies),
+        "simulator_cpu_percent": round(100 * simulator_result["cpu"] / wall, 1) if wall else 0.0,
+        "frames_dropped": simulator_result["frames_dropped"],
+    }
+
+
+def print_header() -> None:
+    print(
+        f"{'updater':<8} {'ports':>5} {'updated':>8} {'wall (s)':>9} {'KB/s':>9} {'cpu/port (%)':>13} "
+        f"{'threads':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'sim cpu (%)':>12}"
+    )
+
+
+def print_result(result: dict) -> None:
+    def milliseconds(value):
+        return f"{'-':>9}" if value is None else f"{value:9.1f}"
+
+    updated = f"{result['updated_ports']}/{result['ports']}" + ("!" if result["timed_out"] else "")
+    print(
+        f"{result['updater']:<8} {result['ports']:5d} {updated:>8} {result['wall_seconds']:9.2f} "
+        f"{result['bytes_per_second'] / 1000:9.1f} {result['cpu_per_port_percent']:13.2f} {result['peak_threads']:8d} "
+        f"{milliseconds(result['page_latency_p50_ms'])} {milliseconds(result['page_latency_p99_ms'])} "
+        f"{result['simulator_cpu_percent']:12.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling of the multi updaters against simulated MODI+ networks")
+    parser.add_argument("--ports", default="1,2,5,10,20,50", help="Comma separated port counts to run")
+    parser.add_argument("--updaters", default=",".join(UPDATERS), help="Comma separated updaters to run: " + ", ".join(UPDATERS))
+    parser.add_argument("--modules", default="button,led", help="Comma separated module types of each network")
+    parser.add_argument("--network-type", default="network", choices=("network", "camera"))
+    parser.add_argument("--firmware-size", type=lambda value: int(value, 0), default=0x4000, help="Bytes of each module firmware")
+    parser.add_argument("--esp-firmware-size", type=lambda value: int(value, 0), default=0x20000, help="Bytes of the ESP32 app and ota images")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes of the multi updaters")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="Ports updated at once")
+    parser.add_argument("--interleave", action="store_true", help="Interleaved flashing with bulk erase for the module updater")
+    parser.add_argument("--latency", type=float, default=0.002)
+    parser.add_argument("--erase-time", type=float, default=0.02)
+    parser.add_argument("--crc-time", type=float, default=0.005)
+    parser.add_argument("--esp-block-time", type=float, default=0.005)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds a run may take before it is abandoned")
+    parser.add_argument("--output", help="Save the results to this json file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the output of the updaters")
+    args = parser.parse_args()
+
+    port_nums = [int(port_num) for port_num in args.ports.split(",") if port_num]
+    updater_kinds = [updater_kind for updater_kind in args.updaters.split(",") if updater_kind]
+    module_types = [module_type for module_type in args.modules.split(",") if module_type]
+    for updater_kind in updater_kinds:
+        if updater_kind not in UPDATERS:
+            parser.error(f"unknown updater: {updater_kind}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as firmware_path:
+        firmware_version_info = write_firmware_tree(firmware_path, module_types, args.firmware_size, args.esp_firmware_size)
+        print_header()
+        for updater_kind in updater_kinds:
+            for port_num in port_nums:
+                result = run(updater_kind, port_num, firmware_path, firmware_version_info, module_types, args)
+                print_result(result)
+                results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"run": time.strftime("%Y-%m-%dT%H:%M:%S"), "args": vars(args), "results": results}, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
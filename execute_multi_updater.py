@@ -1,4 +1,7 @@
+import multiprocessing
+
 from main import run_gui
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     run_gui(multi=True)
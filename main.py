@@ -1,5 +1,6 @@
 import sys
 import argparse
+import multiprocessing
 
 from PyQt5 import QtWidgets
 
@@ -23,6 +24,9 @@ def run_gui(debug=False, multi=True):
     sys.exit(ret)
 
 if __name__ == "__main__":
+    # worker processes of the multi updaters start from this entry point in frozen builds
+    multiprocessing.freeze_support()
+
     parser = argparse.ArgumentParser()
     parser.add_argument(
         '--debug', type=str, default="False",
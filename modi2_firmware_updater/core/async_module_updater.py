@@ -0,0 +1,605 @@
+import asyncio
+
+from modi2_firmware_updater.core.module_updater import ModuleFirmwareUpdater
+from modi2_firmware_updater.util.crc_util import calc_page_crc
+from modi2_firmware_updater.util.firmware_util import (
+    ERASE_UNIT_TIME, FirmwarePlan, get_end_flash_data, get_firmware_bin_path, get_firmware_frames, get_firmware_plan,
+    get_flash_layout, get_version_value
+)
+from modi2_firmware_updater.util.message_util import decode_message, parse_message, unpack_data
+from modi2_firmware_updater.util.modi_winusb.modi_aioserialport import AsyncModiSerialPort
+from modi2_firmware_updater.util.module_util import Module, ModuleRecord, ModuleRegistry, get_module_type_from_uuid
+from modi2_firmware_updater.util.platform_util import PacingBudget
+from modi2_firmware_updater.util.retry_util import RetryPolicy
+
+# The protocol (state codes, boot sections and handshakes) is the one of the threaded updater
+Updater = ModuleFirmwareUpdater
+
+
+class AsyncModuleFirmwareUpdater():
+    """Module Firmware Updater driven by an asyncio event loop
+
+    Runs the discovery and flashing flow of ModuleFirmwareUpdater on one
+    network module. Received frames are dispatched from the event loop and
+    command responses resolve futures, so many updaters can share a single
+    loop without any thread per port.
+    """
+
+    def __init__(self, device, module_firmware_path=None):
+        self.print = True
+        self.device = device
+        self.module_firmware_path = module_firmware_path
+        self.firmware_version_info = {}
+
+        self.network_id = None
+        self.network_uuid = None
+        self.network_version = None
+        self.module_type = None
+        self.progress = None
+        self.update_in_progress = False
+        self.update_error = 0
+        self.update_error_message = ""
+        self.has_update_error = False
+
+        self.module_registry = ModuleRegistry()
+        self.all_update_num = 0
+        self.all_update_module_num = 0
+        self.update_complete_num = 0
+        self.module_listup_flag = False
+
+        self.burst_mode = False
+        self.burst_chunk_frame_num = None
+        self.pacing = None
+        self.bulk_erase_mode = False
+        self.bulk_erase_rejected = set()
+        self.force_update = False
+        self.retry_policy = RetryPolicy()
+
+        self.module_num_hint = None
+        self.discovery_interval = Updater.DISCOVERY_INTERVAL
+        self.discovery_stable_rounds = Updater.DISCOVERY_STABLE_ROUNDS
+        self.discovery_time = None
+
+        self.serial = None
+        self.__gathering_deadline = 0
+        self.__ready_event = None
+        self.__state_waiters = dict()
+
+    def set_print(self, print):
+        self.print = print
+
+    def set_burst_mode(self, burst_mode: bool, chunk_frame_num: int = None) -> None:
+        # Send each page in bulk writes of chunk_frame_num frames (whole page if None)
+        self.burst_mode = burst_mode
+        self.burst_chunk_frame_num = chunk_frame_num
+
+    def set_bulk_erase_mode(self, bulk_erase_mode: bool) -> None:
+        # Erase each run of contiguous pages with a single erase command
+        self.bulk_erase_mode = bulk_erase_mode
+
+    def set_force_update(self, force_update: bool) -> None:
+        # Flash modules whose firmware already matches firmware_version_info as well
+        self.force_update = force_update
+
+    def set_retry_budgets(self, retry_budgets: dict = None) -> None:
+        # Operation name to (attempts, base_delay), see RetryPolicy.BUDGETS
+        self.retry_policy = RetryPolicy(retry_budgets)
+
+    def set_module_num_hint(self, module_num_hint: int = None) -> None:
+        # Discovery ends as soon as this many modules are found
+        self.module_num_hint = module_num_hint
+
+    def set_discovery_options(self, interval: float = None, stable_rounds: int = None) -> None:
+        if interval is not None:
+            self.discovery_interval = interval
+        if stable_rounds is not None:
+            self.discovery_stable_rounds = stable_rounds
+
+    async def update_module_firmware(self, firmware_version_info={}) -> bool:
+        """Update every module connected to the network module of the port
+
+        :param firmware_version_info: Versions to flash, by module type
+        :return: True if every module has been updated
+        """
+        self.firmware_version_info = firmware_version_info
+        self.__ready_event = asyncio.Event()
+
+        # set once the port is open, so that a failed open can be told from a failed update
+        self.serial = None
+        serial = AsyncModiSerialPort(self.device)
+        serial.open()
+        self.serial = serial
+        self.serial.set_frame_callback(self.__handle_frame)
+        if self.burst_mode:
+            self.pacing = PacingBudget(self.serial.baudrate)
+        else:
+            # one frame per millisecond, as the threaded updater sends them
+            self.pacing = PacingBudget(self.serial.baudrate, frame_interval=0.001, max_frame_interval=0.001)
+
+        try:
+            for _ in range(0, 3):
+                self.request_network_id(0xFFF)
+            self.__send(self.__set_module_state(0xFFF, Module.FORCED_PAUSE, Module.PNP_OFF))
+            await self.__discover_modules()
+
+            if len(self.module_registry) > Updater.MAX_UPDATE_MODULE_NUM:
+                self.update_error_message = f"Too many modules detected, please connect modules up to {Updater.MAX_UPDATE_MODULE_NUM}"
+                self.update_error = -1
+                self.__print(self.update_error_message)
+                return False
+            self.update_in_progress = True
+            self.all_update_module_num = len(self.module_registry)
+
+            if not await self.__wait_update_ready():
+                self.update_error_message = "Module firmwares have not been updated! error occur"
+                self.update_error = -1
+                self.__send(self.__set_module_state(0xFFF, Module.REBOOT, Module.PNP_OFF))
+                await asyncio.sleep(1)
+                self.__print(self.update_error_message)
+                return False
+
+            complete_flag = await self.__update_modules()
+
+            self.update_error = 1 if complete_flag else -1
+            self.module_registry.clear()
+            self.__send(self.__set_module_state(0xFFF, Module.REBOOT, Module.PNP_OFF))
+            self.__print("Reboot message has been sent to all connected modules")
+            await asyncio.sleep(2)
+            self.__send(self.__set_module_state(0xFFF, Module.RUN, Module.PNP_ON))
+            await asyncio.sleep(1)
+            self.__print("Module firmwares have been updated!")
+            return complete_flag
+        finally:
+            await self.serial.drain()
+            self.serial.close()
+
+    async def __discover_modules(self) -> None:
+        # Same rounds as the threaded updater, the handlers push the deadline on every new module
+        loop = asyncio.get_running_loop()
+        discovery_begin = loop.time()
+        module_num = 0
+        stable_rounds = 0
+        self.__gathering_deadline = discovery_begin + Updater.DISCOVERY_TIMEOUT
+        while loop.time() < self.__gathering_deadline:
+            if self.module_num_hint and len(self.module_registry) >= self.module_num_hint:
+                break
+            if module_num and len(self.module_registry) == module_num:
+                stable_rounds += 1
+                if stable_rounds >= self.discovery_stable_rounds:
+                    break
+            else:
+                module_num = len(self.module_registry)
+                stable_rounds = 0
+
+            self.request_module_id(0xFFF)
+            await asyncio.sleep(self.discovery_interval)
+
+        self.discovery_time = loop.time() - discovery_begin
+        self.__print(f"Module discovery: {len(self.module_registry)} module(s) in {self.discovery_time:.2f}s")
+
+    async def __wait_update_ready(self) -> bool:
+        discovery_retry = self.retry_policy.budget("discovery")
+        while True:
+            not_ready = [module_info for module_info in self.module_registry if module_info.state != Updater.UPDATE_READY]
+            if not not_ready:
+                discovery_retry.succeeded()
+                return True
+            if not discovery_retry.failed(sleep=False):
+                return False
+            loop = asyncio.get_running_loop()
+            retry_deadline = loop.time() + discovery_retry.delay
+            while any(module_info.state != Updater.UPDATE_READY for module_info in not_ready) and loop.time() < retry_deadline:
+                self.__ready_event.clear()
+                try:
+                    await asyncio.wait_for(self.__ready_event.wait(), retry_deadline - loop.time())
+                except asyncio.TimeoutError:
+                    pass
+            for module_info in not_ready:
+                if module_info.state != Updater.UPDATE_READY:
+                    self.check_to_update_firmware(module_info.id)
+
+    async def __update_modules(self) -> bool:
+        retry_max = 2
+        self.all_update_num = sum(
+            module_info.level + 1 for module_info in self.module_registry
+            if module_info.level < Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_DONE
+        )
+        self.module_listup_flag = True
+        self.__print(f"Module firmwares update start! total update module num: {self.all_update_module_num}")
+
+        # Sections follow each other as in ModuleFirmwareUpdater.module_firmware_update_manager
+        next_level = {
+            Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_SECOND_BOOTLOADER: Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_BOOTLOADER,
+            Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_BOOTLOADER: Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_APPLICATION,
+            Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_APPLICATION: Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_DONE,
+        }
+        section_names = {
+            Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_SECOND_BOOTLOADER: "second_bootloader",
+            Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_BOOTLOADER: "bootloader",
+            Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_APPLICATION: "app",
+        }
+
+        complete_flag = True
+        for _ in range(0, 100):
+            complete_flag = True
+            await asyncio.sleep(0.1)
+            for module_info in self.module_registry:
+                while module_info.level in section_names:
+                    if await self.__update_section(module_info, section_names[module_info.level]):
+                        module_info.level = next_level[module_info.level]
+                        continue
+                    complete_flag = False
+                    module_info.retry += 1
+                    if module_info.retry > retry_max:
+                        module_info.level = Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_ERROR
+                    break
+                if module_info.level == Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_ERROR:
+                    complete_flag = False
+            if complete_flag:
+                break
+        return complete_flag
+
+    async def __update_section(self, module_info: ModuleRecord, section: str) -> bool:
+        self.module_type = module_info.type
+        version_key = "app" if section == "app" else "bootloader"
+        bin_path = get_firmware_bin_path(self.module_firmware_path, module_info.type, section, self.firmware_version_info[module_info.type][version_key])
+        with open(bin_path, "rb") as bin_file:
+            bin_buffer = bin_file.read()
+
+        layout = get_flash_layout(module_info.type, section)
+        plan = get_firmware_plan(bin_buffer, layout)
+        bin_end = plan.bin_end
+        firmware_frames = get_firmware_frames(plan.image, layout.page_size)
+        erased_pages = await self.__erase_runs(module_info, plan)
+
+        erase_retry = self.retry_policy.budget("erase")
+        crc_retry = self.retry_policy.budget("crc")
+        page_index = 0
+        while page_index < len(plan.page_begins):
+            page_begin = plan.page_begins[page_index]
+            self.progress = 100 * page_begin // bin_end
+
+            if page_begin in erased_pages:
+                # erased along with its run, a page written again is erased on its own
+                erased_pages.discard(page_begin)
+                erase_page_success = True
+            else:
+                erase_page_success = await self.send_firmware_command("erase", module_info, layout.erase_page_num, layout.page_address(page_begin))
+            if not erase_page_success:
+                if not erase_retry.failed(sleep=False):
+                    self.update_error_message = f"{module_info.type} ({module_info.id}) erase flash failed."
+                    self.has_update_error = True
+                    return False
+                await asyncio.sleep(erase_retry.delay)
+                continue
+            erase_retry.succeeded()
+
+            checksum = plan.checksums[page_begin]
+            await self.serial.write_paced(
+                firmware_frames.page_frames(page_begin, module_info.id),
+                self.pacing,
+                self.burst_chunk_frame_num if self.burst_mode else 1,
+            )
+
+            crc_page_success = await self.send_firmware_command("crc", module_info, checksum, layout.page_address(page_begin))
+            if self.burst_mode:
+                if crc_page_success:
+                    self.pacing.page_passed()
+                else:
+                    self.pacing.page_failed()
+            if not crc_page_success:
+                if not crc_retry.failed(sleep=False):
+                    self.update_error_message = f"{module_info.type} ({module_info.id}) check crc failed."
+                    self.has_update_error = True
+                    return False
+                await asyncio.sleep(crc_retry.delay)
+                continue
+            crc_retry.succeeded()
+
+            page_index += 1
+
+        self.progress = 99
+        if section == "app":
+            end_flash_data = get_end_flash_data(
+                layout,
+                0xAA,
+                os_version=get_version_value(self.firmware_version_info[module_info.type]["os"]),
+                app_version=get_version_value(self.firmware_version_info[module_info.type]["app"]),
+            )
+        else:
+            end_flash_data = get_end_flash_data(layout, 0xAA)
+
+        success_end_flash = await self.send_end_flash_data(module_info, end_flash_data)
+        if section == "bootloader":
+            self.__send(self.__set_module_state(module_info.id, Module.REBOOT, Module.PNP_OFF))
+        elif section == "second_bootloader":
+            self.__send(self.__set_module_state(module_info.id, Module.REBOOT, Module.PNP_OFF))
+            self.__send(self.__set_module_state(module_info.id, Module.REBOOT, Module.PNP_OFF))
+
+        if not success_end_flash:
+            self.update_error_message = f"{module_info.type} ({module_info.id}) version writing failed."
+            self.has_update_error = True
+            return False
+
+        self.__print(f"{section} update is done for {module_info.type} ({module_info.id})")
+        self.progress = 0
+        self.update_complete_num += 1
+        return True
+
+    async def __erase_runs(self, module_info: ModuleRecord, plan: FirmwarePlan) -> set:
+        # Erase the image's runs of pages up front, returns the pages left erased
+        erased_pages = set()
+        if not self.bulk_erase_mode or module_info.uuid in self.bulk_erase_rejected:
+            return erased_pages
+
+        layout = plan.layout
+        for run_begin, run_pages in plan.erase_runs(Updater.MAX_ERASE_RUN_PAGES):
+            if run_pages == 1:
+                continue
+            erase_unit_num = run_pages * layout.erase_page_num
+            erase_run_success = await self.send_firmware_command(
+                "erase", module_info, erase_unit_num, layout.page_address(run_begin), response_timeout=0.5 + erase_unit_num * ERASE_UNIT_TIME
+            )
+            if not erase_run_success:
+                # the page loop erases whatever is left, one page at a time
+                self.bulk_erase_rejected.add(module_info.uuid)
+                break
+            erased_pages.update(range(run_begin, run_begin + run_pages * layout.page_size, layout.page_size))
+        return erased_pages
+
+    async def send_end_flash_data(self, module_info: ModuleRecord, end_flash_data: bytearray) -> bool:
+        end_flash_retry = self.retry_policy.budget("end_flash")
+        while not await self.__write_end_flash_data(module_info, end_flash_data):
+            if not end_flash_retry.failed(sleep=False):
+                self.update_error_message = "Response timed-out"
+                return False
+            await asyncio.sleep(end_flash_retry.delay)
+        end_flash_retry.succeeded()
+        self.__print(f"End flash is written for {module_info.type} ({module_info.id})")
+        return True
+
+    async def __write_end_flash_data(self, module_info: ModuleRecord, end_flash_data: bytearray) -> bool:
+        layout = get_flash_layout(module_info.type, "app")
+
+        erase_page_success = await self.send_firmware_command("erase", module_info, layout.erase_page_num, layout.end_flash_address)
+        if not erase_page_success:
+            return False
+
+        data_frames = [
+            Updater.get_firmware_data(module_info.id, seq_num=end_flash_ptr // 8, bin_data=end_flash_data[end_flash_ptr:end_flash_ptr + 8]).encode("utf8")
+            for end_flash_ptr in range(0, len(end_flash_data), 8)
+        ]
+        await self.serial.write_paced(data_frames, self.pacing, 1)
+
+        return await self.send_firmware_command("crc", module_info, calc_page_crc(end_flash_data), layout.end_flash_address)
+
+    async def send_firmware_command(self, oper_type: str, module_info: ModuleRecord, crc_val: int, page_address: int, response_timeout: float = 0.5) -> bool:
+        if oper_type == "erase":
+            rot_scmd = 2
+            success_state = Updater.ERASE_COMPLETE
+            fail_state = Updater.ERASE_ERROR
+        else:
+            rot_scmd = 1
+            success_state = Updater.CRC_COMPLETE
+            fail_state = Updater.CRC_ERROR
+
+        # The future is resolved from __update_firmware_state as soon as the module answers
+        waiter = asyncio.get_running_loop().create_future()
+        self.__state_waiters[module_info.id] = ((success_state, fail_state), waiter)
+        self.__send(Updater.get_firmware_command(module_info.id, 1, rot_scmd, crc_val, page_addr=page_address))
+        try:
+            state = await asyncio.wait_for(waiter, response_timeout)
+        except asyncio.TimeoutError:
+            state = None
+        finally:
+            self.__state_waiters.pop(module_info.id, None)
+            module_info.set_state(Updater.NO_ERROR)
+
+        if state == success_state:
+            return True
+        if state == fail_state:
+            self.update_error_message = "Response Errored"
+        else:
+            self.update_error_message = "Response timed-out"
+        return False
+
+    def request_network_id(self, id: int):
+        self.__send(parse_message(0x28, 0x0, id, (0xFF, 0x0F)))
+
+    def request_module_id(self, id: int):
+        self.__send(parse_message(0x8, 0x0, id, (0xFF, 0x0F)))
+
+    def check_to_update_firmware(self, module_id: int) -> None:
+        self.__send(self.__set_module_state(module_id, Module.UPDATE_FIRMWARE_READY, Module.PNP_OFF))
+
+    @staticmethod
+    def __set_module_state(destination_id: int, module_state: int, pnp_state: int) -> str:
+        return parse_message(0x09, 0, destination_id, (module_state, pnp_state))
+
+    def __send(self, data):
+        if self.serial is not None and self.serial.is_open:
+            self.serial.write(data)
+
+    def __handle_frame(self, frame: bytes) -> None:
+        try:
+            ins, sid, did, data, length = decode_message(frame.decode("utf8"))
+        except Exception:
+            return
+
+        command = {
+            0x00: self.__request_uuid,
+            0x05: self.__assign_module_id,
+            0x0A: self.__update_warning,
+            0x0C: self.__update_firmware_state,
+        }.get(ins)
+
+        if command:
+            command(sid, data, length)
+
+    def __add_module(self, module_id: int, module_uuid: int, module_type: str) -> ModuleRecord:
+        module_info = self.module_registry.add(module_id, module_uuid, module_type)
+        if module_info is not None:
+            self.__gathering_deadline = asyncio.get_running_loop().time() + Updater.DISCOVERY_TIMEOUT
+        return module_info
+
+    def __request_uuid(self, sid: int, data: str, length: int) -> None:
+        if sid == self.network_id:
+            return
+        if self.module_registry.get_by_id(sid) is not None:
+            self.__send(self.__set_module_state(sid, Module.UPDATE_FIRMWARE, Module.PNP_OFF))
+        elif not self.update_in_progress:
+            self.request_module_id(sid)
+            self.request_network_id(sid)
+            self.__gathering_deadline = asyncio.get_running_loop().time() + Updater.DISCOVERY_TIMEOUT
+
+    def __assign_module_id(self, sid: int, data: str, length: int) -> None:
+        module_uuid, module_version_digits = unpack_data(data, (6, 2))
+        module_type = get_module_type_from_uuid(module_uuid)
+
+        if module_type == "None":
+            return
+
+        if module_type in ["network", "camera"]:
+            self.network_uuid = module_uuid
+            self.network_id = sid
+            module_version = [
+                str((module_version_digits & 0xE000) >> 13),    # major
+                str((module_version_digits & 0x1F00) >> 8),     # minor
+                str(module_version_digits & 0x00FF)             # patch
+            ]
+            self.network_version = ".".join(module_version)
+        elif not self.update_in_progress:
+            module_info = self.__add_module(sid, module_uuid, module_type)
+            if module_info is not None:
+                module_info.version = module_version_digits
+                self.__send(self.__set_module_state(sid, Module.UPDATE_FIRMWARE, Module.PNP_OFF))
+
+    def __update_warning(self, sid: int, data: str, length: int) -> None:
+        module_uuid, warning_type = unpack_data(data, (6, 1))
+
+        # If warning shows current module works fine, return immediately
+        if not warning_type:
+            return
+        module_type = get_module_type_from_uuid(module_uuid)
+
+        if module_type in ["None", "camera"]:
+            return
+
+        if module_type == "network":
+            self.network_uuid = module_uuid
+            return
+
+        if not self.update_in_progress:
+            self.__add_module(module_uuid & 0xFFF, module_uuid, module_type)
+
+        module_info = self.module_registry.get_by_id(sid)
+        if module_info is None or module_info.state == Updater.UPDATE_READY:
+            return
+        if warning_type == 1:
+            # in bootloader but not ready to update
+            self.check_to_update_firmware(sid)
+        elif warning_type == 2 and module_type in self.firmware_version_info:
+            # Note that more than one warning type 2 message can be received
+            module_info.level = Updater.get_update_section(data, length, self.firmware_version_info[module_type]["bootloader"])
+            if length >= 10:
+                if not self.force_update and Updater.is_up_to_date(module_info, self.firmware_version_info):
+                    self.__print(f"{module_type} ({sid}) is up to date, skipped")
+                    module_info.level = Updater.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_DONE
+                module_info.set_state(Updater.UPDATE_READY)
+                if all(module_info.state == Updater.UPDATE_READY for module_info in self.module_registry):
+                    self.__ready_event.set()
+
+    def __update_firmware_state(self, sid: int, data: str, length: int) -> None:
+        stream_state = unpack_data(data, (4, 1))[1]
+        module_info = self.module_registry.get_by_id(sid)
+        if module_info is None:
+            return
+        module_info.set_state(stream_state)
+
+        states, waiter = self.__state_waiters.get(sid, ((), None))
+        if stream_state in states and not waiter.done():
+            waiter.set_result(stream_state)
+
+    def __print(self, data, end="\n"):
+        if self.print:
+            print(data, end=end)
+
+
+class AsyncModuleFirmwareMultiUpdater():
+    """Updates the modules of many network modules from one event loop"""
+
+    def __init__(self, module_firmware_path):
+        self.module_firmware_path = module_firmware_path
+        self.module_updaters = []
+        self.update_in_progress = False
+        self.burst_mode = False
+        self.burst_chunk_frame_num = None
+        self.bulk_erase_mode = False
+        self.force_update = False
+        self.retry_budgets = None
+        self.max_concurrency = None
+        self.module_num_hint = None
+
+    def set_burst_mode(self, burst_mode: bool, chunk_frame_num: int = None):
+        self.burst_mode = burst_mode
+        self.burst_chunk_frame_num = chunk_frame_num
+
+    def set_bulk_erase_mode(self, bulk_erase_mode: bool):
+        # Erase runs of contiguous pages with a single erase command
+        self.bulk_erase_mode = bulk_erase_mode
+
+    def set_force_update(self, force_update: bool):
+        # Also flash the modules that are already up to date
+        self.force_update = force_update
+
+    def set_retry_budgets(self, retry_budgets: dict = None):
+        # Operation name to (attempts, base_delay), see RetryPolicy.BUDGETS
+        self.retry_budgets = retry_budgets
+
+    def set_module_num_hint(self, module_num_hint: int = None):
+        # Number of modules expected on each port, ends the module discovery early
+        self.module_num_hint = module_num_hint
+
+    def set_max_concurrency(self, max_concurrency: int = None):
+        # Ports beyond max_concurrency wait until a running update ends (no limit if None)
+        self.max_concurrency = max_concurrency
+
+    def update_module_firmware(self, modi_ports, firmware_version_info) -> list:
+        """Update every port, blocking until all of them are done
+
+        :return: Update result of every port, in the order of modi_ports
+        """
+        return asyncio.run(self.update_module_firmware_async(modi_ports, firmware_version_info))
+
+    async def update_module_firmware_async(self, modi_ports, firmware_version_info) -> list:
+        semaphore = asyncio.Semaphore(self.max_concurrency or len(modi_ports) or 1)
+        self.module_updaters = []
+        for modi_port in modi_ports:
+            module_updater = AsyncModuleFirmwareUpdater(modi_port, self.module_firmware_path)
+            module_updater.set_print(False)
+            module_updater.set_burst_mode(self.burst_mode, self.burst_chunk_frame_num)
+            module_updater.set_bulk_erase_mode(self.bulk_erase_mode)
+            module_updater.set_force_update(self.force_update)
+            module_updater.set_retry_budgets(self.retry_budgets)
+            module_updater.set_module_num_hint(self.module_num_hint)
+            self.module_updaters.append(module_updater)
+
+        async def update_port(module_updater):
+            async with semaphore:
+                try:
+                    return await module_updater.update_module_firmware(firmware_version_info)
+                except Exception as e:
+                    module_updater.update_error = -1
+                    module_updater.update_error_message = str(e)
+                    if module_updater.serial is None:
+                        print(f"open {module_updater.device} error")
+                    else:
+                        print(f"\n{module_updater.device}: {module_updater.update_error_message}\n")
+                    return False
+
+        self.update_in_progress = True
+        results = await asyncio.gather(*(update_port(module_updater) for module_updater in self.module_updaters))
+        self.update_in_progress = False
+
+        print("\nFirmware update is complete!!")
+        return results
@@ -4,13 +4,11 @@ import argparse
 import binascii
 import copy
 import hashlib
-import inspect
 import io
 import itertools
 import json
 import os
 import re
-import shlex
 import string
 import struct
 import sys
@@ -21,7 +19,9 @@ from base64 import b64decode, b64encode
 from io import open
 from os import path
 
+from modi2_firmware_updater.core.multi_updater import FirmwareMultiUpdater
 from modi2_firmware_updater.util.message_util import decode_message, unpack_data
+from modi2_firmware_updater.util.metrics_util import UpdateMetrics
 from modi2_firmware_updater.util.modi_winusb.modi_serialport import ModiSerialPort, list_modi_serialports
 from modi2_firmware_updater.util.module_util import get_module_type_from_uuid
 
@@ -510,24 +510,10 @@ class ESPLoader(object):
         self._port.setDTR(self._port.dtr)
 
     def read_json(self):
-        json_pkt = b""
-        while json_pkt != b"{":
-            json_pkt = self._port.read(1)
-            if json_pkt == b"":
-                return None
-            time.sleep(0.001)
-        json_pkt += self._port.read_until(b"}")
-        return json_pkt
+        return self._port.read_frame()
 
     def wait_for_json(self, timeout=3):
-        json_msg = self.read_json()
-        init_time = time.time()
-        while not json_msg:
-            json_msg = self.read_json()
-            time.sleep(0.001)
-            if time.time() - init_time > timeout:
-                return None
-        return json_msg
+        return self._port.read_frame(timeout)
 
     def send_update_finish_packet(self):
         finish_byte = b"\xAA" * 15
@@ -4549,6 +4535,7 @@ def expand_file_arguments(argv):
     Text file arguments can be split by newline or by space.
     Values are added "as-is", as if they were specified in this order on the command line.
     """
+    import shlex
     new_args = []
     expanded = False
     for arg in argv:
@@ -4665,8 +4652,24 @@ class AddrFilenamePairAction(argparse.Action):
         setattr(namespace, self.dest, pairs)
 
 
+class LazyStubCode(object):
+    """ STUB_CODE of a chip class, decoded on first use and cached.
+
+    Decoding the stubs of every chip took most of the import time of this module,
+    while only the ESP32 and ESP32-S3 stubs are ever uploaded.
+    """
+    def __init__(self, payload):
+        self.payload = payload
+        self.stub_code = None
+
+    def __get__(self, obj, objtype=None):
+        if self.stub_code is None:
+            self.stub_code = eval(zlib.decompress(b64decode(self.payload)))
+        return self.stub_code
+
+
 # Binary stub code (see flasher_stub dir for source & details)
-ESP8266ROM.STUB_CODE = eval(zlib.decompress(b64decode(b"""
+ESP8266ROM.STUB_CODE = LazyStubCode(b"""
 eNq9Pftj1DbS/4rthCQbkiLZXq/Mo2w2yQItXCEcKddL28gvelxpwzZXcj34/vbP85Jl7yaB67U/LFl5ZWk0M5q3xH8265/OF//evB1oNUlNmmTjeCfYrOy5bZ8VmycXypxcGH1y0dT328aYP2n7Ue0nbj9J+5lw\
 O+FPQe0iP7mo2t+0mp5c1I3X0FXbMNworGv80PZzfer2cY6Nc/ft5KJUruH3Ni0sleVG03gNfKEYvNB9e9n+Wg6etf9WDb8OC6kVNu64b6sGouUtdWjX1w5Va2y0S6pjfmxbTNUJNtr56xS/tf/W40unWPWtXVmd\
 DZ597c2ew/IrwVLj4d1mbrK2Ufj4K1fiuC7dXPojofv0b5GD43sPoqL2YFWa+U15fOi3k0E7HbTHg/ak1z7vtRb9vnowt879dug3ej33/Ibtj2EGY5bD9en+ms2gjd/jQTsZtNNBOxu0zaBd9tt6AI/u9Q/8Rq/n\
@@ -4736,8 +4739,8 @@ sia6FsXKK9HJAvclGGmo+SA64E6lc/oD7+zJ/iJlbNphEqBJo/0uQVTzvRyEV3e960QOTGz8ZRT+h3eH
 yxJ+uniFiFHsLiBCo/4BZ0AAe6UXeFCZd623HE5RUKZVxzSYnBqcbER8WctSWkRuRiuAw8c4FR4ZiUa8sXoRGWcs4T1oY/QOEBrsjTdC9UW7DI/nfWNZSdF7rTPR3KvYe6gkimwNa7PgwpgmwzsFEjgCU4xHTw+8\
 i+zS7hCdIGaCxzAVM5AuInfyRGkw6IuDYw6n1JNMYmmRD4Ch4hd8Msm8EEq8yoyjz8Gj4y6Myb3aRWwB/LEPP8ROLlsCBWEo8tgCO2M4m2Ous2v8DjJLWT6/DpCl66mxzCDD4c+DRP7nBcoULr0T+9jtfpa7pr//\
 5dwuzr3/OyU1/H+n+L8kk1ilxnz4f3giyVw=\
-""")))
-ESP32ROM.STUB_CODE = eval(zlib.decompress(b64decode(b"""
+""")
+ESP32ROM.STUB_CODE = LazyStubCode(b"""
 eNqVWm1z2zYS/iuyEtmRL+kAFEUCvutEdh3ZTtKp3TaKk1PvSoJkk7uMx3Z0Y8VN/vth3wiQUtO7D7JJEFzsLnaffQF/31vV69XewaDcW66V8T+1XDfp0+Vau+gGLtqbIl2u69LfVDAtPMkO4XLHXxf+1yzXTg1g\
 BKgm/lljO8OP/J90MFgt19YvVSf+NvO/aVhNKXhrSm8Z7f9nHQqeFaDt2TGGuC9gTHmStQriqHLYAAt+NPdTgUYKdIBT3SFoaZqu/KiKpDYDFr0xsaiec3i/6jHlmfEcwEyjHi5O6SnOLP6Xmf3V4afVoN2JQW9P\
 8GeEoxrU5US8kkgqR9oIC7OkyFUZKdj2OLTJO7oII6jqxadNUTzFz340AWmGajCgrdkmjlIz4rcWZv08vy+2CKzUVaQ412fL9gTqcrV9TdJ0f0xpetsptmggID+ckA565o3cmCPg+QFZbQFaN0EQV5AlG5gF2gfF\
@@ -4770,8 +4773,8 @@ UWCYq78Px9NO35wTz4Uc1+ofWDEV8V7yqVQjFZahUz/Mq2XMSW3S0egvgGel2YW1bkj6SocoWrBxOjz9
 J/k+AcJ/U60tgUxhPE+20echd62yMZ8PYJjNCACLKZ8R6ZR9CS0uP3s1j76NAROxbRXzgTQMXMOA5bYgNEcCBXN2OX8fcMFyryhMsGdv5o1MOB0tUmI1HP6kW7BMDwRAv9l8arTuD87/0a4AVp5xHyEs8vjPAHN3\
 S26polZG9pq10Tk3bL/kk4XawuFR+FoL8xv8iCoJHzYY1qqkSgo/AJp8pq5pyB93abrKd4e0FaZX426cp6vxA1kXfXUohBtoWNGaw/Zcfi98mEWs4ewnfHi17cy+ks/0RLSs8+owsNLV1d7jAX4u+s+Pq+IWPhrV\
 Kk+niVdi6p/UV6vbT+2gnurMD1bFqoi+LuWzjT1+EhOaZGo6TdMv/wXshTKs\
-""")))
-ESP32S2ROM.STUB_CODE = eval(zlib.decompress(b64decode(b"""
+""")
+ESP32S2ROM.STUB_CODE = LazyStubCode(b"""
 eNqVW3t33TQS/yo3TvNsu0i2ry13YfMALild6AvSwuacxZbtcvb05CRpIEkp+9lX87LG9i2wf9zGlqXRSDP6zUv9bee6u73eebRods5ujQs/A7+fzm6tVy/0wC+1v39223cHoU9sLo7gz0b4UIdff3brzQJagGQa\
 vvXVqHk3/JMvwmOVh1+YqktDSxF+Sz0bDFzSQGfD32JEJLAC5AMF54j7GtrMdSBn1HKapAcuQmsZugKNHOgAs3ZEsKJutg2tAw/fLQ4PvjOHB7TCwC2MaSeMBAbCrA6ezL3TE/qKPeu/0nM8I/wehFnhL/9RPyeM\
 dLAzXlbSECXjaeFxPl4UMtOovawmjFXpz/QQW3BXT+/mKwgUP4TWFBaRGJAjSGG+CvgdEr+dMBv6BRFUdWSla9V++Slb1WRBY67Wz0kbPG0zlkcb1l8gID/skC9EzhvCijsGhjdJO2vYchdX4WvSWAe9YOthV1EE\
@@ -4809,8 +4812,8 @@ Ds2dbB8ZN44gwbHr+FpVrdrkckbFl1YoJrxHUYcEh626a2DtGjOKud0GGAUJVjZKvJbThjcpoYNEMY3c
 GQa8KIR1EF+vAAbmbotdiY4zuiQF6R60vIPxKPe+n+fmnH9MpBt0Ul+JtimL4+FKgy++m36qiN4LNFebYD/AX+iWWawVYi2w5RpNyiowLWl383YDORiNbRRuWA6FqnRLXa2KQMkl2AkxfJaCBlRYx4Q/dvOskmL4\
 ED/sxmvtqKt42zxVTknBVtgMF09gxAdaO37tOP7EJEK5nfCaij+5kmf2NmVePImJEO7BTaM5xfh5RDLWUmINe/M9XT3XMEcr/5lBllaMhiaRlfFe7TxY4P+f+fe76/oK/heNNWVWmWVR5OFLd359dTc0lstlGhrb\
 +rqe/Hebvj3Y4S8jQkWaGpP//j8geRE3\
-""")))
-ESP32S3BETA2ROM.STUB_CODE = eval(zlib.decompress(b64decode(b"""
+""")
+ESP32S3BETA2ROM.STUB_CODE = LazyStubCode(b"""
 eNqNW3t31Eay/yozY4wfmF21ZkbqJrnBDslgks1dQ4gxrM9ZWi0pJIf1MWayY3thP/tVvdSlh7n5w/aM1I+q6nr8qqr9n511db3eeTQpds6vzeL82ibn18n8bfMrUV98eHB+HYrHzdc4JjviUeb8ui6an7r5Hp41\
 A5MJvXGu+WubBxlNhGftDEsz2sHe0mB8mdNLD8+TdfOQX1YJ/U2SaTMi6y2Bo9LzhpUKxjYLmbIZksSdk3Y+/DScmaC+xFHwJn4hTqeRTd4Rt2ve1b7zeBe4nTQfXcOzazao0uYJyGCp9ziKHADP1XJMIIvIeyuM\
 SjNRzGpk+rpqZGZhvQWsA8SazoKOhnUl8hJfvX2p+WxohpnlULhrOnub3Ds9prc40v+ZkcOTOJi0Yp8MDgA4FHJQMkG4ajWNdavdlRl0Sh1Rl1yPPJe+ow/xCUr49GZUnT41T1NgZZbAmcKJjGpVckj0VkJsM645\
@@ -4853,8 +4856,8 @@ zGayHzQ2THI1VmvqAZUrLpeL/3GrTrVkyv9HUEoDuODbX+kN15zxwmLijux9WUE6jYhZXBsMt+V/dijo
 L416T9PI/4IxQ6sM4w6jKNKu2FlX+4TwOzlXvKdLZZd2PiIlL3eKWgjhl3lHcClm3HCjLeFJ6OVBrWvlXmC7MtvlnjQeIiSF2Y2OI/neLyv9TxXPeEHErYdKrSTqhPAEbPp/OuFz7xd49pUM3906Jchgq23ua3Oz\
 2HPiaCUdKocellLRvoovtRuXBARsD10lZIzGqCKocpF4j6O3XpWodDr7S3/tu64yO3HrbUbBPRL6By+KjiGk3fJKkqvEFEHd/BN1HeJFovs8fHl/xm3dTFU69N3uBG5O0n6weZjJgjXHWNpOomHAEOriTTQc/lBd\
 HlzccZG8lH9kFN6yzhKzSFNXWDsHE/wn4X9+XPsr+Fdhk+T5PHdJnjZvqov11Y08tGZp4GHp157/p1j1qnf4jV4oSXOXZfbz/wH6hAMl\
-""")))
-ESP32S3ROM.STUB_CODE = eval(zlib.decompress(b64decode(b"""
+""")
+ESP32S3ROM.STUB_CODE = LazyStubCode(b"""
 eNqNW3t31MaS/yrjMTa2gb1qzYzUTbLBDsngJHv3AiGGsD5nabWkkBzWx5jJjs2F+9lX9eouPczmD8OM1I/qev6qquefdzfN9ebuw1l19/zaLM+vbXZ+nS3edP9k6osP986vQ/Wo+5rGFCc8ypxft1X313bfww/d\
 wGxGb5zr/rfdg4ImwrM4w9KMONhbGowvS3rp4Xm26R7yyyaj/7NspxtRDJbAUfl5d5QGxnYLmbobkqWdszgf/rqTmaC+pFHwJn2hk+6kY/KOuF33rvW9xwdw2ln30XVndt0GTd49AR6s9B4n6QRw5mY1xZBlOntk\
 RqMPUc1bPPR10/HMwnpLWAeINb0FHQ3rc+QFvnrzQp+zoxlm1mPmbkj2NrtzdkpvcaT/KyPHkrg/i2yfjQQAJxRykDNBThU1jXUr7soHdEodUZfcgDyXv6UP6Qly+OxmUp0+dU9zOMo8A5mCRCa1KjsmehshthvX\
@@ -4897,8 +4900,8 @@ vveV33DNGW8qZu7E7ssK0mdEzOJiMNyTn+pQ0JMrZjX3wI1EN/mFCAsWc7lasur71E+XTLnWl1nCONNy
 REpebhNFCOFXZY9xOWbccJst40no5UGtW+VeYLu6OOCONAoRksLiRseR8vCXtTIL+BEmLoi49ViplUSdEB6DTf97L3we/gLPvpLhB7tnBBlss8ddbW4Ve04craRD9djDUio6VPGVduOSgIDtoauEjNEYVQRVLhJv\
 cQzWa9QvJWzxb8O1b7u67MStx4yCeyT0uy6KjiHk/fJKVqrEFEHd4hN1HdIdon0evtqfc1O3UJUOfZc7gzuTtB9sHuayYMsxlraTaBgwhLp0Bw2HP1AXB5e3XByv5feLcrait8Q80dRn1t37M/xt8H9/2Pgr+IWw\
 ycpyUbqszLs3zcXm6kYeWrMy8LD2G88/JVad6rv8Ri+U5aUrCvv5/wDWE/uZ\
-""")))
-ESP32C3ROM.STUB_CODE = eval(zlib.decompress(b64decode(b"""
+""")
+ESP32C3ROM.STUB_CODE = LazyStubCode(b"""
 eNqVWmt7EzcW/itpEkjhaXcley4aaINNbZwLsNCHkg1rtsxoZlJomy3BLGG3+e+r91xGYwcb9kNiW9LoHJ3re47mv3uL5nKxd2er2hvPL63dnl/65Gb4N5hfmix8hr8qz8OP5BXmZ/PL2oXhKk9krMon4be7N5+P\
 5peFnV+6ij+b8FQ1GG2H6WIwCbsbTIZ9nQnfXVjthvPLkvYOf2HQDt/PL9s0/Gh5ZREm6xQ0+Glr5Tv+zKsjEA7fsE0RnqBRMF8+Buc/4ixyjAYH8/I0kQust/VpfsTMX3rzEAwswmhyb34R2A8MtYNRNdkJu7td\
 ZqAaHAaOBpP7h9vhQZOW8UROTrQ3P197mqswGog3gWFbhC9tmPGB86rNw3Ng6s/jsK5mIeLZts3zNRNKesxyUW3VdU7H5P3AfCYCG3SSg/zDdlDkEJ8/XAkv7oR0BuankY4Jn65Y0uAq0eLelZBmCqMeD0op/rb+\
@@ -4933,8 +4936,8 @@ atbSGd9jTggPYIhuSRVLrxWpi4dxZn/9So+9Efhg158qRFTZ9OkkdGlGNf/iXIzUz2/t/FtvWNV2Mm5N
 wZ9SmQpM1laT1b+hhF5TrZPmK/wfnNDh9wRYwG68pgzkF8J4tZwXQaUanCA1EKjg2k474dKGML1XIHzMVBTx5AUCekuIokvJWanJ5CZCjw38VSfSsSnUIwUFSzZZcPOYsLqmIR+JSxrp++VLuXfwkxjc6LFSKf+N\
 HPKab61xI4htPcy9/ZTJEdamyOYk6zgl91dpmnze9LduiAtJjVZRIfykRas/e/YArf7s9CZa/dkLWASa/dlxi3I9e/gAISN7NF903f69b7boTd+f3y3KC7zva02eJ9a6xISZ5nxx8bEbHCbOhcG6XJT0YjDEOiLX\
 2JPh/i7GZklhkqv/AdnBtYo=\
-""")))
-ESP32C6BETAROM.STUB_CODE = eval(zlib.decompress(b64decode(b"""
+""")
+ESP32C6BETAROM.STUB_CODE = LazyStubCode(b"""
 eNrNWlt7G7cR/SuyJEuJm68FyL3BiSXSpkTJtzqpY9Uu3XoX2FWdC79YpmK5Df97cebCXVIi5cc+UCKxu8Bg5syZC/a/+7P6arZ/f6van1wZO7my8VPl8Ts+5t3jyZUv4rf+5Kp0k6uCRvfiYPk8/sl+iH+SOJTF\
 //V2/OPl6YSenlw14XVOcxzGP+ZpnL8/i6PJ4eRiclWb+LU3qEY7cfZilwWoeqeTq9AbPTzdjg+atIyr9uIn3lsUg/inP9mfTDE9JruMM6TxR8N3uXweR+PidRTYuviliVd8lLxq8sk+CfXHk3hfiPdX/GzT5Pma\
 C7r0kPVC24yfEHLaJs8H4TNRWG+hufiJenPx4/v4/2gushRn2OMAwh+165j4v3BDVsHNi7rDuSzNKww6MuhK7W/rH0H7PHtc7/rUMFeSj6CeaBzX53mjOaOBnH+iK8PY8aEyPuybt7llddo+G5lvt8VJXCSM49x2\
@@ -4967,8 +4970,8 @@ emNnWxTfpzJjxlGypR1DpG2Fy1lVM8oZXrUHrqpCjhD+BaF1Kjwq5Y0vLxlBNHeqcxdZ20lRs62hkL9R
 oOEs7OLkIdqU91lEFvkvMMT2uHcir7MwnIr0DylShcO1p2T10xcORiRfp00PvRc99s99yS+oSNPwQXnagGM97RcJVNU7Q5ig81Gq3/TgJZXDa9N5F8O3UYuoT15joLdSiGZKjlB1JmcAain8Dz3poTh1Tck5KLIQ\
 XVD/Vc8S8vb0x+SLkLLsoxSye1LeK9Hpk2Z9soJPdt3z1iN1LeC3ss8MAErDa0IIxaTiFgGMSb7ITwba4E+kFUUl8ovmJfD68jjGgSp7vfcGYe0N4PMPXH7SoJzPnh4/w+Vnk1mniU+UYPa/2aLXPf/1cVZe4KVP\
 a/I8sbZITLxST2cXnxeD/X6viIOhnJX6dihAFZ1pX4a7sxibJc4k8/8BksMRng==\
-""")))
-ESP32H2BETA1ROM.STUB_CODE = eval(zlib.decompress(b64decode(b"""
+""")
+ESP32H2BETA1ROM.STUB_CODE = LazyStubCode(b"""
 eNrFWmtbG8cV/isYMCRunnZG2ts4MUi2QFyM66SOKa7cend2lzoXnoBFjNvov3fec9GsAMn+1g8CaXZ35sw573nPZfa/29PmZrr9eK3antwYO7mx4VPl4Ts+5t3R5MYX4Vt/clO6yU1Bo1thsHwR/mQ/hD9JGMrC\
 /2Y9/PHydEJPT27a+iynOXbDH/M8zN+fhtFkd3I1uWlM+NobVKONMHuxyQJUvcPJTd0bPT1cDw+atAyr9sIn3FsUg/CnP9meXGB6THYdZkjDj5bvcvksjIbFmyCwdeFLG674IHnV5pNtEuqP43BfHe6v+Nm2zfMl\
 F3TpIeuFthk+dZ3TNnk+CJ+JwnpzzYVP0JsLH9/H/2czkaU4xR4HEH4vrmPC/8INWQX3L+p2Z7I0rzDoyKArxd/WP4P2efaw3t2pYa4kH0E9wTiuz/MGcwYDOX+sK8PY4aEyPOzbt7llddo+G5lvt8VBWKQeh7nt\
@@ -5001,8 +5004,8 @@ XRTfpxpjyhlUpB1DpG2Fy1lVU0oYXsfjVlUhRwj/ktB6ITwqtY0vrxlBNHeqcxdZbKSo2ZZQyN+o7l88
 rg6eokv5mEVkkf8CQ6yPewfyMgvDqUj/kApVOFwbSlY/feFgRPJl2vTQe9Fj/9yW/IIqNA0flKcNONbTfpFAVb1ThAk6F6XiTU9dUjm0Np03MXyMWkR98hIDvZNCNFNyhGoyOQBQS+F/3ZMGilPXlJyDIgvRBbVf\
 9SAhj0c/Jp+HlEUfpZDdk9peiU6fNMuTFXyyu563HKlLAb+WfWIAUBreEEIoJhWfEcCY5Iv8ZKAt/kT6UFQfv2xfAa+v9kMcqLKzrTcIa28An3/g8nGLWj57vn+CyyeTaaeHT5Rgtr9Zo5c9//VhWl7hlU9r8jyx\
 tkhMuNJcTK8+zQf7/V4RButyWuq7oQBVcKZtGe7OYmyWOJPM/gf0hhEn\
-""")))
-ESP32H2BETA2ROM.STUB_CODE = eval(zlib.decompress(b64decode(b"""
+""")
+ESP32H2BETA2ROM.STUB_CODE = LazyStubCode(b"""
 eNrNWmtb20YW/isECLTZ24yt26QbsFMbY0iyaTcpSx/TVhpJbLotz0JMQ3br/77znoskG+zk434w2KPRmTNn3vOei/Tf/Xl1N99/ulXsz+6Mnd3Z8CnS8B0f89PJ7M5n4Vt/dpe72V1Go3thMH8V/iTfhj9RGErC\
 /2o7/PFyd0R3z+7q8jwlGYfhj3kR5PfnYTQ6nN3M7ioTvvYGxWgnSM92WYGiN53dlb3R8+l2uNHEeVi1Fz5hbpYNwp/+bH92BfEQdhskxOFHzbNcugijYfEqKGxd+FKHKz5oXtTpbJ+U+v00zCvD/ILvres0XXNB\
 lx6yXWib4VOWKW2T5UH5RAzWaywXPsFuLnx8H/+/Xogu2Rn2OIDy43YdE/5nbsgmeHhRd7iQpXmFQUcHXan9bf3XsD5LD+vdF43jitIRzBMOx/VZbjjOcEDOn+rKOOxwUx5u9vVFatmcts+HzNNtdhwWKSdBth0F\
@@ -5034,8 +5037,8 @@ WdJ2N/TM1rFVZd6Q/y4/FhX7166ry1TCby5P3GH05RlqC25K7g+p5v5ykwJbf+c0pQgFVtXpocTXHfvq
 aRigVPiH0389bOppmJxf29HBvOaGXWb1VY3f9GGrYidh197QQZNXauoDbgw2qKOgilI7CLxqHiHe0Gnpc4moXcHEx/IGQM052c3xc2j3VHqJpPJf4Pbbk96xvFPCEAoonXHioAmsdnesfvrCtygA1gRBPALrndHW\
 9yXnAGT8QA4RIZyyvlJ2S/3h3hniAeUBVEDpg49YnhybzusQopSTQllfJqAXQzR2IShVibTh9Zzwv4ykleHUH0vONCiEEEdQVNR2fsrdI11cYseyV9JLHD0psZXa9E6zPkUZZPd9bQ02o03EQY2YXFyvInBQ/Mk3\
 ro758Wd5BnYp7TYXfRQkJ6/30EJPUMkkaKIn0xpN9OTkCO6enO6hnE5e4DLa6L2LqtNGJxow+3/cohcuf3w/z2/w2qU1aRpZm0UmXKmu5jcfm8F+v5eFwTKf5/p+JjAVPGlfhrtSjE0iZ6LF/wCAbuTq\
-""")))
-ESP32C2ROM.STUB_CODE = eval(zlib.decompress(b64decode(b"""
+""")
+ESP32C2ROM.STUB_CODE = LazyStubCode(b"""
 eNq1Wmt7E8cV/iuObXBC8/SZ0V4HgpFARrbBFFKCCxVNdmd2XUhwYyMH00b/vfOei3YlWyb90A+WpdmZM2fO5T2X2f/szJrL2c7djXpnemns9NLGv7qI3/FnfjqcXvoyfkuml5WbXpY0ejsOVs/iR/59/EjjUB7/\
 N5vxw8vqlFZPL9vwugCN6kH8ME8j/WQWR9MH0/PpZWPi18GwHm9F6uU2M1APDqaXYTB+eLAZF5qsirsO4l+cW5bD+JFMd6anIA9iF5FCFn+0PMsV8zgaN28iw9bFL2184iPndVtMd4ip35/EeSHOr3lt2xbFmge6\
 9YjlQseMfyEUdEymB+ZzEdhgIbn4F+Xm4p9P8P/RXHgpj3HGIZjf6/Yx8X/pRiyC6zd1D+ayNe8w7PGgO3W/rX8E6TP1uN9V0lBXWozjZx2V4xKmG9UZFeT8E90Zyo6LqrjYt28Ly+K0CSuZp9tyP24SJpG2HUcT\
@@ -5068,7 +5071,7 @@ tPRCFULpk9VXVaSeIvEcS8/akj1fsDHX8lqSGnfNtfmO4AplBYncqxZd3/AawY57jUqzu3bakLGv9tdX
 +17zLM7X9x+iz3iX1afnaChb2JwM9uWlE+3c/i7lqaC39pKs/iWCvojia3IcyGzAbrkjiQUk5zVqUI425CBP50XyVA+OER3o/pKqNr0nyeRy2fRel/BdsCLEkzcN6MURQpeKA1OTS+9ej43GXUikb+LUIyXZoIBC\
 KIFWbaN3AEV3WWOKRSRZdk2K1AOp6hXfdOWNSbrBNeiqw62x0WRt/lF8Zu1T/t2QeVAcKr9YIqR/yD3ApzT4SFmBt2vz5+1L2OvLxxH+6/z17TeIZm9gO3/H4yctKvj86eMjPD6aznpdeEICs/PtBr2R+ePHWXWO\
 9zKtKYrU2jI18UlzOjv/vBhMkkEZB0M1q/QFThhVdKYdGe5TMQOXuSKf/xdxa/YZ\
-""")))
+""")
 
 
 class ESP32FirmwareUpdater():
@@ -5090,6 +5093,7 @@ class ESP32FirmwareUpdater():
         self.print = True
 
         self.module_firmware_path = module_firmware_path
+        self.metrics = UpdateMetrics("esp32", port)
 
     def set_print(self, print_):
         self.print = print_
@@ -5130,28 +5134,28 @@ class ESP32FirmwareUpdater():
             time.sleep(0.2)
 
     def read_json(self, port):
-        json_pkt = b""
-        while json_pkt != b"{":
-            if not port.is_open:
-                return None
-            json_pkt = port.read()
-            if json_pkt == b"":
-                return None
-            time.sleep(0.001)
-        json_pkt += port.read_until(b"}")
-        return json_pkt.decode("utf8")
+        if not port.is_open:
+            return None
+        json_pkt = port.read_frame()
+        return json_pkt.decode("utf8") if json_pkt else None
 
     def wait_for_json(self, port, timeout=2):
-        json_msg = self.read_json(port)
-        init_time = time.time()
-        while not json_msg:
-            json_msg = self.read_json(port)
-            time.sleep(0.001)
-            if time.time() - init_time > timeout:
-                return None
-        return json_msg
+        if not port.is_open:
+            return None
+        json_pkt = port.read_frame(timeout)
+        return json_pkt.decode("utf8") if json_pkt else None
 
     def update_firmware(self, update_interpreter, firmware_version_info):
+        try:
+            self.__update_firmware(update_interpreter, firmware_version_info)
+        finally:
+            self.metrics.finish()
+
+    def __module_labels(self):
+        # (type, uuid) the metrics of the esp32 of the network or camera module are recorded under
+        return ("network" if self.is_network else "camera", self.network_uuid)
+
+    def __update_firmware(self, update_interpreter, firmware_version_info):
         self.firmware_version_info = firmware_version_info
 
         if update_interpreter:
@@ -5164,7 +5168,8 @@ class ESP32FirmwareUpdater():
             self.update_in_progress = True
 
             self.__print("get network uuid")
-            self.network_uuid, self.is_network = self.get_network_uuid(self.esp)
+            with self.metrics.phase("discovery"):
+                self.network_uuid, self.is_network = self.get_network_uuid(self.esp)
 
             time.sleep(1)
             self.__print("Reset interpreter...")
@@ -5219,7 +5224,8 @@ class ESP32FirmwareUpdater():
             network_serialport = ModiSerialPort(port=self.port)
             time.sleep(0.3)
             self.__print("get network uuid")
-            self.network_uuid, self.is_network = self.get_network_uuid(network_serialport)
+            with self.metrics.phase("discovery"):
+                self.network_uuid, self.is_network = self.get_network_uuid(network_serialport)
             network_serialport.close()
             time.sleep(1)
 
@@ -5423,6 +5429,7 @@ class ESP32FirmwareUpdater():
 
             operation_func = globals()[args.operation]
 
+            import inspect
             if PYTHON2:
                 # This function is depreciated in Python3
                 operation_args = inspect.getargspec(operation_func).args
@@ -5440,6 +5447,7 @@ class ESP32FirmwareUpdater():
                     self.__print("Found %d serial ports" % len(ser_list))
                 else:
                     ser_list = [args.port]
+                entry_begin = time.perf_counter()
                 self.esp = esp or get_default_connected_device(ser_list, port=args.port, connect_attempts=args.connect_attempts,
                                                                initial_baud=initial_baud, chip=args.chip, trace=args.trace,
                                                                before=args.before)
@@ -5567,8 +5575,12 @@ class ESP32FirmwareUpdater():
                     detect_flash_size(self.esp, args)
                     if args.flash_size != 'keep':  # TODO: should set this even with 'keep'
                         self.esp.flash_set_parameters(flash_size_bytes(args.flash_size))
+                self.metrics.add_duration("bootloader_entry", time.perf_counter() - entry_begin)
 
+                write_begin = time.perf_counter()
                 try:
+                    # esptool compresses the images, the bytes counted are those of the files
+                    self.metrics.add_bytes(sum(os.path.getsize(argfile.name) for address, argfile in getattr(args, "addr_filename", [])), *self.__module_labels())
                     operation_func(self.esp, args)
                 except Exception as e:
                     self.update_error_message = str(e)
@@ -5583,9 +5595,11 @@ class ESP32FirmwareUpdater():
                             argfile.close()
                     except AttributeError:
                         pass
+                    self.metrics.add_duration("esp32_write", time.perf_counter() - write_begin, *self.__module_labels())
                 self.esp.firmware_progress = 90
 
                 # Handle post-operation behaviour (reset or other)
+                reboot_begin = time.perf_counter()
                 if operation_func == load_ram:
                     # the ESP is now running the loaded image, so let it run
                     self.__print('Exiting immediately.')
@@ -5602,7 +5616,9 @@ class ESP32FirmwareUpdater():
                     self.__print('Staying in bootloader.')
                     if self.esp.IS_STUB:
                         self.esp.soft_reset(True)  # exit stub back to ROM loader
+                self.metrics.add_duration("reboot", time.perf_counter() - reboot_begin)
 
+                verify_begin = time.perf_counter()
                 if self.update_error != -1:
                     if self.is_network:
                         self.esp.firmware_progress = 94
@@ -5621,6 +5637,7 @@ class ESP32FirmwareUpdater():
                         self.esp.wait_update_finish_packet()
                         time.sleep(0.01)
                         self.esp.firmware_progress = 98
+                self.metrics.add_duration("esp32_verify", time.perf_counter() - verify_begin, *self.__module_labels())
 
                 self.__print("ESP firmware update is complete!!")
                 self.esp.firmware_progress = 100
@@ -5639,29 +5656,26 @@ class ESP32FirmwareUpdater():
             time.sleep(1)
 
 
-class ESP32FirmwareMultiUploder():
+class ESP32FirmwareMultiUploder(FirmwareMultiUpdater):
     def __init__(self, module_firmware_path):
-        self.update_in_progress = False
-        self.ui = None
-        self.list_ui = None
-        self.task_end_callback = None
-        self.module_firmware_path = module_firmware_path
-
-    def set_ui(self, ui, list_ui):
-        self.ui = ui
-        self.list_ui = list_ui
-
-    def set_task_end_callback(self, task_end_callback):
-        self.task_end_callback = task_end_callback
+        super().__init__(module_firmware_path)
+        self.update_interpreter = False
 
     def update_firmware(self, modi_ports, update_interpreter=False, firmware_version_info={}):
+        self.update_interpreter = update_interpreter
+        if self._in_processes(modi_ports):
+            self._begin_update(len(modi_ports))
+            if not update_interpreter and self.ui:
+                self.__set_progress_text(update_interpreter, 0)
+            self._update_in_processes("update_firmware", modi_ports, (update_interpreter, firmware_version_info), "\nESP firmware update is complete!!")
+            return
+
+        self.modi_ports = []
         self.esp32_updaters = []
         self.network_uuid = []
         self.state = []
 
-        for i, modi_port in enumerate(modi_ports):
-            if i > 9:
-                break
+        for modi_port in modi_ports:
             try:
                 esp32_updater = ESP32FirmwareUpdater(
                     port=modi_port,
@@ -5672,22 +5686,12 @@ class ESP32FirmwareMultiUploder():
             except Exception as e:
                 print(e)
             else:
+                self.modi_ports.append(modi_port)
                 self.esp32_updaters.append(esp32_updater)
-                self.state.append(0)
+                self.state.append(-1)
                 self.network_uuid.append('')
 
-        if self.list_ui:
-            self.list_ui.set_device_num(len(self.esp32_updaters))
-            self.list_ui.ui.close_button.setEnabled(False)
-
-        self.update_in_progress = True
-
-        for index, esp32_updater in enumerate(self.esp32_updaters):
-            th.Thread(
-                target=esp32_updater.update_firmware,
-                args=(update_interpreter, firmware_version_info),
-                daemon=True
-            ).start()
+        self._begin_update(len(self.esp32_updaters))
 
         if not update_interpreter and self.ui:
             if self.ui.is_english:
@@ -5696,7 +5700,10 @@ class ESP32FirmwareMultiUploder():
                 self.ui.update_network_submodule_button.setText("네트워크/카메라 서브모듈 업데이트가 진행중입니다. (0%)")
 
         delay = 0.1
+        last_progress_bar = None
         while True:
+            self._start_queued_updaters(-1, (0, 1), lambda index, modi_port: self.__start_updater(index, update_interpreter, firmware_version_info))
+
             is_done = True
             current_sequence = 0
             total_sequence = 0
@@ -5704,10 +5711,12 @@ class ESP32FirmwareMultiUploder():
             for index, esp32_updater in enumerate(self.esp32_updaters):
                 if esp32_updater.network_uuid is not None and len(self.network_uuid[index]) == 0:
                     self.network_uuid[index] = f'0x{esp32_updater.network_uuid:X}'
-                    if self.list_ui:
-                        self.list_ui.network_uuid_signal.emit(index, self.network_uuid[index])
+                    self._emit("network_uuid_signal", index, self.network_uuid[index])
 
-                if self.state[index] == 0:
+                if self.state[index] == -1:
+                    # queued
+                    is_done = False
+                elif self.state[index] == 0:
                     # wait for network uuid
                     is_done = False
                     if esp32_updater.update_in_progress and esp32_updater.esp:
@@ -5724,66 +5733,71 @@ class ESP32FirmwareMultiUploder():
                         current_sequence += current
                         total_sequence += total
 
-                        if self.list_ui:
-                            if len(self.network_uuid[index]):
-                                self.list_ui.network_uuid_signal.emit(index, self.network_uuid[index])
-                            self.list_ui.progress_signal.emit(index, int(value))
+                        self._emit("progress_signal", index, int(value))
                     else:
+                        # one more round to report the result
+                        is_done = False
                         self.state[index] = 2
                 elif self.state[index] == 2:
                     # end
                     current_sequence += 100 * esp32_updater.esp.firmware_num
                     total_sequence += 100 * esp32_updater.esp.firmware_num
                     if esp32_updater.update_error == 1:
-                        if self.list_ui:
-                            self.list_ui.network_state_signal.emit(index, 0)
-                            self.list_ui.progress_signal.emit(index, 100)
+                        self._emit("network_state_signal", index, 0)
+                        self._emit("progress_signal", index, 100)
                     else:
                         print("\n" + esp32_updater.update_error_message + "\n")
-                        if self.list_ui:
-                            self.list_ui.network_state_signal.emit(index, -1)
-                            self.list_ui.error_message_signal.emit(index, esp32_updater.update_error_message)
+                        self._emit("network_state_signal", index, -1)
+                        self._emit("error_message_signal", index, esp32_updater.update_error_message)
 
                     self.state[index] = 3
                 elif self.state[index] == 3:
                     current_sequence += 100 * esp32_updater.esp.firmware_num
                     total_sequence += 100 * esp32_updater.esp.firmware_num
 
-                time.sleep(0.001)
-
             if total_sequence != 0:
                 if self.ui:
-                    if update_interpreter:
-                        if self.ui.is_english:
-                            self.ui.delete_user_code_button.setText(f"User code delete is in progress. ({int(current_sequence/total_sequence*100)}%)")
-                        else:
-                            self.ui.delete_user_code_button.setText(f"사용자 코드 삭제가 진행중입니다. ({int(current_sequence/total_sequence*100)}%)")
-                    else:
-                        if self.ui.is_english:
-                            self.ui.update_network_submodule_button.setText(f"Network/Camera submodule update is in progress. ({int(current_sequence/total_sequence*100)}%)")
-                        else:
-                            self.ui.update_network_submodule_button.setText(f"네트워크/카메라 서브모듈 업데이트가 진행중입니다. ({int(current_sequence/total_sequence*100)}%)")
+                    self.__set_progress_text(update_interpreter, int(current_sequence / total_sequence * 100))
 
-                if self.list_ui:
-                    self.list_ui.total_progress_signal.emit(int(current_sequence / total_sequence * 100.0))
-                    self.list_ui.total_status_signal.emit("Update...")
+                self._emit("total_progress_signal", None, int(current_sequence / total_sequence * 100.0))
+                self._emit("total_status_signal", None, "Update...")
 
-                print(f"{self.__progress_bar(current_sequence, total_sequence)}", end="")
+                progress_bar = self._progress_bar(current_sequence, total_sequence)
+                if progress_bar != last_progress_bar:
+                    print(progress_bar, end="")
+                    last_progress_bar = progress_bar
 
             if is_done:
                 break
 
             time.sleep(delay)
 
-        self.update_in_progress = False
-
-        if self.task_end_callback:
-            self.task_end_callback(self.list_ui)
+        self._end_update("\nESP firmware update is complete!!")
+        self._report_metrics([esp32_updater.metrics for esp32_updater in self.esp32_updaters])
 
-        print("\nESP firmware update is complete!!")
+    def _show_total_progress(self, total_progress: int) -> None:
+        print(self._progress_bar(total_progress, 100), end="")
+        if self.ui:
+            self.__set_progress_text(self.update_interpreter, total_progress)
 
-    @staticmethod
-    def __progress_bar(current: int, total: int) -> str:
-        curr_bar = int(50 * current // total)
-        rest_bar = int(50 - curr_bar)
-        return (f"\rFirmware Update: [{'=' * curr_bar}>{'.' * rest_bar}] {100 * current / total:3.1f}%")
+    def __set_progress_text(self, update_interpreter, total_progress):
+        if update_interpreter:
+            if self.ui.is_english:
+                self.ui.delete_user_code_button.setText(f"User code delete is in progress. ({total_progress}%)")
+            else:
+                self.ui.delete_user_code_button.setText(f"사용자 코드 삭제가 진행중입니다. ({total_progress}%)")
+        else:
+            if self.ui.is_english:
+                self.ui.update_network_submodule_button.setText(f"Network/Camera submodule update is in progress. ({total_progress}%)")
+            else:
+                self.ui.update_network_submodule_button.setText(f"네트워크/카메라 서브모듈 업데이트가 진행중입니다. ({total_progress}%)")
+
+    def __start_updater(self, index, update_interpreter, firmware_version_info) -> bool:
+        # ESP32FirmwareUpdater opens its port in update_firmware, so queued ports hold no resources
+        self.state[index] = 0
+        th.Thread(
+            target=self.esp32_updaters[index].update_firmware,
+            args=(update_interpreter, firmware_version_info),
+            daemon=True
+        ).start()
+        return True
@@ -0,0 +1,358 @@
+import threading as th
+import time
+from collections import deque
+
+from modi2_firmware_updater.util.crc_util import calc_page_crc
+from modi2_firmware_updater.util.firmware_util import ERASE_UNIT_TIME, FirmwareFrames
+from modi2_firmware_updater.util.retry_util import RetryPolicy
+
+# Firmware states reported by the modules (0x0C), as in ModuleFirmwareUpdater
+NO_ERROR = 0
+CRC_ERROR = 4
+CRC_COMPLETE = 5
+ERASE_ERROR = 6
+ERASE_COMPLETE = 7
+
+
+class FlashPage:
+    """One erase -> data -> crc round of a flash job
+
+    :param frames: FirmwareFrames holding the data of the page
+    :param page_begin: Offset of the page in frames
+    :param page_address: Flash address the page is written to
+    :param checksum: Checksum expected by the crc command
+    :param erase_page_num: Erase units of the page, as counted by the erase command
+    :param run_page_num: Pages erased along with this one, itself included
+    """
+
+    __slots__ = ("frames", "page_begin", "page_address", "checksum", "erase_page_num", "run_page_num", "erased", "matching")
+
+    def __init__(self, frames: FirmwareFrames, page_begin: int, page_address: int, checksum: int, erase_page_num: int, run_page_num: int = 1):
+        self.frames = frames
+        self.page_begin = page_begin
+        self.page_address = page_address
+        self.checksum = checksum
+        self.erase_page_num = erase_page_num
+        self.run_page_num = run_page_num
+        # set once an earlier page erased this one with its run
+        self.erased = False
+        # set when the module already holds the page
+        self.matching = False
+
+
+class FlashJob:
+    """Flashing of one firmware section of one module, as a state machine
+
+    The job walks its pages through the erase -> data -> crc handshake of
+    ModuleFirmwareUpdater, the end-flash (version) page being the last one.
+    It never blocks, FlashScheduler decides when each step is sent.
+
+    In delta mode the job first sends the crc command of every image page,
+    and the pages the module already holds are dropped from the job.
+
+    :param module_info: ModuleRecord of the module to flash
+    :param section: "app", "bootloader" or "second_bootloader"
+    :param pages: FlashPage list, in writing order
+    :param retry_policy: RetryPolicy bounding the erase and crc retries of a page
+    :param max_run_pages: Consecutive pages erased by a single erase command at most
+    :param delta: Probe the crc of the image pages before writing any of them
+    """
+
+    ERASE = 0
+    WAIT_ERASE = 1
+    SEND_DATA = 2
+    CRC = 3
+    WAIT_CRC = 4
+    DONE = 5
+    FAILED = 6
+    PROBE = 7
+    WAIT_PROBE = 8
+
+    def __init__(self, module_info, section: str, pages: list, retry_policy: RetryPolicy = None, max_run_pages: int = 1, delta: bool = False):
+        self.module_info = module_info
+        self.section = section
+        self.pages = pages
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.max_run_pages = max_run_pages
+        # FirmwarePlan the pages come from, if built by from_image
+        self.plan = None
+
+        self.page_index = 0
+        self.probe_index = 0
+        self.matching_page_num = 0
+        self.deadline = None
+        # perf_counter time the pending command was sent at
+        self.sent_at = 0.0
+        self.erase_retry = self.retry_policy.budget("erase")
+        self.crc_retry = self.retry_policy.budget("crc")
+        # perf_counter time the backoff of a failed command ends at
+        self.retry_at = 0.0
+        self.error_message = ""
+        self.bulk_erase_rejected = False
+
+        if not pages:
+            self.state = self.DONE
+        elif delta and len(pages) > 1:
+            self.state = self.PROBE
+        else:
+            self.__group_runs()
+            self.state = self.ERASE
+
+    @classmethod
+    def from_image(
+        cls, module_info, section: str, plan, firmware_frames, end_flash_layout, end_flash_data: bytearray,
+        max_run_pages: int = 1, delta: bool = False, resume_page_num: int = 0, retry_policy: RetryPolicy = None
+    ):
+        """Job writing the non-empty pages of an image, then its end-flash data
+
+        :param plan: FirmwarePlan of the image
+        :param firmware_frames: FirmwareFrames of plan.image
+        :param end_flash_layout: FlashLayout giving the end-flash address
+        :param end_flash_data: End-flash data written after the image
+        :param max_run_pages: Pages erased by a single erase command at most
+        :param delta: See FlashJob
+        :param resume_page_num: Image pages already written and verified, they are left out
+        :param retry_policy: See FlashJob
+        """
+        # The plan already left out the empty pages and those holding the end-flash or uuid data
+        pages = [
+            FlashPage(
+                firmware_frames,
+                page_begin,
+                plan.page_address(page_begin),
+                plan.checksums[page_begin],
+                plan.layout.erase_page_num,
+            )
+            for page_begin in plan.page_begins[resume_page_num:]
+        ]
+
+        end_flash_data = bytes(end_flash_data)
+        pages.append(FlashPage(
+            FirmwareFrames(end_flash_data, len(end_flash_data)),
+            0,
+            end_flash_layout.end_flash_address,
+            calc_page_crc(end_flash_data),
+            end_flash_layout.erase_page_num,
+        ))
+        job = cls(module_info, section, pages, retry_policy=retry_policy, max_run_pages=max_run_pages, delta=delta)
+        job.plan = plan
+        return job
+
+    @property
+    def page(self) -> FlashPage:
+        return self.pages[self.page_index]
+
+    @property
+    def progress(self) -> int:
+        return 100 * self.page_index // len(self.pages) if self.pages else 100
+
+    @property
+    def erase_unit_num(self) -> int:
+        return self.page.erase_page_num * self.page.run_page_num
+
+    @property
+    def is_done(self) -> bool:
+        return self.state in (self.DONE, self.FAILED)
+
+    def pending_command(self):
+        """Firmware command the job has to send next
+
+        :return: (oper_type, crc_val, page_address), or None if the job waits or streams data
+        """
+        if self.state == self.ERASE:
+            return "erase", self.erase_unit_num, self.page.page_address
+        if self.state == self.CRC:
+            return "crc", self.page.checksum, self.page.page_address
+        if self.state == self.PROBE:
+            probe_page = self.pages[self.probe_index]
+            return "crc", probe_page.checksum, probe_page.page_address
+        return None
+
+    def command_sent(self, deadline: float) -> None:
+        self.state = {self.ERASE: self.WAIT_ERASE, self.CRC: self.WAIT_CRC, self.PROBE: self.WAIT_PROBE}[self.state]
+        self.deadline = deadline
+        self.sent_at = time.perf_counter()
+
+    def data_sent(self) -> None:
+        self.state = self.CRC
+
+    def poll(self, now: float):
+        """Consume the response of the module to the pending command
+
+        :param now: Current time.perf_counter()
+        :return: True or False once the command succeeded or failed, None while it is pending
+        """
+        if self.state == self.WAIT_ERASE:
+            success_state, fail_state = ERASE_COMPLETE, ERASE_ERROR
+        elif self.state in (self.WAIT_CRC, self.WAIT_PROBE):
+            success_state, fail_state = CRC_COMPLETE, CRC_ERROR
+        else:
+            return None
+
+        state = self.module_info.state
+        if state not in (success_state, fail_state) and now < self.deadline:
+            return None
+        self.module_info.set_state(NO_ERROR)
+
+        success = state == success_state
+        if self.state == self.WAIT_ERASE:
+            self.__erase_done(success)
+        elif self.state == self.WAIT_CRC:
+            self.__crc_done(success)
+        else:
+            self.__probe_done(success)
+        return success
+
+    def __probe_done(self, matching: bool) -> None:
+        self.pages[self.probe_index].matching = matching
+        self.probe_index += 1
+        if self.probe_index < len(self.pages) - 1:
+            self.state = self.PROBE
+            return
+        # the end-flash page is always written
+        self.matching_page_num = sum(page.matching for page in self.pages)
+        self.pages = [page for page in self.pages if not page.matching]
+        self.__group_runs()
+        self.state = self.ERASE
+
+    def __group_runs(self) -> None:
+        # Consecutive image pages are erased together, up to max_run_pages at once
+        run_head = None
+        prev_page = None
+        for page in self.pages[:-1]:
+            page.run_page_num = 1
+            contiguous = prev_page is not None and page.page_begin == prev_page.page_begin + page.frames.page_size
+            if contiguous and run_head.run_page_num < self.max_run_pages:
+                run_head.run_page_num += 1
+            else:
+                run_head = page
+            prev_page = page
+
+    def __erase_done(self, success: bool) -> None:
+        if success:
+            self.erase_retry.succeeded()
+            for page in self.pages[self.page_index + 1:self.page_index + self.page.run_page_num]:
+                page.erased = True
+            self.state = self.SEND_DATA
+            return
+        if self.page.run_page_num > 1:
+            # the module does not take multi-page erases, every page is erased on its own
+            self.bulk_erase_rejected = True
+            for page in self.pages:
+                page.run_page_num = 1
+            self.state = self.ERASE
+            return
+        if not self.erase_retry.failed(sleep=False):
+            self.__fail("erase flash failed")
+            return
+        self.retry_at = time.perf_counter() + self.erase_retry.delay
+        self.state = self.ERASE
+
+    def __crc_done(self, success: bool) -> None:
+        if success:
+            self.crc_retry.succeeded()
+            self.page_index += 1
+            if self.page_index == len(self.pages):
+                self.state = self.DONE
+            else:
+                self.state = self.SEND_DATA if self.page.erased else self.ERASE
+            return
+        if not self.crc_retry.failed(sleep=False):
+            self.__fail("check crc failed" if self.page_index < len(self.pages) - 1 else "version writing failed")
+            return
+        # the page is written again from its erase
+        self.retry_at = time.perf_counter() + self.crc_retry.delay
+        self.page.erased = False
+        self.page.run_page_num = 1
+        self.state = self.ERASE
+
+    def __fail(self, reason: str) -> None:
+        self.state = self.FAILED
+        self.error_message = f"{self.module_info.type} ({self.module_info.id}) {reason}."
+
+
+class FlashScheduler:
+    """Interleaves the flash jobs of the modules of one network
+
+    Erasing a page or checking its crc keeps a module busy while the serial
+    link and the CAN bus are idle. The scheduler sends the pending erase and
+    crc commands of every job first, then streams one page of data to a job
+    whose erase has completed, so data for one module flows while the others
+    erase or check their pages. Pages are streamed in turn, one page per job.
+
+    :param send_command: Called with (oper_type, module_id, crc_val, page_address) to send
+        an "erase" or "crc" firmware command without waiting for its response
+    :param send_page: Called with (frames, page_begin, module_id) to stream a page
+    :param state_event: Set whenever a module reports a firmware state
+    :param response_timeout: Time a module is given to answer a command
+    """
+
+    def __init__(self, send_command, send_page, state_event: th.Event, response_timeout: float = 0.5):
+        self.send_command = send_command
+        self.send_page = send_page
+        self.state_event = state_event
+        self.response_timeout = response_timeout
+
+    def run(self, jobs: list, on_page_result=None, on_job_end=None, on_response=None) -> None:
+        """Run jobs until every one of them is done
+
+        :param jobs: FlashJob of each module, at most one per module
+        :param on_page_result: Called with (job, success) after each crc response
+        :param on_job_end: Called with each finished job, may return the next job of its module
+        :param on_response: Called with (job, oper_type, seconds) once a command is answered or timed out
+        """
+        active_jobs = list(jobs)
+        data_queue = deque()
+        while active_jobs:
+            self.state_event.clear()
+            now = time.perf_counter()
+
+            for job in active_jobs:
+                waiting_state = job.state
+                result = job.poll(now)
+                if result is None:
+                    continue
+                if on_response:
+                    on_response(job, "erase" if waiting_state == FlashJob.WAIT_ERASE else "crc", now - job.sent_at)
+                if waiting_state == FlashJob.WAIT_CRC and on_page_result:
+                    on_page_result(job, result)
+
+            for job in [job for job in active_jobs if job.is_done]:
+                active_jobs.remove(job)
+                next_job = on_job_end(job) if on_job_end else None
+                if next_job is not None:
+                    active_jobs.append(next_job)
+
+            # Commands first, the modules work on them while a page is streamed
+            sent = False
+            for job in active_jobs:
+                if job.retry_at > now:
+                    # still backing off from a failed command
+                    continue
+                command = job.pending_command()
+                if command is None:
+                    continue
+                oper_type, crc_val, page_address = command
+                response_timeout = self.response_timeout
+                if oper_type == "erase" and job.page.run_page_num > 1:
+                    response_timeout += crc_val * ERASE_UNIT_TIME
+                job.module_info.set_state(NO_ERROR)
+                self.send_command(oper_type, job.module_info.id, crc_val, page_address)
+                job.command_sent(time.perf_counter() + response_timeout)
+                sent = True
+
+            for job in active_jobs:
+                if job.state == FlashJob.SEND_DATA and job not in data_queue:
+                    data_queue.append(job)
+            if data_queue:
+                job = data_queue.popleft()
+                page = job.page
+                self.send_page(page.frames, page.page_begin, job.module_info.id)
+                job.data_sent()
+                continue
+
+            if not sent and active_jobs:
+                deadlines = [job.deadline for job in active_jobs if job.state in (FlashJob.WAIT_ERASE, FlashJob.WAIT_CRC, FlashJob.WAIT_PROBE)]
+                deadlines += [job.retry_at for job in active_jobs if job.retry_at > now]
+                timeout = max(0, min(deadlines) - time.perf_counter()) if deadlines else self.response_timeout
+                self.state_event.wait(timeout)
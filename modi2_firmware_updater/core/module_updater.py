@@ -1,39 +1,26 @@
 import json
-import sys
 import threading as th
 import time
 from base64 import b64encode
 from io import open
-from os import path
-from dataclasses import dataclass
 
 from serial.serialutil import SerialException
 
+from modi2_firmware_updater.core.flash_scheduler import FlashJob, FlashScheduler
+from modi2_firmware_updater.core.multi_updater import PageFlashMultiUpdater
+from modi2_firmware_updater.util.checkpoint_util import FlashCheckpoints
+from modi2_firmware_updater.util.crc_util import calc_crc32, calc_crc64
+from modi2_firmware_updater.util.firmware_util import (
+    ERASE_UNIT_TIME, FLASH_MEMORY_ADDRESS, FirmwarePlan, get_end_flash_data, get_firmware_bin_path, get_firmware_frames,
+    get_firmware_plan, get_flash_layout, get_version_value
+)
 from modi2_firmware_updater.util.message_util import decode_message, parse_message, unpack_data
+from modi2_firmware_updater.util.metrics_util import UpdateMetrics
 from modi2_firmware_updater.util.modi_winusb.modi_serialport import ModiSerialPort, list_modi_serialports
-from modi2_firmware_updater.util.module_util import Module, get_module_type_from_uuid
-from modi2_firmware_updater.util.platform_util import delay
-
-def retry(exception_to_catch):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            try:
-                return func(*args, **kwargs)
-            except exception_to_catch:
-                return wrapper(*args, **kwargs)
-
-        return wrapper
-
-    return decorator
-
-@dataclass
-class Module_info:
-    uuid: int = None
-    id: int = None
-    type: str = None
-    state: int = None
-    level: int = None
-    retry: int = 0
+from modi2_firmware_updater.util.module_util import Module, ModuleRecord, ModuleRegistry, get_module_type_from_uuid
+from modi2_firmware_updater.util.platform_util import PacingBudget, Pacer
+from modi2_firmware_updater.util.retry_util import RetryPolicy
+
 
 class ModuleFirmwareUpdater(ModiSerialPort):
     """Module Firmware Updater: Updates a firmware of given module"""
@@ -56,6 +43,16 @@ class ModuleFirmwareUpdater(ModiSerialPort):
 
     MAX_UPDATE_MODULE_NUM = 15
 
+    # Module discovery broadcasts an id request every DISCOVERY_INTERVAL seconds, and ends once the
+    # module list has not changed for DISCOVERY_STABLE_ROUNDS requests in a row (or the hinted number
+    # of modules is found). Without any module it gives up after DISCOVERY_TIMEOUT quiet seconds.
+    DISCOVERY_INTERVAL = 0.25
+    DISCOVERY_STABLE_ROUNDS = 4
+    DISCOVERY_TIMEOUT = 3
+
+    # Longest run of pages erased by one command in bulk erase mode
+    MAX_ERASE_RUN_PAGES = 16
+
     def __init__(self, device=None, module_firmware_path=None):
         self.print = True
 
@@ -75,19 +72,40 @@ class ModuleFirmwareUpdater(ModiSerialPort):
         self.update_error = 0
         self.update_error_message = ""
         self.has_update_error = False
-        self.this_update_error = False
 
         self.module_firmware_path = module_firmware_path
 
+        self.burst_mode = False
+        self.burst_chunk_frame_num = None
+        self.pacing = None
+        self.pacer = Pacer()
+        self.interleave_mode = False
+        self.state_event = th.Event()
+        self.bulk_erase_mode = False
+        # uuids of the modules that rejected a multi-page erase
+        self.bulk_erase_rejected = set()
+        self.delta_mode = False
+        self.force_update = False
+        self.checkpoints = FlashCheckpoints()
+        self.retry_policy = RetryPolicy()
+
         self.network_uuid = None
 
-        self.update_module_list = []
+        self.module_registry = ModuleRegistry()
         self.all_update_num = 0
         self.all_update_module_num = 0
         self.update_complete_num = 0
         self.gathering_update_list_timeout = 0
         self.module_listup_flag = False
 
+        self.firmware_version_info = {}
+        self.module_num_hint = None
+        self.discovery_interval = self.DISCOVERY_INTERVAL
+        self.discovery_stable_rounds = self.DISCOVERY_STABLE_ROUNDS
+        self.discovery_time = None
+        self.update_requested = th.Event()
+        self.discovery_done = th.Event()
+
         if device is not None:
             super().__init__(device, baudrate=921600, timeout=0.02, write_timeout=0.1)
         else:
@@ -104,12 +122,20 @@ class ModuleFirmwareUpdater(ModiSerialPort):
                     break
             self.__print(f"Connecting to MODI+ network module at {modi_port}")
 
+        self.metrics = UpdateMetrics("module", self.port)
         self.open_recv_thread()
 
         th.Thread(
-            target=self.module_firmware_update_manager, daemon=True
+            target=self.__run_update_manager, daemon=True
         ).start()
 
+    def __run_update_manager(self):
+        try:
+            self.module_firmware_update_manager()
+        finally:
+            self.metrics.set_retries(self.retry_policy.snapshot())
+            self.metrics.finish()
+
     def module_firmware_update_manager(self):
         timeout_count = 0
         timeout_delay = 0.1
@@ -117,13 +143,13 @@ class ModuleFirmwareUpdater(ModiSerialPort):
 
         firmware_update_message = self.__set_module_state(0xFFF, Module.FORCED_PAUSE, Module.PNP_OFF)
         self.__send_conn(firmware_update_message)
-        time.sleep(1)
 
-        while self.gathering_update_list_timeout < 30:
-            time.sleep(timeout_delay)
-            self.gathering_update_list_timeout += 1
+        # module list up, warnings can only be handled once the firmware versions are known
+        self.update_requested.wait()
+        with self.metrics.phase("discovery"):
+            self.__discover_modules()
 
-        if len(self.update_module_list) > self.MAX_UPDATE_MODULE_NUM:
+        if len(self.module_registry) > self.MAX_UPDATE_MODULE_NUM:
             self.__print(f"Too many modules detected, please connect modules up to {self.MAX_UPDATE_MODULE_NUM}")
             self.close_recv_thread()
             self.close()
@@ -131,22 +157,29 @@ class ModuleFirmwareUpdater(ModiSerialPort):
             self.reset_state()
             return
         self.update_in_progress = True
-        self.all_update_module_num = len(self.update_module_list)
+        self.all_update_module_num = len(self.module_registry)
 
-        # set update ready
-        while timeout_count < 30:
-            ready_flag = False
-            for module_info in self.update_module_list:
-                if module_info.state != self.UPDATE_READY:
-                    ready_flag = True
-                    if (int(timeout_count) % 5) == 0 and int(timeout_count) != 0:
-                        self.check_to_update_firmware(module_info.id)
-            if not ready_flag:
+        # set update ready, the modules not ready yet are asked again after a backoff
+        entry_begin = time.perf_counter()
+        discovery_retry = self.retry_policy.budget("discovery")
+        update_ready = False
+        while True:
+            waiting_modules = [module_info for module_info in self.module_registry if module_info.state != self.UPDATE_READY]
+            if not waiting_modules:
+                discovery_retry.succeeded()
+                update_ready = True
                 break
-            time.sleep(timeout_delay)
-            timeout_count += 1
+            if not discovery_retry.failed(sleep=False):
+                break
+            retry_deadline = time.perf_counter() + discovery_retry.delay
+            for module_info in waiting_modules:
+                module_info.wait_for_state((self.UPDATE_READY, ), max(0, retry_deadline - time.perf_counter()))
+            for module_info in waiting_modules:
+                if module_info.state != self.UPDATE_READY:
+                    self.check_to_update_firmware(module_info.id)
+        self.metrics.add_duration("bootloader_entry", time.perf_counter() - entry_begin)
 
-        if timeout_count >= 30:
+        if not update_ready:
             self.update_error_message = "Module firmwares have not been updated! error occur"
             self.update_error = -1
             reboot_message = self.__set_module_state(0xFFF, Module.REBOOT, Module.PNP_OFF)
@@ -160,17 +193,20 @@ class ModuleFirmwareUpdater(ModiSerialPort):
 
         # count the number of update
         self.all_update_num = 0
-        for module_info in self.update_module_list:
-            self.all_update_num += module_info.level + 1
+        for module_info in self.module_registry:
+            if module_info.level < self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_DONE:
+                self.all_update_num += module_info.level + 1
         timeout_count = 0
         self.module_listup_flag = True
         complete_flag = True
         self.__print("Module firmwares update start! total update module num: ", self.all_update_module_num)
-        while timeout_count < 10:
+        if self.interleave_mode:
+            complete_flag = self.__update_modules_interleaved(retry_max)
+        while not self.interleave_mode and timeout_count < 10:
             complete_flag = True
             time.sleep(timeout_delay)
             timeout_count += timeout_delay
-            for module_info in self.update_module_list:
+            for module_info in self.module_registry:
                 if module_info.level == self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_SECOND_BOOTLOADER:
                     result = self.__update_firmware_second_bootloader(module_info)
                     if result:
@@ -210,14 +246,15 @@ class ModuleFirmwareUpdater(ModiSerialPort):
                 break
 
         self.update_error = 1 if complete_flag else -1
-        self.update_module_list.clear()
-        reboot_message = self.__set_module_state(0xFFF, Module.REBOOT, Module.PNP_OFF)
-        self.__send_conn(reboot_message)
-        self.__print("Reboot message has been sent to all connected modules")
-        time.sleep(2)
-        run_mode_message = self.__set_module_state(0xFFF, Module.RUN, Module.PNP_ON)
-        self.__send_conn(run_mode_message)
-        time.sleep(1)
+        self.module_registry.clear()
+        with self.metrics.phase("reboot"):
+            reboot_message = self.__set_module_state(0xFFF, Module.REBOOT, Module.PNP_OFF)
+            self.__send_conn(reboot_message)
+            self.__print("Reboot message has been sent to all connected modules")
+            time.sleep(2)
+            run_mode_message = self.__set_module_state(0xFFF, Module.RUN, Module.PNP_ON)
+            self.__send_conn(run_mode_message)
+            time.sleep(1)
 
         self.__print("Module firmwares have been updated!")
         self.close_recv_thread()
@@ -235,6 +272,36 @@ class ModuleFirmwareUpdater(ModiSerialPort):
     def set_raise_error(self, raise_error_message):
         self.raise_error_message = raise_error_message
 
+    def set_burst_mode(self, burst_mode: bool, chunk_frame_num: int = None) -> None:
+        # Send each page in bulk writes of chunk_frame_num frames (whole page if None)
+        self.burst_mode = burst_mode
+        self.burst_chunk_frame_num = chunk_frame_num
+        self.pacing = PacingBudget(self.baudrate) if burst_mode else None
+
+    def set_interleave_mode(self, interleave_mode: bool) -> None:
+        # Flash the modules of the network side by side instead of one after another
+        self.interleave_mode = interleave_mode
+
+    def set_bulk_erase_mode(self, bulk_erase_mode: bool) -> None:
+        # Erase each run of contiguous pages with a single erase command
+        self.bulk_erase_mode = bulk_erase_mode
+
+    def set_force_update(self, force_update: bool) -> None:
+        # Flash modules whose firmware already matches firmware_version_info as well
+        self.force_update = force_update
+
+    def set_delta_mode(self, delta_mode: bool) -> None:
+        # Check the crc of every page on the module first and only rewrite the pages that differ
+        self.delta_mode = delta_mode
+
+    def set_checkpoint_path(self, checkpoint_path: str = None) -> None:
+        # Keep the app update checkpoints in checkpoint_path, so that a later session resumes them too
+        self.checkpoints = FlashCheckpoints(checkpoint_path)
+
+    def set_retry_budgets(self, retry_budgets: dict = None) -> None:
+        # Operation name to (attempts, base_delay), see RetryPolicy.BUDGETS
+        self.retry_policy = RetryPolicy(retry_budgets)
+
     def request_network_id(self, id: int):
         self.__send_conn(parse_message(0x28, 0x0, id, (0xFF, 0x0F)))
 
@@ -245,14 +312,11 @@ class ModuleFirmwareUpdater(ModiSerialPort):
         if sid == self.network_id:
             return
         else:
-            check_flag = True
-            for module_info in self.update_module_list:
-                if module_info.id == sid:
-                    check_flag = False
-                    self.__send_conn(self.__set_module_state(module_info.id, Module.UPDATE_FIRMWARE, Module.PNP_OFF))
-                    time.sleep(0.01)
-                    break
-            if check_flag and self.update_in_progress is False:
+            module_info = self.module_registry.get_by_id(sid)
+            if module_info is not None:
+                self.__send_conn(self.__set_module_state(module_info.id, Module.UPDATE_FIRMWARE, Module.PNP_OFF))
+                time.sleep(0.01)
+            elif self.update_in_progress is False:
                 self.request_module_id(sid)
                 self.request_network_id(sid)
                 self.gathering_update_list_timeout = 0
@@ -279,30 +343,57 @@ class ModuleFirmwareUpdater(ModiSerialPort):
         else:
             # module list up
             if self.update_in_progress is False:
-                check_flag = True
-                for module_info in self.update_module_list:
-                    if module_info.uuid == module_uuid:
-                        check_flag = False
-                        break
-                if check_flag:
+                module_info = self.module_registry.add(sid, module_uuid, module_type)
+                if module_info is not None:
+                    module_info.version = module_version_digits
                     self.gathering_update_list_timeout = 0
-                    temp_module = Module_info()
-                    temp_module.id = sid
-                    temp_module.uuid = module_uuid
-                    temp_module.type = module_type
-                    self.update_module_list.append(temp_module)
-                    self.__send_conn(self.__set_module_state(temp_module.id, Module.UPDATE_FIRMWARE, Module.PNP_OFF))
+                    self.__send_conn(self.__set_module_state(module_info.id, Module.UPDATE_FIRMWARE, Module.PNP_OFF))
                     time.sleep(0.01)
 
+    def set_module_num_hint(self, module_num_hint: int = None) -> None:
+        # Discovery ends as soon as this many modules are found
+        self.module_num_hint = module_num_hint
+
+    def set_discovery_options(self, interval: float = None, stable_rounds: int = None) -> None:
+        if interval is not None:
+            self.discovery_interval = interval
+        if stable_rounds is not None:
+            self.discovery_stable_rounds = stable_rounds
+
     def update_module_firmware(self, firmware_version_info={}):
         self.has_update_error = False
+        self.firmware_version_info = firmware_version_info
         self.request_network_id(0xFFF)
-        self.request_module_id(0xFFF)
         self.reset_state()
-        self.firmware_version_info = firmware_version_info
+        self.update_requested.set()
+
+        # returns once the module list is up
+        self.discovery_done.wait(self.DISCOVERY_TIMEOUT + 2)
+
+    def __discover_modules(self) -> None:
+        discovery_begin = time.perf_counter()
+        module_num = 0
+        stable_rounds = 0
+        self.gathering_update_list_timeout = 0
+        while self.gathering_update_list_timeout < self.DISCOVERY_TIMEOUT:
+            if self.module_num_hint and len(self.module_registry) >= self.module_num_hint:
+                break
+            if module_num and len(self.module_registry) == module_num:
+                stable_rounds += 1
+                if stable_rounds >= self.discovery_stable_rounds:
+                    break
+            else:
+                module_num = len(self.module_registry)
+                stable_rounds = 0
 
-        # module list up in 3 seconds
-        time.sleep(5)
+            self.request_module_id(0xFFF)
+            time.sleep(self.discovery_interval)
+            # reset by the message handlers whenever a new module shows up
+            self.gathering_update_list_timeout += self.discovery_interval
+
+        self.discovery_time = time.perf_counter() - discovery_begin
+        self.__print(f"Module discovery: {len(self.module_registry)} module(s) in {self.discovery_time:.2f}s")
+        self.discovery_done.set()
 
     def close_recv_thread(self):
         self.__running = False
@@ -347,151 +438,39 @@ class ModuleFirmwareUpdater(ModiSerialPort):
             self.response_flag = False
             self.response_error_flag = response
 
-    def __update_firmware(self, module_info: Module_info) -> bool:
+    def __update_firmware(self, module_info: ModuleRecord) -> bool:
         self.module_type = module_info.type
 
         # Init base root_path, utilizing local binary files
-        root_path = path.join(self.module_firmware_path, module_info.type, self.firmware_version_info[module_info.type]["app"])
-        bin_path = path.join(root_path, f"{module_info.type.lower()}.bin")
+        bin_path = get_firmware_bin_path(self.module_firmware_path, module_info.type, "app", self.firmware_version_info[module_info.type]["app"])
 
         with open(bin_path, "rb") as bin_file:
             bin_buffer = bin_file.read()
-        self.this_update_error = False
-        # Init metadata of the bytes loaded
-        flash_memory_addr = 0x08000000
-        bin_size = sys.getsizeof(bin_buffer)
-        page_size = 0x400
-        bin_begin = 0x400
-        page_offset = 0x4C00
-        erase_page_num = 1
-        end_flash_address = 0x0800f800
-        if module_info.type == "speaker" or module_info.type == "display" or module_info.type == "env":
-            page_size = 0x800
-            bin_begin = 0x800
-            page_offset = 0x8800
-            end_flash_address = 0x0801f800
-            erase_page_num = 2
-        bin_end = bin_size - ((bin_size - bin_begin) % page_size)
-        page_begin = bin_begin
-
-        erase_error_limit = 2
-        erase_error_count = 0
-        crc_error_limit = 2
-        crc_error_count = 0
-        while page_begin < bin_end:
-            progress = 100 * page_begin // bin_end
-            self.progress = progress
-
-            # self.__print(f"\rFirmware Update: {module_info.type} ({module_info.id}) {self.__progress_bar(page_begin, bin_end)} {progress}%", end="")
-            print(f"\rFirmware Update: {module_info.type} ({module_info.id}) {self.__progress_bar(page_begin, bin_end)} {progress}%", end="")
-
-            page_end = page_begin + page_size
-            curr_page = bin_buffer[page_begin:page_end]
-
-            # Skip current page if empty
-            if curr_page == bytes(len(curr_page)):
-                page_begin = page_begin + page_size
-                time.sleep(0.02)
-                continue
-            if page_begin + page_offset + flash_memory_addr == end_flash_address:
-                page_begin = page_begin + page_size
-                continue
-
-            # Erase page (send erase request and receive its response)
-            erase_page_success = self.send_firmware_command(
-                oper_type="erase",
-                module_id=module_info.id,
-                crc_val=erase_page_num,
-                dest_addr=flash_memory_addr,
-                page_addr=page_begin + page_offset,
-            )
-
-            if not erase_page_success:
-                erase_error_count = erase_error_count + 1
-                if erase_error_count > erase_error_limit:
-                    erase_error_count = 0
-                    self.this_update_error = True
-                    self.update_error_message = f"{module_info.type} ({module_info.id}) erase flash failed."
-                    break
-                continue
-            else:
-                erase_error_count = 0
-
-            # Copy current page data to the module's memory
-            checksum = 0
-            for curr_ptr in range(0, page_size, 8):
-                if page_begin + curr_ptr >= bin_size:
-                    break
-
-                curr_data = curr_page[curr_ptr: curr_ptr + 8]
-                checksum = self.send_firmware_data(module_info.id, curr_ptr // 8, curr_data, checksum)
-                delay(0.001)
-
-            crc_page_success = self.send_firmware_command(
-                oper_type="crc",
-                module_id=module_info.id,
-                crc_val=checksum,
-                dest_addr=flash_memory_addr,
-                page_addr=page_begin + page_offset,
-            )
 
-            if crc_page_success:
-                crc_error_count = 0
-            else:
-                crc_error_count = crc_error_count + 1
-                if crc_error_count > crc_error_limit:
-                    crc_error_count = 0
-                    self.this_update_error = True
-                    self.update_error_message = f"{module_info.type} ({module_info.id}) check crc failed."
-                    break
-                continue
+        # Init metadata of the bytes loaded
+        layout = get_flash_layout(module_info.type, "app")
+        plan = get_firmware_plan(bin_buffer, layout)
 
-            page_begin = page_begin + page_size
-            time.sleep(0.01)
+        if not self.__flash_plan(module_info, plan, resume=True):
+            self.has_update_error = True
+            return False
 
         self.progress = 99
         self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(99, 100)} 99%")
 
-        verify_header = 0xAA
-        if self.this_update_error:
-            self.has_update_error = True
-            verify_header = 0xFF
-            return False
-
         # Get version info from version_path, using appropriate methods
         os_version_info = self.firmware_version_info[module_info.type]["os"]
         os_version_info = os_version_info.lstrip("v").split("-")[0]
-        os_version_digits = [int(digit) for digit in os_version_info.split(".")]
-        os_version = (
-            os_version_digits[0] << 13
-            | os_version_digits[1] << 8
-            | os_version_digits[2]
-        )
-
         app_version_info = self.firmware_version_info[module_info.type]["app"]
         app_version_info = app_version_info.lstrip("v").split("-")[0]
-        app_version_digits = [int(digit) for digit in app_version_info.split(".")]
-        app_version = (
-            app_version_digits[0] << 13
-            | app_version_digits[1] << 8
-            | app_version_digits[2]
-        )
 
         # Set end-flash data to be sent at the end of the firmware update
-        end_flash_data = bytearray(16)
-        end_flash_data[0] = verify_header
-        # appversion
-        end_flash_data[6] = os_version & 0xFF
-        end_flash_data[7] = (os_version >> 8) & 0xFF
-        # app version
-        end_flash_data[8] = app_version & 0xFF
-        end_flash_data[9] = (app_version >> 8) & 0xFF
-
-        for xxx in range(4):
-            end_flash_data[xxx + 12] = ((0x08005000 >> (xxx * 8)) & 0xFF)
-        if module_info.type == "speaker" or module_info.type == "display" or module_info.type == "env":
-            for xxx in range(4):
-                end_flash_data[xxx + 12] = ((0x08009000 >> (xxx * 8)) & 0xFF)
+        end_flash_data = get_end_flash_data(
+            layout,
+            0xAA,
+            os_version=get_version_value(os_version_info),
+            app_version=get_version_value(app_version_info),
+        )
 
         success_end_flash = self.send_end_flash_data(module_info.type, module_info.id, end_flash_data)
 
@@ -499,6 +478,7 @@ class ModuleFirmwareUpdater(ModiSerialPort):
             self.update_error_message = f"{module_info.type} ({module_info.id}) version writing failed."
             self.has_update_error = True
             return False
+        self.checkpoints.clear(module_info.uuid)
 
         self.__print(f"Version info (os: v{os_version_info}, app: v{app_version_info}) has been written to its firmware!")
 
@@ -512,317 +492,330 @@ class ModuleFirmwareUpdater(ModiSerialPort):
         self.progress = 0
         return True
 
-    def __update_firmware_bootloader(self, module_info: Module_info) -> bool:
+    def __update_firmware_bootloader(self, module_info: ModuleRecord) -> bool:
         self.module_type = module_info.type
         # Init base root_path, utilizing local binary files
-        root_path = path.join(self.module_firmware_path, "bootloader", "e230", self.firmware_version_info[module_info.type]["bootloader"])
-        bin_path = path.join(root_path, "bootloader_e230.bin")
-
-        if module_info.type in ["speaker", "display", "env"]:
-            root_path = path.join(self.module_firmware_path, "bootloader", "e103", self.firmware_version_info[module_info.type]["bootloader"])
-            bin_path = path.join(root_path, "bootloader_e103.bin")
-        self.this_update_error = False
+        bin_path = get_firmware_bin_path(self.module_firmware_path, module_info.type, "bootloader", self.firmware_version_info[module_info.type]["bootloader"])
         # Init metadata of the bytes loaded
-        flash_memory_addr = 0x08000000
-        page_size = 0x400
-        bin_begin = 0x0
-        page_offset = 0x1000
-        erase_page_num = 1
-        end_flash_address = 0x0800f800
-        flash_info_memory_addr = 0x08004C00
-        if module_info.type in ["speaker", "display", "env"]:
-            page_size = 0x800
-            bin_begin = 0x0
-            page_offset = 0x1000
-            end_flash_address = 0x0801f800
-            erase_page_num = 2
-            flash_info_memory_addr = 0x08008800
+        layout = get_flash_layout(module_info.type, "bootloader")
 
         with open(bin_path, "rb") as bin_file:
             bin_buffer = bin_file.read()
 
-        bin_size = sys.getsizeof(bin_buffer)
-        bin_end = bin_size - ((bin_size - bin_begin) % page_size)
-        page_begin = bin_begin
-
-        erase_error_limit = 2
-        erase_error_count = 0
-        crc_error_limit = 2
-        crc_error_count = 0
-        self.progress = 1
-        while page_begin < bin_end:
-            progress = 100 * page_begin // bin_end
-            self.progress = progress
-
-            self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(page_begin, bin_end)} {progress}%", end="")
-            page_end = page_begin + page_size
-            curr_page = bin_buffer[page_begin:page_end]
-            # Skip current page if empty
-            if not sum(curr_page):
-                page_begin = page_begin + page_size
-                time.sleep(0.02)
-                continue
-            if page_begin + page_offset + flash_memory_addr == end_flash_address:
-                page_begin = page_begin + page_size
-                time.sleep(0.02)
-                continue
-            if page_begin + page_offset + flash_memory_addr == flash_info_memory_addr:
-                page_begin = page_begin + page_size
-                time.sleep(0.02)
-                continue
-            # Erase page (send erase request and receive its response)
-            erase_page_success = self.send_firmware_command(
-                oper_type="erase",
-                module_id=module_info.id,
-                crc_val=erase_page_num,
-                dest_addr=flash_memory_addr,
-                page_addr=page_begin + page_offset,
-            )
-
-            if not erase_page_success:
-                erase_error_count = erase_error_count + 1
-                if erase_error_count > erase_error_limit:
-                    erase_error_count = 0
-                    temp_addres = flash_memory_addr + page_begin + page_offset
-                    self.update_error_message = f"{module_info.type} ({module_info.id}) erase flash failed in {hex(temp_addres)}."
-                    self.this_update_error = True
-                    break
-                continue
-            else:
-                erase_error_count = 0
+        plan = get_firmware_plan(bin_buffer, layout)
 
-            # Copy current page data to the module's memory
-            checksum = 0
-            for curr_ptr in range(0, page_size, 8):
-                if page_begin + curr_ptr >= bin_size:
-                    break
+        if not self.__flash_plan(module_info, plan):
+            self.has_update_error = True
+            return False
 
-                curr_data = curr_page[curr_ptr: curr_ptr + 8]
-                checksum = self.send_firmware_data(module_info.id, curr_ptr // 8, curr_data, checksum)
-                delay(0.001)
+        self.progress = 99
+        self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(99, 100)} 99%")
 
-            # CRC on current page (send CRC request / receive CRC response)
-            crc_page_success = self.send_firmware_command(
-                oper_type="crc",
-                module_id=module_info.id,
-                crc_val=checksum,
-                dest_addr=flash_memory_addr,
-                page_addr=page_begin + page_offset,
-            )
+        # Get version info from version_path, using appropriate methods
+        bootloader_version_info = self.firmware_version_info[module_info.type]["bootloader"]
+        bootloader_version_info = bootloader_version_info.lstrip("v").split("-")[0]
 
-            if crc_page_success is False:
-                crc_error_count = crc_error_count + 1
-                if crc_error_count > crc_error_limit:
-                    crc_error_count = 0
-                    self.this_update_error = True
-                    self.update_error_message = f"{module_info.type} ({module_info.id}) check crc failed."
-                    break
-                continue
-            else:
-                crc_error_count = 0
+        # Set end-flash data to be sent at the end of the firmware update
+        end_flash_data = get_end_flash_data(layout, 0xAA)
 
-            page_begin = page_begin + page_size
-            time.sleep(0.01)
+        success_end_flash = self.send_end_flash_data(module_info.type, module_info.id, end_flash_data)
+        reboot_message = self.__set_module_state(module_info.id, Module.REBOOT, Module.PNP_OFF)
+        self.__send_conn(reboot_message)
 
-        if not self.this_update_error:
-            self.progress = 99
-            self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(99, 100)} 99%")
+        self.__print(f"Version info (v{bootloader_version_info}) has been written to its firmware!")
+        # Firmware update flag down, resetting used flags
+        self.__print(f"Bootloader update is done for {module_info.type} ({module_info.id})")
+        self.reset_state(update_in_progress=True)
 
-            # Get version info from version_path, using appropriate methods
-            bootloader_version_info = self.firmware_version_info[module_info.type]["bootloader"]
-            bootloader_version_info = bootloader_version_info.lstrip("v").split("-")[0]
+        if not success_end_flash:
+            self.update_error_message = f"{module_info.type} ({module_info.id}) version writing failed."
+            self.has_update_error = True
+            return False
 
-            # Set end-flash data to be sent at the end of the firmware update
-            end_flash_data = bytearray(16)
-            end_flash_data[0] = 0xAA
-            end_flash_data[6] = 0
-            end_flash_data[7] = 0
+        self.progress = 100
+        self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(1, 1)} 100%")
+        self.update_complete_num += 1
+        self.progress = 0
+        return True
 
-            for xxx in range(4):
-                if module_info.type in ["speaker", "display", "env"]:
-                    end_flash_data[xxx + 12] = ((0x08001000 >> (xxx * 8)) & 0xFF)
-                else:
-                    end_flash_data[xxx + 12] = ((0x08001000 >> (xxx * 8)) & 0xFF)
+    def __update_firmware_second_bootloader(self, module_info: ModuleRecord) -> bool:
+        # Init base root_path, utilizing local binary files
+        bin_path = get_firmware_bin_path(self.module_firmware_path, module_info.type, "second_bootloader", self.firmware_version_info[module_info.type]["bootloader"])
+        # Init metadata of the bytes loaded
+        layout = get_flash_layout(module_info.type, "second_bootloader")
 
-            success_end_flash = self.send_end_flash_data(module_info.type, module_info.id, end_flash_data)
-            reboot_message = self.__set_module_state(module_info.id, Module.REBOOT, Module.PNP_OFF)
-            self.__send_conn(reboot_message)
+        with open(bin_path, "rb") as bin_file:
+            bin_buffer = bin_file.read()
 
-            self.__print(f"Version info (v{bootloader_version_info}) has been written to its firmware!")
-            # Firmware update flag down, resetting used flags
-            self.__print(f"Bootloader update is done for {module_info.type} ({module_info.id})")
-            self.reset_state(update_in_progress=True)
+        plan = get_firmware_plan(bin_buffer, layout)
 
-            if not success_end_flash:
-                self.update_error_message = f"{module_info.type} ({module_info.id}) version writing failed."
-                self.has_update_error = True
-                return False
-            else:
-                self.progress = 100
-                self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(1, 1)} 100%")
-                self.update_complete_num += 1
-                self.progress = 0
-            return True
-        else:
+        if not self.__flash_plan(module_info, plan):
             self.has_update_error = True
             return False
 
-    def __update_firmware_second_bootloader(self, module_info: Module_info) -> bool:
-        # Init base root_path, utilizing local binary files
-        root_path = path.join(self.module_firmware_path, "bootloader", "e230", self.firmware_version_info[module_info.type]["bootloader"])
-        bin_path = path.join(root_path, "second_bootloader_e230.bin")
+        self.progress = 99
+        self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(99, 100)} 99%")
 
-        if module_info.type in ["speaker", "display", "env"]:
-            root_path = path.join(self.module_firmware_path, "bootloader", "e103", self.firmware_version_info[module_info.type]["bootloader"])
-            bin_path = path.join(root_path, "second_bootloader_e103.bin")
-        self.this_update_error = False
-        # Init metadata of the bytes loaded
-        flash_memory_addr = 0x08000000
-        page_size = 0x400
-        bin_begin = 0x400
-        page_offset = 0x4C00
-        erase_page_num = 1
-        end_flash_address = 0x0800f800
-        flash_info_memory_addr = 0x08004800
-        if module_info.type in ["speaker", "display", "env"]:
-            page_size = 0x800
-            bin_begin = 0x800
-            page_offset = 0x8800
-            end_flash_address = 0x0801f800
-            erase_page_num = 2
-            flash_info_memory_addr = 0x08008800
+        # Get version info from version_path, using appropriate methods
+        second_bootloader_version_info = self.firmware_version_info[module_info.type]["bootloader"]
+        second_bootloader_version_info = second_bootloader_version_info.lstrip("v").split("-")[0]
 
-        with open(bin_path, "rb") as bin_file:
-            bin_buffer = bin_file.read()
+        # Set end-flash data to be sent at the end of the firmware update
+        end_flash_data = get_end_flash_data(layout, 0xAA)
 
-        bin_size = sys.getsizeof(bin_buffer)
-        bin_end = bin_size - ((bin_size - bin_begin) % page_size)
-        page_begin = bin_begin
+        success_end_flash = self.send_end_flash_data(module_info.type, module_info.id, end_flash_data)
+        reboot_message = self.__set_module_state(module_info.id, Module.REBOOT, Module.PNP_OFF)
+        self.__send_conn(reboot_message)
+        self.__send_conn(reboot_message)
+
+        # Firmware update flag down, resetting used flags
+        if not success_end_flash:
+            self.update_error_message = f"{module_info.type} ({module_info.id}) version writing failed."
+            self.has_update_error = True
+            return False
 
-        erase_error_limit = 2
-        erase_error_count = 0
-        crc_error_limit = 2
-        crc_error_count = 0
-        while page_begin < bin_end:
+        self.__print(f"Version info (v{second_bootloader_version_info}) has been written to its firmware!")
+        self.progress = 100
+        self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(1, 1)} 100%")
+        self.update_complete_num += 1
+        self.progress = 0
+        self.__print(f"seconde bootloader update is done for {module_info.type} ({module_info.id})")
+        self.reset_state(update_in_progress=True)
+        return True
+
+    def __flash_plan(self, module_info: ModuleRecord, plan: FirmwarePlan, resume: bool = False) -> bool:
+        # Erase, write and crc check the pages of plan, False once a retry budget is exhausted.
+        # With resume, the pages verified by an earlier attempt are kept and every verified page is checkpointed
+        layout = plan.layout
+        bin_end = plan.bin_end
+        firmware_frames = get_firmware_frames(plan.image, layout.page_size)
+
+        page_index = self.__resume_index(module_info, plan) if resume else 0
+        resumed_pages = set(plan.page_begins[:page_index])
+        matching_pages = self.__matching_pages(module_info, plan, resumed_pages)
+        erased_pages = self.__erase_runs(module_info, plan, matching_pages | resumed_pages)
+
+        erase_retry = self.retry_policy.budget("erase")
+        crc_retry = self.retry_policy.budget("crc")
+        while page_index < len(plan.page_begins):
+            page_begin = plan.page_begins[page_index]
             progress = 100 * page_begin // bin_end
             self.progress = progress
 
             self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(page_begin, bin_end)} {progress}%", end="")
-            page_end = page_begin + page_size
-            curr_page = bin_buffer[page_begin:page_end]
-            # Skip current page if empty
-            if not sum(curr_page):
-                page_begin = page_begin + page_size
-                time.sleep(0.02)
-                continue
-            if page_begin + page_offset == end_flash_address:
-                # avoid end flash page
-                page_begin = page_begin + page_size
-                time.sleep(0.02)
-                continue
-            if page_begin + page_offset == flash_info_memory_addr:
-                # avoid uuid page
-                page_begin = page_begin + page_size
-                time.sleep(0.02)
+
+            if page_begin in matching_pages:
+                # the module already holds this page
+                page_index += 1
                 continue
 
-            # Erase page (send erase request and receive its response)
-            erase_page_success = self.send_firmware_command(
-                oper_type="erase",
-                module_id=module_info.id,
-                crc_val=erase_page_num,
-                dest_addr=flash_memory_addr,
-                page_addr=page_begin + page_offset,
-            )
+            if page_begin in erased_pages:
+                # erased along with its run, a page written again is erased on its own
+                erased_pages.discard(page_begin)
+                erase_page_success = True
+            else:
+                # Erase page (send erase request and receive its response)
+                erase_page_success = self.send_firmware_command(
+                    oper_type="erase",
+                    module_id=module_info.id,
+                    crc_val=layout.erase_page_num,
+                    dest_addr=FLASH_MEMORY_ADDRESS,
+                    page_addr=page_begin + layout.page_offset,
+                )
 
             if not erase_page_success:
-                erase_error_count = erase_error_count + 1
-                if erase_error_count > erase_error_limit:
-                    erase_error_count = 0
-                    self.this_update_error = True
-                    self.update_error_message = f"{module_info.type} ({module_info.id}) erase flash failed."
-                    break
+                if not erase_retry.failed():
+                    self.update_error_message = f"{module_info.type} ({module_info.id}) erase flash failed in {hex(plan.page_address(page_begin))}."
+                    return False
                 continue
-            else:
-                erase_error_count = 0
+            erase_retry.succeeded()
 
             # Copy current page data to the module's memory
-            checksum = 0
-            for curr_ptr in range(0, page_size, 8):
-                if page_begin + curr_ptr >= bin_size:
-                    break
-
-                curr_data = curr_page[curr_ptr: curr_ptr + 8]
-                checksum = self.send_firmware_data(module_info.id, curr_ptr // 8, curr_data, checksum)
-                delay(0.001)
+            checksum = plan.checksums[page_begin]
+            self.__send_page(firmware_frames, page_begin, module_info.id)
 
             # CRC on current page (send CRC request / receive CRC response)
             crc_page_success = self.send_firmware_command(
                 oper_type="crc",
                 module_id=module_info.id,
                 crc_val=checksum,
-                dest_addr=flash_memory_addr,
-                page_addr=page_begin + page_offset,
+                dest_addr=FLASH_MEMORY_ADDRESS,
+                page_addr=page_begin + layout.page_offset,
             )
 
-            if crc_page_success is False:
-                crc_error_count = crc_error_count + 1
-                if crc_error_count > crc_error_limit:
-                    crc_error_count = 0
-                    self.this_update_error = True
+            self.__report_page_result(crc_page_success)
+            if not crc_page_success:
+                if not crc_retry.failed():
                     self.update_error_message = f"{module_info.type} ({module_info.id}) check crc failed."
-                    break
+                    return False
                 continue
+            crc_retry.succeeded()
+
+            if resume:
+                self.checkpoints.save(module_info.uuid, plan, page_begin)
+            page_index += 1
+        return True
+
+    def __update_modules_interleaved(self, retry_max: int) -> bool:
+        section_names = {
+            self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_SECOND_BOOTLOADER: "second_bootloader",
+            self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_BOOTLOADER: "bootloader",
+            self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_APPLICATION: "app",
+        }
+        next_level = {
+            self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_SECOND_BOOTLOADER: self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_BOOTLOADER,
+            self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_BOOTLOADER: self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_APPLICATION,
+            self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_APPLICATION: self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_DONE,
+        }
+        active_jobs = dict()
+
+        def next_job(module_info):
+            if module_info.level not in section_names:
+                active_jobs.pop(module_info.uuid, None)
+                return None
+            job = self.__get_flash_job(module_info, section_names[module_info.level])
+            active_jobs[module_info.uuid] = job
+            return job
+
+        def on_page_result(job, success):
+            self.__report_page_result(success)
+            if success and job.section == "app" and job.page_index < len(job.pages):
+                # an image page, the end-flash page is the last one
+                self.checkpoints.save(job.module_info.uuid, job.plan, job.pages[job.page_index - 1].page_begin)
+            self.module_type = job.module_info.type
+            self.progress = sum(job.progress for job in active_jobs.values()) // len(active_jobs)
+
+        def on_response(job, oper_type, seconds):
+            self.metrics.add_duration(oper_type, seconds, job.module_info.type, job.module_info.uuid)
+            self.metrics.observe_latency(oper_type, seconds)
+
+        def on_job_end(job):
+            module_info = job.module_info
+            if job.bulk_erase_rejected:
+                self.bulk_erase_rejected.add(module_info.uuid)
+            if job.state == FlashJob.DONE:
+                if job.section == "app":
+                    self.checkpoints.clear(module_info.uuid)
+                if job.section == "bootloader":
+                    self.__send_conn(self.__set_module_state(module_info.id, Module.REBOOT, Module.PNP_OFF))
+                elif job.section == "second_bootloader":
+                    self.__send_conn(self.__set_module_state(module_info.id, Module.REBOOT, Module.PNP_OFF))
+                    self.__send_conn(self.__set_module_state(module_info.id, Module.REBOOT, Module.PNP_OFF))
+                self.__print(f"{job.section} update is done for {module_info.type} ({module_info.id})")
+                self.update_complete_num += 1
+                module_info.level = next_level[module_info.level]
             else:
-                crc_error_count = 0
+                self.update_error_message = job.error_message
+                self.has_update_error = True
+                module_info.retry += 1
+                if module_info.retry > retry_max:
+                    module_info.level = self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_ERROR
+            return next_job(module_info)
+
+        jobs = [job for job in map(next_job, self.module_registry) if job is not None]
+        scheduler = FlashScheduler(self.__send_firmware_command_nowait, self.__send_page, self.state_event)
+        scheduler.run(jobs, on_page_result, on_job_end, on_response)
+        self.progress = 0
 
-            page_begin = page_begin + page_size
-            time.sleep(0.01)
+        return all(module_info.level == self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_DONE for module_info in self.module_registry)
+
+    def __resume_index(self, module_info: ModuleRecord, plan: FirmwarePlan) -> int:
+        # Index of the first page to write, the pages before it passed their crc check in an earlier attempt
+        page_begin = self.checkpoints.load(module_info.uuid, plan)
+        if page_begin is None:
+            return 0
+        # the module may have been flashed, even partly, with another image since, so every page
+        # up to the checkpoint is checked again and the update resumes at the first one that differs
+        checkpoint_index = plan.page_begins.index(page_begin) + 1
+        page_index = 0
+        while page_index < checkpoint_index:
+            page_begin = plan.page_begins[page_index]
+            if not self.check_page_crc(module_info.id, plan.checksums[page_begin], plan.page_address(page_begin)):
+                break
+            page_index += 1
+        if page_index == 0:
+            self.checkpoints.clear(module_info.uuid)
+            return 0
+        self.__print(f"{module_info.type} ({module_info.id}) resumes its update at page {page_index} of {len(plan.page_begins)}")
+        return page_index
+
+    def __matching_pages(self, module_info: ModuleRecord, plan: FirmwarePlan, skip_pages=()) -> set:
+        # Pages the module already holds, they are neither erased nor written
+        matching_pages = set()
+        if not self.delta_mode:
+            return matching_pages
+
+        for page_begin in plan.page_begins:
+            if page_begin in skip_pages:
+                continue
+            if self.check_page_crc(module_info.id, plan.checksums[page_begin], plan.page_address(page_begin)):
+                matching_pages.add(page_begin)
+        self.__print(f"{module_info.type} ({module_info.id}) holds {len(matching_pages)} page(s) of the image already")
+        return matching_pages
+
+    def __erase_runs(self, module_info: ModuleRecord, plan: FirmwarePlan, skip_pages=()) -> set:
+        # Erase the image's runs of pages up front, returns the pages left erased
+        erased_pages = set()
+        if not self.bulk_erase_mode or module_info.uuid in self.bulk_erase_rejected:
+            return erased_pages
+
+        layout = plan.layout
+        for run_begin, run_pages in plan.erase_runs(self.MAX_ERASE_RUN_PAGES, skip_pages):
+            if run_pages == 1:
+                # as cheap as the erase of the page loop
+                continue
+            erase_unit_num = run_pages * layout.erase_page_num
+            erase_run_success = self.send_firmware_command(
+                oper_type="erase",
+                module_id=module_info.id,
+                crc_val=erase_unit_num,
+                dest_addr=FLASH_MEMORY_ADDRESS,
+                page_addr=run_begin + layout.page_offset,
+                response_timeout=0.5 + erase_unit_num * ERASE_UNIT_TIME,
+            )
+            if not erase_run_success:
+                # the page loop erases whatever is left, one page at a time
+                self.__print(f"{module_info.type} ({module_info.id}) rejected a {run_pages} page erase, erasing page by page")
+                self.bulk_erase_rejected.add(module_info.uuid)
+                break
+            erased_pages.update(range(run_begin, run_begin + run_pages * layout.page_size, layout.page_size))
+        return erased_pages
 
-        self.progress = 99
-        self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(99, 100)} 99%")
+    def __get_flash_job(self, module_info: ModuleRecord, section: str) -> FlashJob:
+        version_key = "app" if section == "app" else "bootloader"
+        bin_path = get_firmware_bin_path(self.module_firmware_path, module_info.type, section, self.firmware_version_info[module_info.type][version_key])
+        with open(bin_path, "rb") as bin_file:
+            bin_buffer = bin_file.read()
 
-        verify_header = 0xAA
-        if self.this_update_error:
-            self.has_update_error = True
-            verify_header = 0xFF
-            return False
+        layout = get_flash_layout(module_info.type, section)
+        if section == "app":
+            end_flash_data = get_end_flash_data(
+                layout,
+                0xAA,
+                os_version=get_version_value(self.firmware_version_info[module_info.type]["os"]),
+                app_version=get_version_value(self.firmware_version_info[module_info.type]["app"]),
+            )
         else:
-            # Get version info from version_path, using appropriate methods
-            second_bootloader_version_info = self.firmware_version_info[module_info.type]["bootloader"]
-            second_bootloader_version_info = second_bootloader_version_info.lstrip("v").split("-")[0]
-
-            # Set end-flash data to be sent at the end of the firmware update
-            end_flash_data = bytearray(16)
-            end_flash_data[0] = verify_header
-            end_flash_data[6] = 0
-            end_flash_data[7] = 0
-
-            for boot_address_index in range(4):
-                if module_info.type in ["speaker", "display", "env"]:
-                    end_flash_data[boot_address_index + 12] = ((0x08009000 >> (boot_address_index * 8)) & 0xFF)
-                else:
-                    end_flash_data[boot_address_index + 12] = ((0x08005000 >> (boot_address_index * 8)) & 0xFF)
-
-            success_end_flash = self.send_end_flash_data(module_info.type, module_info.id, end_flash_data)
-            reboot_message = self.__set_module_state(module_info.id, Module.REBOOT, Module.PNP_OFF)
-            self.__send_conn(reboot_message)
-            self.__send_conn(reboot_message)
+            end_flash_data = get_end_flash_data(layout, 0xAA)
+
+        plan = get_firmware_plan(bin_buffer, layout)
+        return FlashJob.from_image(
+            module_info,
+            section,
+            plan,
+            get_firmware_frames(plan.image, layout.page_size),
+            # end-flash data always goes to the page send_end_flash_data writes
+            get_flash_layout(module_info.type, "app"),
+            end_flash_data,
+            max_run_pages=self.MAX_ERASE_RUN_PAGES if self.bulk_erase_mode and module_info.uuid not in self.bulk_erase_rejected else 1,
+            delta=self.delta_mode,
+            resume_page_num=self.__resume_index(module_info, plan) if section == "app" else 0,
+            retry_policy=self.retry_policy,
+        )
 
-            # Firmware update flag down, resetting used flags
-            if not success_end_flash:
-                self.update_error_message = f"{module_info.type} ({module_info.id}) version writing failed."
-                self.has_update_error = True
-                return False
-            else:
-                self.__print(f"Version info (v{second_bootloader_version_info}) has been written to its firmware!")
-                self.progress = 100
-                self.__print(f"\rUpdating {module_info.type} ({module_info.id}) {self.__progress_bar(1, 1)} 100%")
-                self.update_complete_num += 1
-                self.progress = 0
-                self.__print(f"seconde bootloader update is done for {module_info.type} ({module_info.id})")
-                self.reset_state(update_in_progress=True)
-            return True
+    def __send_firmware_command_nowait(self, oper_type: str, module_id: int, crc_val: int, page_address: int) -> None:
+        rot_scmd = 2 if oper_type == "erase" else 1
+        self.__send_conn(self.get_firmware_command(module_id, 1, rot_scmd, crc_val, page_addr=page_address))
 
     @staticmethod
     def __set_module_state(destination_id: int, module_state: int, pnp_state: int) -> str:
@@ -841,75 +834,53 @@ class ModuleFirmwareUpdater(ModiSerialPort):
 
         return json.dumps(message, separators=(",", ":"))
 
-    # TODO: Use retry decorator here
-    @retry(Exception)
-    def send_end_flash_data(self, module_type: str, module_id: int, end_flash_data: bytearray) -> None:
-        # Write end-flash data until success
-        end_flash_success = False
-        end_flash_address = 0x0800f800
-        end_flash_erase_page_num = 1
-        if module_type == "speaker" or module_type == "display" or module_type == "env":
-            end_flash_address = 0x0801f800
-            end_flash_erase_page_num = 2
-
-        erase_error_limit = 2
-        erase_error_count = 0
-        crc_error_limit = 2
-        crc_error_count = 0
-        while not end_flash_success:
-            # Erase page (send erase request and receive erase response)
-            erase_page_success = self.send_firmware_command(
-                oper_type="erase",
-                module_id=module_id,
-                crc_val=end_flash_erase_page_num,
-                dest_addr=end_flash_address,
+    def send_end_flash_data(self, module_type: str, module_id: int, end_flash_data: bytearray) -> bool:
+        # A serial error counts as a failed attempt of the end-flash budget as well
+        with self.metrics.phase("end_flash", *self.__module_labels(module_id)):
+            end_flash_success = self.retry_policy.call(
+                "end_flash", self.__write_end_flash_data, module_type, module_id, end_flash_data, exceptions=(OSError, )
             )
-            # TODO: Remove magic number of dest_addr above, try using flash_mem
-            if not erase_page_success:
-                erase_error_count = erase_error_count + 1
-                if erase_error_count > erase_error_limit:
-                    erase_error_count = 0
-                    self.update_error_message = "Response timed-out"
-                    break
-                continue
-            else:
-                erase_error_count = 0
-
-            # Send data
-            checksum = 0
-            for end_flash_ptr in range(0, len(end_flash_data), 8):
-                curr_data = end_flash_data[end_flash_ptr: end_flash_ptr + 8]
-                checksum = self.send_firmware_data(
-                    module_id,
-                    seq_num=end_flash_ptr // 8,
-                    bin_data=curr_data,
-                    crc_val=checksum
-                )
-                time.sleep(0.001)
+        if not end_flash_success:
+            self.update_error_message = "Response timed-out"
+            return False
+        self.__print(f"End flash is written for {module_type} ({module_id})")
+        return True
 
-            # CRC on current page (send CRC request and receive CRC response)
-            crc_page_success = self.send_firmware_command(
-                oper_type="crc",
-                module_id=module_id,
-                crc_val=checksum,
-                dest_addr=end_flash_address,
-            )
-            if not crc_page_success:
-                crc_error_count = crc_error_count + 1
-                if crc_error_count > crc_error_limit:
-                    crc_error_count = 0
-                    self.update_error_message = "Response timed-out"
-                    break
-                continue
-            else:
-                crc_error_count = 0
+    def __write_end_flash_data(self, module_type: str, module_id: int, end_flash_data: bytearray) -> bool:
+        layout = get_flash_layout(module_type, "app")
 
-            end_flash_success = True
-        self.__print(f"End flash is written for {module_type} ({module_id})")
+        # Erase page (send erase request and receive erase response)
+        erase_page_success = self.send_firmware_command(
+            oper_type="erase",
+            module_id=module_id,
+            crc_val=layout.erase_page_num,
+            dest_addr=layout.end_flash_address,
+        )
+        if not erase_page_success:
+            return False
 
-        return end_flash_success
+        # Send data
+        checksum = 0
+        for end_flash_ptr in range(0, len(end_flash_data), 8):
+            curr_data = end_flash_data[end_flash_ptr: end_flash_ptr + 8]
+            checksum = self.send_firmware_data(
+                module_id,
+                seq_num=end_flash_ptr // 8,
+                bin_data=curr_data,
+                crc_val=checksum
+            )
+            time.sleep(0.001)
 
-    def get_firmware_command(self, module_id: int, rot_stype: int, rot_scmd: int, crc32: int, page_addr: int,) -> str:
+        # CRC on current page (send CRC request and receive CRC response)
+        return self.send_firmware_command(
+            oper_type="crc",
+            module_id=module_id,
+            crc_val=checksum,
+            dest_addr=layout.end_flash_address,
+        )
+
+    @staticmethod
+    def get_firmware_command(module_id: int, rot_stype: int, rot_scmd: int, crc32: int, page_addr: int,) -> str:
         message = dict()
         message["c"] = 0x0D
 
@@ -936,7 +907,8 @@ class ModuleFirmwareUpdater(ModiSerialPort):
 
         return json.dumps(message, separators=(",", ":"))
 
-    def get_firmware_data(self, module_id: int, seq_num: int, bin_data: bytes) -> str:
+    @staticmethod
+    def get_firmware_data(module_id: int, seq_num: int, bin_data: bytes) -> str:
         message = dict()
         message["c"] = 0x0B
         message["s"] = seq_num
@@ -948,23 +920,12 @@ class ModuleFirmwareUpdater(ModiSerialPort):
         return json.dumps(message, separators=(",", ":"))
 
     def calc_crc32(self, data: bytes, crc: int) -> int:
-        crc ^= int.from_bytes(data, byteorder="little", signed=False)
-
-        for _ in range(32):
-            if crc & (1 << 31) != 0:
-                crc = (crc << 1) ^ 0x4C11DB7
-            else:
-                crc <<= 1
-            crc &= 0xFFFFFFFF
-
-        return crc
+        return calc_crc32(data, crc)
 
     def calc_crc64(self, data: bytes, checksum: int) -> int:
-        checksum = self.calc_crc32(data[:4], checksum)
-        checksum = self.calc_crc32(data[4:], checksum)
-        return checksum
+        return calc_crc64(data, checksum)
 
-    def send_firmware_command(self, oper_type: str, module_id: int, crc_val: int, dest_addr: int, page_addr: int = 0,) -> bool:
+    def send_firmware_command(self, oper_type: str, module_id: int, crc_val: int, dest_addr: int, page_addr: int = 0, response_timeout: float = 0.5) -> bool:
         rot_scmd = 0
         success_state = None
         fail_state = None
@@ -979,38 +940,45 @@ class ModuleFirmwareUpdater(ModiSerialPort):
         # Send firmware command request
         self.reset_state(True)
         request_message = self.get_firmware_command(module_id, 1, rot_scmd, crc_val, page_addr=dest_addr + page_addr)
+        command_begin = time.perf_counter()
         self.__send_conn(request_message)
-        return self.receive_command_response(id=module_id, success_response=success_state, fail_response=fail_state)
-
-    def receive_command_response(self, id, success_response, fail_response, response_delay: float = 0.01, response_timeout: float = 0.5) -> bool:
-        has_response = False
-        result_flag = False
-        for module_info in self.update_module_list:
-            if module_info.id == id:
-                has_response = True
-                response_wait_time = 0
-                while module_info.state != success_response:
-                    time.sleep(response_delay)
-                    response_wait_time += response_delay
-                    if response_wait_time > response_timeout:
-                        self.update_error_message = "Response timed-out"
-                        if self.raise_error_message:
-                            raise Exception(self.update_error_message)
-                        result_flag = False
-                        break
-                    if module_info.state == fail_response:
-                        self.update_error_message = "Response Errored"
-                        if self.raise_error_message:
-                            raise Exception(self.update_error_message)
-                        self.response_error_flag = False
-                        result_flag = False
-                        break
-                if module_info.state == success_response:
-                    result_flag = True
-                break
-        if has_response:
-            module_info.state = self.NO_ERROR
-        return result_flag
+        success = self.receive_command_response(id=module_id, success_response=success_state, fail_response=fail_state, response_timeout=response_timeout)
+        self.__record_command(oper_type, module_id, time.perf_counter() - command_begin)
+        return success
+
+    def check_page_crc(self, module_id: int, checksum: int, page_address: int, response_timeout: float = 0.5) -> bool:
+        # True if the flash of the module at page_address passes the crc check, a mismatch is not an error
+        module_info = self.module_registry.get_by_id(module_id)
+        if module_info is None:
+            return False
+
+        module_info.set_state(self.NO_ERROR)
+        command_begin = time.perf_counter()
+        self.__send_conn(self.get_firmware_command(module_id, 1, 1, checksum, page_addr=page_address))
+        state = module_info.wait_for_state((self.CRC_COMPLETE, self.CRC_ERROR), response_timeout)
+        module_info.set_state(self.NO_ERROR)
+        self.__record_command("crc", module_id, time.perf_counter() - command_begin)
+        return state == self.CRC_COMPLETE
+
+    def receive_command_response(self, id, success_response, fail_response, response_timeout: float = 0.5) -> bool:
+        module_info = self.module_registry.get_by_id(id)
+        if module_info is None:
+            return False
+
+        # The receive thread wakes us as soon as the module answers
+        state = module_info.wait_for_state((success_response, fail_response), response_timeout)
+        module_info.set_state(self.NO_ERROR)
+        if state == success_response:
+            return True
+
+        if state == fail_response:
+            self.update_error_message = "Response Errored"
+            self.response_error_flag = False
+        else:
+            self.update_error_message = "Response timed-out"
+        if self.raise_error_message:
+            raise Exception(self.update_error_message)
+        return False
 
     def send_firmware_data(self, module_id: int, seq_num: int, bin_data: bytes, crc_val: int) -> int:
         # Send firmware data
@@ -1021,6 +989,36 @@ class ModuleFirmwareUpdater(ModiSerialPort):
         checksum = self.calc_crc64(data=bin_data, checksum=crc_val)
         return checksum
 
+    def __send_page(self, firmware_frames, page_begin: int, module_id: int) -> None:
+        data_messages = firmware_frames.page_frames(page_begin, module_id)
+        send_begin = time.perf_counter()
+        if self.burst_mode:
+            self.write_paced(data_messages, self.pacing, self.burst_chunk_frame_num)
+        else:
+            for data_message in data_messages:
+                self.__send_conn(data_message)
+                self.pacer.wait(0.001)
+        module_labels = self.__module_labels(module_id)
+        self.metrics.add_duration("data", time.perf_counter() - send_begin, *module_labels)
+        self.metrics.add_bytes(sum(map(len, data_messages)), *module_labels)
+
+    def __module_labels(self, module_id: int) -> tuple:
+        # (type, uuid) the metrics of module_id are recorded under
+        module_info = self.module_registry.get_by_id(module_id)
+        return (module_info.type, module_info.uuid) if module_info is not None else ("", None)
+
+    def __record_command(self, oper_type: str, module_id: int, seconds: float) -> None:
+        self.metrics.add_duration(oper_type, seconds, *self.__module_labels(module_id))
+        self.metrics.observe_latency(oper_type, seconds)
+
+    def __report_page_result(self, success: bool) -> None:
+        if not self.burst_mode:
+            return
+        if success:
+            self.pacing.page_passed()
+        else:
+            self.pacing.page_failed()
+
     def __progress_bar(self, current: int, total: int) -> str:
         curr_bar = 50 * current // total
         rest_bar = 50 - curr_bar
@@ -1035,39 +1033,29 @@ class ModuleFirmwareUpdater(ModiSerialPort):
             time.sleep(0.01)
 
         while self.__running:
-            self.__handle_message()
-            time.sleep(0.001)
+            if not self.__handle_message():
+                time.sleep(0.001)
 
     def read_json(self):
-        json_pkt = b""
-        while json_pkt != b"{":
-            if not self.is_open:
-                return None
-            json_pkt = self.read()
-            if json_pkt == b"":
-                return None
-            time.sleep(0.001)
-        json_pkt += self.read_until(b"}")
-        return json_pkt.decode("utf8")
+        if not self.is_open:
+            return None
+        json_pkt = self.read_frame()
+        return json_pkt.decode("utf8") if json_pkt else None
 
     def wait_for_json(self, timeout=2):
-        json_msg = self.read_json()
-        init_time = time.time()
-        while not json_msg:
-            json_msg = self.read_json()
-            time.sleep(0.001)
-            if time.time() - init_time > timeout:
-                return None
-        return json_msg
+        if not self.is_open:
+            return None
+        json_pkt = self.read_frame(timeout)
+        return json_pkt.decode("utf8") if json_pkt else None
 
-    def __handle_message(self):
+    def __handle_message(self) -> bool:
         try:
-            msg = self.wait_for_json()
+            msg = self.read_json()
             if not msg:
-                return
+                return False
             ins, sid, did, data, length = decode_message(msg)
         except Exception:
-            return
+            return False
 
         command = {
             0x00: self.__request_uuid,
@@ -1078,21 +1066,23 @@ class ModuleFirmwareUpdater(ModiSerialPort):
 
         if command:
             command(sid, data, length)
+        return True
 
     def __update_firmware_state(self, sid: int, data: str, length: int):
         message_decoded = unpack_data(data, (4, 1))
         stream_state = message_decoded[1]
-        for module_info in self.update_module_list:
-            if module_info.id == sid:
-                module_info.state = stream_state
-                if stream_state == self.CRC_ERROR:
-                    self.update_response(response=True, is_error_response=True)
-                elif stream_state == self.CRC_COMPLETE:
-                    self.update_response(response=True)
-                elif stream_state == self.ERASE_ERROR:
-                    self.update_response(response=True, is_error_response=True)
-                elif stream_state == self.ERASE_COMPLETE:
-                    self.update_response(response=True)
+        module_info = self.module_registry.get_by_id(sid)
+        if module_info is not None:
+            module_info.set_state(stream_state)
+            self.state_event.set()
+            if stream_state == self.CRC_ERROR:
+                self.update_response(response=True, is_error_response=True)
+            elif stream_state == self.CRC_COMPLETE:
+                self.update_response(response=True)
+            elif stream_state == self.ERASE_ERROR:
+                self.update_response(response=True, is_error_response=True)
+            elif stream_state == self.ERASE_COMPLETE:
+                self.update_response(response=True)
 
     def __update_warning(self, sid: int, data: str, length: int) -> None:
         module_uuid = unpack_data(data, (6, 1))[0]
@@ -1112,130 +1102,117 @@ class ModuleFirmwareUpdater(ModiSerialPort):
         else:
             # if get module list state, do
             if self.update_in_progress is False:
-                check_flag = True
-                for module_info in self.update_module_list:
-                    if module_info.uuid == module_uuid:
-                        check_flag = False
-                        break
-                if check_flag:
+                if self.module_registry.add(module_uuid & 0xFFF, module_uuid, module_type) is not None:
                     self.gathering_update_list_timeout = 0
-                    temp_module = Module_info()
-                    temp_module.id = module_uuid & 0xFFF
-                    temp_module.uuid = module_uuid
-                    temp_module.type = module_type
-
-                    self.update_module_list.append(temp_module)
-
-            for module_info in self.update_module_list:
-                if (module_info.id == sid) and (module_info.state is not self.UPDATE_READY):
-                    if warning_type == 1:
-                        # in bootloader but not ready to update
-                        self.check_to_update_firmware(module_id)
-                    elif warning_type == 2:
-                        # Note that more than one warning type 2 message can be received
-                        if length < 10:
-                            module_info.level = self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_SECOND_BOOTLOADER
-                        else:
-                            module_section = unpack_data(data, (7, 1))[1]
-                            boot_version = unpack_data(data, (8, 2))[1]
-
-                            loaded_boot_version_info = self.firmware_version_info[module_type]["bootloader"]
-                            loaded_boot_version_info = loaded_boot_version_info.lstrip("v").split("-")[0]
-                            loaded_boot_version_digits = [int(digit) for digit in loaded_boot_version_info.split(".")]
-                            loaded_boot_version = (
-                                loaded_boot_version_digits[0] << 13
-                                | loaded_boot_version_digits[1] << 8
-                                | loaded_boot_version_digits[2]
-                            )
-                            if module_section == self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_APPLICATION and (boot_version != loaded_boot_version):
-                                # boot version is low, bootloader update is necessary
-                                module_info.level = self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_SECOND_BOOTLOADER
-                            else:
-                                module_info.level = module_section
-                            module_info.state = self.UPDATE_READY
-                    break
+
+            module_info = self.module_registry.get_by_id(sid)
+            if module_info is not None and module_info.state != self.UPDATE_READY:
+                if warning_type == 1:
+                    # in bootloader but not ready to update
+                    self.check_to_update_firmware(module_id)
+                elif warning_type == 2 and module_type in self.firmware_version_info:
+                    # Note that more than one warning type 2 message can be received,
+                    # the ones arriving before the update request are skipped
+                    module_info.level = self.get_update_section(data, length, self.firmware_version_info[module_type]["bootloader"])
+                    if length >= 10:
+                        if not self.force_update and self.is_up_to_date(module_info, self.firmware_version_info):
+                            self.__print(f"{module_type} ({module_id}) is up to date, skipped")
+                            module_info.level = self.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_DONE
+                        module_info.set_state(self.UPDATE_READY)
+
+    @classmethod
+    def is_up_to_date(cls, module_info: ModuleRecord, firmware_version_info: dict) -> bool:
+        # Both bootloaders are current (only the application is asked for) and so is the application
+        if module_info.level != cls.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_APPLICATION or module_info.version is None:
+            return False
+        return module_info.version == get_version_value(firmware_version_info[module_info.type]["app"])
+
+    @classmethod
+    def get_update_section(cls, data: str, length: int, bootloader_version_info: str) -> int:
+        # Section to update first, from the warning (type 2) of a module waiting in its bootloader
+        if length < 10:
+            return cls.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_SECOND_BOOTLOADER
+
+        module_section = unpack_data(data, (7, 1))[1]
+        boot_version = unpack_data(data, (8, 2))[1]
+        if module_section == cls.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_APPLICATION and boot_version != get_version_value(bootloader_version_info):
+            # boot version is low, bootloader update is necessary
+            return cls.BOOT_UPDATE_SECTION_NEED_TO_UPDATE_SECOND_BOOTLOADER
+        return module_section
 
     def __print(self, data, end="\n"):
         if self.print:
             print(data, end)
 
 
-class ModuleFirmwareMultiUpdater():
+class ModuleFirmwareMultiUpdater(PageFlashMultiUpdater):
     def __init__(self, module_firmware_path):
-        self.update_in_progress = False
-        self.ui = None
-        self.list_ui = None
-        self.task_end_callback = None
-        self.module_firmware_path = module_firmware_path
+        super().__init__(module_firmware_path)
+        self.interleave_mode = False
+        self.bulk_erase_mode = False
+        self.force_update = False
+        self.checkpoint_path = None
+        self.module_num_hint = None
 
-    def set_ui(self, ui, list_ui):
-        self.ui = ui
-        self.list_ui = list_ui
+    def set_interleave_mode(self, interleave_mode: bool):
+        # Flash the modules of each network side by side
+        self.interleave_mode = interleave_mode
 
-    def set_task_end_callback(self, task_end_callback):
-        self.task_end_callback = task_end_callback
+    def set_bulk_erase_mode(self, bulk_erase_mode: bool):
+        # Erase runs of contiguous pages with a single erase command
+        self.bulk_erase_mode = bulk_erase_mode
 
-    def update_module_firmware(self, modi_ports, firmware_version_info):
-        self.module_updaters = []
-        self.network_uuid = []
-        self.state = []
-        self.wait_timeout = []
-        self.module_num = []
-
-        for i, modi_port in enumerate(modi_ports):
-            if i > 9:
-                break
-            try:
-                module_updater = ModuleFirmwareUpdater(
-                    device=modi_port,
-                    module_firmware_path=self.module_firmware_path
-                )
-                module_updater.set_print(True)
-                module_updater.set_raise_error(False)
-            except Exception:
-                print("open " + modi_port + " error")
-            else:
-                self.module_updaters.append(module_updater)
-                self.state.append(-1)
-                self.network_uuid.append('')
-                self.wait_timeout.append(0)
-                self.module_num.append(0)
+    def set_force_update(self, force_update: bool):
+        # Also flash the modules that are already up to date
+        self.force_update = force_update
 
-        if self.list_ui:
-            self.list_ui.set_device_num(len(self.module_updaters))
-            self.list_ui.ui.close_button.setEnabled(False)
+    def set_checkpoint_path(self, checkpoint_path: str = None):
+        # Directory the app update checkpoints are kept in, across sessions
+        self.checkpoint_path = checkpoint_path
 
-        self.update_in_progress = True
+    def set_module_num_hint(self, module_num_hint: int = None):
+        # Number of modules expected on each port, ends the module discovery early
+        self.module_num_hint = module_num_hint
+
+    def update_module_firmware(self, modi_ports, firmware_version_info):
+        if self._in_processes(modi_ports):
+            self._begin_update(len(modi_ports))
+            self._update_in_processes("update_module_firmware", modi_ports, (firmware_version_info, ), "\nFirmware update is complete!!")
+            return
 
-        for index, module_updater in enumerate(self.module_updaters):
-            th.Thread(
-                target=module_updater.update_module_firmware,
-                args=(firmware_version_info, ),
-                daemon=True
-            ).start()
-            if self.list_ui:
-                self.list_ui.error_message_signal.emit(index, "Waiting for network uuid")
+        self.modi_ports = list(modi_ports)
+        self.module_updaters = [None] * len(self.modi_ports)
+        self.network_uuid = [''] * len(self.modi_ports)
+        self.state = [-2] * len(self.modi_ports)
+        self.wait_timeout = [0] * len(self.modi_ports)
+        self.module_num = [0] * len(self.modi_ports)
+        self._begin_update(len(self.modi_ports))
 
         delay = 0.1
         while True:
+            self._start_queued_updaters(-2, (-1, 0), lambda index, modi_port: self.__start_updater(index, modi_port, firmware_version_info))
+
             is_done = True
             total_progress = 0
             for index, module_updater in enumerate(self.module_updaters):
-                if module_updater.network_uuid is not None and len(self.network_uuid[index]) == 0:
+                if self.state[index] == -2:
+                    # queued
+                    is_done = False
+                    self._emit("error_message_signal", index, "Waiting for other ports")
+                    continue
+
+                if module_updater is not None and module_updater.network_uuid is not None and len(self.network_uuid[index]) == 0:
                     self.network_uuid[index] = f'0x{module_updater.network_uuid:X}'
-                    if self.list_ui:
-                        self.list_ui.network_uuid_signal.emit(index, self.network_uuid[index])
+                    self._emit("network_uuid_signal", index, self.network_uuid[index])
 
                 if self.state[index] == -1:
                     # wait module list
                     is_done = False
-                    if self.list_ui:
-                        if len(self.network_uuid[index]):
-                            self.list_ui.network_uuid_signal.emit(index, self.network_uuid[index])
-                        self.list_ui.error_message_signal.emit(index, "Waiting for module list")
+                    self._emit("error_message_signal", index, "Waiting for module list")
                     if module_updater.update_in_progress:
                         self.state[index] = 0
                         self.module_num[index] = module_updater.all_update_module_num
+                        print(f"{self.modi_ports[index]}: {self.module_num[index]} module(s) found in {module_updater.discovery_time:.2f}s")
                     else:
                         self.wait_timeout[index] += delay
                         if self.wait_timeout[index] > 15:
@@ -1246,10 +1223,7 @@ class ModuleFirmwareMultiUpdater():
                 if self.state[index] == 0:
                     # get module update list (only module update)
                     is_done = False
-                    if self.list_ui:
-                        if len(self.network_uuid[index]):
-                            self.list_ui.network_uuid_signal.emit(index, self.network_uuid[index])
-                        self.list_ui.error_message_signal.emit(index, "Updating modules")
+                    self._emit("error_message_signal", index, "Updating modules")
                     if module_updater.update_error == 0:
                         current_module_progress = 0
                         total_module_progress = 0
@@ -1263,9 +1237,8 @@ class ModuleFirmwareMultiUpdater():
 
                             total_progress += total_module_progress / len(self.module_updaters)
 
-                        if self.list_ui:
-                            self.list_ui.current_module_changed_signal.emit(index, module_updater.module_type)
-                            self.list_ui.progress_signal.emit(index, int(current_module_progress), int(total_module_progress))
+                        self._emit("current_module_changed_signal", index, module_updater.module_type)
+                        self._emit("progress_signal", index, int(current_module_progress), int(total_module_progress))
                     else:
                         self.state[index] = 1
                 elif self.state[index] == 1:
@@ -1273,52 +1246,84 @@ class ModuleFirmwareMultiUpdater():
                     is_done = False
                     total_progress += 100 / len(self.module_updaters)
                     if module_updater.update_error == 1:
-                        if self.list_ui:
-                            self.list_ui.network_state_signal.emit(index, 0)
-                            self.list_ui.error_message_signal.emit(index, "Update success")
+                        self._emit("network_state_signal", index, 0)
+                        self._emit("error_message_signal", index, "Update success")
                     else:
                         module_updater.close()
                         print("\n" + module_updater.update_error_message + "\n")
-                        if self.list_ui:
-                            self.list_ui.network_state_signal.emit(index, -1)
-                            self.list_ui.error_message_signal.emit(index, module_updater.update_error_message)
-                    if self.list_ui:
-                        self.list_ui.progress_signal.emit(index, 100, 100)
+                        self._emit("network_state_signal", index, -1)
+                        self._emit("error_message_signal", index, module_updater.update_error_message)
+                    self._emit("progress_signal", index, 100, 100)
                     self.state[index] = 2
                 elif self.state[index] == 2:
                     total_progress += 100 / len(self.module_updaters)
-                time.sleep(0.001)
 
             if len(self.module_updaters):
                 if self.ui:
-                    if self.module_updaters[0].module_listup_flag == True:
-                        if self.ui.is_english:
-                            self.ui.update_general_modules_button.setText(f"General modules update is in progress. ({int(total_progress)}%)")
-                        else:
-                            self.ui.update_general_modules_button.setText(f"일반 모듈 업데이트가 진행중입니다. ({int(total_progress)}%)")
+                    if any(module_updater and module_updater.module_listup_flag for module_updater in self.module_updaters):
+                        self.__set_progress_text(total_progress)
                     else:
                         if self.ui.is_english:
                             self.ui.update_general_modules_button.setText(f"General modules update is in progress. (listup...)")
                         else:
                             self.ui.update_general_modules_button.setText(f"일반 모듈 업데이트가 진행중입니다. (모듈 확인 중...)")
 
-                if self.list_ui:
-                    self.list_ui.total_progress_signal.emit(int(total_progress))
-                    self.list_ui.total_status_signal.emit("Update...")
+                self._emit("total_progress_signal", None, int(total_progress))
+                self._emit("total_status_signal", None, "Update...")
 
             if is_done:
                 break
             time.sleep(delay)
 
-        self.update_in_progress = False
-
-        if self.task_end_callback:
-            self.task_end_callback(self.list_ui)
+        self._end_update("\nFirmware update is complete!!")
+        self._report_metrics([module_updater.metrics if module_updater else None for module_updater in self.module_updaters])
+
+    def _worker_settings(self) -> dict:
+        settings = super()._worker_settings()
+        settings.update({
+            "set_interleave_mode": (self.interleave_mode, ),
+            "set_bulk_erase_mode": (self.bulk_erase_mode, ),
+            "set_force_update": (self.force_update, ),
+            "set_checkpoint_path": (self.checkpoint_path, ),
+            "set_module_num_hint": (self.module_num_hint, ),
+        })
+        return settings
+
+    def _show_total_progress(self, total_progress: int) -> None:
+        if self.ui:
+            self.__set_progress_text(total_progress)
+
+    def __set_progress_text(self, total_progress):
+        if self.ui.is_english:
+            self.ui.update_general_modules_button.setText(f"General modules update is in progress. ({int(total_progress)}%)")
+        else:
+            self.ui.update_general_modules_button.setText(f"일반 모듈 업데이트가 진행중입니다. ({int(total_progress)}%)")
 
-        print("\nFirmware update is complete!!")
+    def __start_updater(self, index, modi_port, firmware_version_info) -> bool:
+        # A port is only opened once it gets a slot, so queued ports hold no threads or buffers
+        try:
+            module_updater = ModuleFirmwareUpdater(
+                device=modi_port,
+                module_firmware_path=self.module_firmware_path
+            )
+            module_updater.set_print(True)
+            self._configure_updater(module_updater)
+            module_updater.set_interleave_mode(self.interleave_mode)
+            module_updater.set_bulk_erase_mode(self.bulk_erase_mode)
+            module_updater.set_force_update(self.force_update)
+            module_updater.set_checkpoint_path(self.checkpoint_path)
+            module_updater.set_module_num_hint(self.module_num_hint)
+        except Exception:
+            self.state[index] = 2
+            self._report_open_error(index, modi_port)
+            return False
 
-    @staticmethod
-    def __progress_bar(current: int, total: int) -> str:
-        curr_bar = int(50 * current // total)
-        rest_bar = int(50 - curr_bar)
-        return (f"\rFirmware Update: [{'=' * curr_bar}>{'.' * rest_bar}] {100 * current / total:3.1f}%")
+        self.module_updaters[index] = module_updater
+        self.state[index] = -1
+        th.Thread(
+            target=module_updater.update_module_firmware,
+            args=(firmware_version_info, ),
+            daemon=True
+        ).start()
+        self._emit("error_message_signal", index, "Waiting for network uuid")
+        return True
@@ -0,0 +1,216 @@
+import math
+
+from modi2_firmware_updater.core.process_updater import run_in_processes
+from modi2_firmware_updater.util.metrics_util import collect_records, write_metrics
+
+
+class FirmwareMultiUpdater():
+    """Coordinator of the updaters of many ports, shared by the multi updaters
+
+    Reports the progress of every port to the list ui and the signal callback,
+    starts the updaters of queued ports as slots free up, spreads the ports
+    over worker processes and writes the metrics of each run. Subclasses open
+    the updater of each port and follow its progress.
+
+    :param module_firmware_path: Directory of the firmware binaries
+    """
+
+    def __init__(self, module_firmware_path):
+        self.update_in_progress = False
+        self.ui = None
+        self.list_ui = None
+        self.task_end_callback = None
+        self.module_firmware_path = module_firmware_path
+        self.max_concurrency = None
+        self.process_num = None
+        self.signal_callback = None
+        self.metrics_json_lines_path = None
+        self.metrics_prometheus_path = None
+        self.modi_ports = []
+        self.state = []
+        self.__last_signal_args = dict()
+
+    def set_ui(self, ui, list_ui=None):
+        self.ui = ui
+        self.list_ui = list_ui
+
+    def set_max_concurrency(self, max_concurrency: int = None):
+        # Ports beyond max_concurrency are queued until a running update ends (no limit if None)
+        self.max_concurrency = max_concurrency
+
+    def set_process_num(self, process_num: int = None):
+        # Update groups of ports in up to process_num worker processes (in this process if None)
+        self.process_num = process_num
+
+    def set_metrics_output(self, json_lines_path: str = None, prometheus_path: str = None):
+        # Files the update metrics of each run are written to, see write_metrics
+        self.metrics_json_lines_path = json_lines_path
+        self.metrics_prometheus_path = prometheus_path
+
+    def set_task_end_callback(self, task_end_callback):
+        self.task_end_callback = task_end_callback
+
+    def set_signal_callback(self, signal_callback):
+        # Called with (signal_name, index, args) for every list ui signal, and metrics_signal
+        self.signal_callback = signal_callback
+
+    def _in_processes(self, modi_ports) -> bool:
+        return bool(self.process_num and self.process_num > 1 and len(modi_ports) > 1)
+
+    def _worker_settings(self) -> dict:
+        # Setter name to arguments, called on the multi updater of every worker process
+        max_concurrency = None
+        if self.max_concurrency is not None:
+            max_concurrency = math.ceil(self.max_concurrency / self.process_num)
+        return {"set_max_concurrency": (max_concurrency, )}
+
+    def _show_total_progress(self, total_progress: int) -> None:
+        # Total progress of the ports updated by the worker processes, shown by the subclasses
+        pass
+
+    def _begin_update(self, port_num: int) -> None:
+        self.__last_signal_args.clear()
+
+        if self.list_ui:
+            # queued to the gui thread, ahead of the signals of the ports
+            self.list_ui.device_num_signal.emit(port_num)
+            self.list_ui.ui.close_button.setEnabled(False)
+
+        self.update_in_progress = True
+
+    def _end_update(self, message: str) -> None:
+        self.update_in_progress = False
+
+        if self.task_end_callback:
+            self.task_end_callback(self.list_ui)
+
+        print(message)
+
+    def _update_in_processes(self, method_name: str, modi_ports, args: tuple, end_message: str) -> None:
+        """Run method_name of this multi updater over worker processes, see run_in_processes
+
+        The list ui gets the signals of every worker, and the metrics files are
+        written once the metrics of all of them are in.
+        """
+        process_metrics = dict()
+
+        def on_process_signal(signal_name, index, signal_args):
+            if signal_name == "metrics_signal":
+                process_metrics[index] = signal_args[0]
+                if self.signal_callback:
+                    self.signal_callback(signal_name, index, signal_args)
+                return
+            if signal_name == "total_progress_signal":
+                self._show_total_progress(signal_args[0])
+            self._emit(signal_name, index, *signal_args)
+
+        run_in_processes(
+            type(self),
+            self.module_firmware_path,
+            self._worker_settings(),
+            method_name,
+            list(modi_ports),
+            args,
+            self.process_num,
+            on_process_signal,
+        )
+
+        self._end_update(end_message)
+        records = [process_metrics[index] for index in sorted(process_metrics)]
+        write_metrics(records, self.metrics_json_lines_path, self.metrics_prometheus_path)
+
+    def _start_queued_updaters(self, queued_state: int, running_states: tuple, start_updater) -> None:
+        """Start queued ports while fewer than max_concurrency ports are running
+
+        :param queued_state: State of the ports waiting for a slot
+        :param running_states: States of the ports holding a slot
+        :param start_updater: Called with (index, modi_port), returns True if the port got running
+        """
+        running_num = sum(1 for state in self.state if state in running_states)
+        for index, modi_port in enumerate(self.modi_ports):
+            if self.state[index] != queued_state:
+                continue
+            if self.max_concurrency is not None and running_num >= self.max_concurrency:
+                break
+            if start_updater(index, modi_port):
+                running_num += 1
+
+    def _report_open_error(self, index: int, modi_port: str) -> None:
+        print("open " + modi_port + " error")
+        self._emit("network_state_signal", index, -1)
+        self._emit("error_message_signal", index, "Open error")
+
+    def _report_metrics(self, port_metrics) -> None:
+        # Waits for the updaters to end their last phase, only if anyone takes the metrics
+        if not (self.signal_callback or self.metrics_json_lines_path or self.metrics_prometheus_path):
+            return
+        records = collect_records(port_metrics)
+        for index, record in enumerate(records):
+            if record is not None and self.signal_callback:
+                self.signal_callback("metrics_signal", index, (record, ))
+        write_metrics([record for record in records if record is not None], self.metrics_json_lines_path, self.metrics_prometheus_path)
+
+    def _emit(self, signal_name, index, *args):
+        # Only forward what changed, every signal repaints a widget of the list ui
+        if not self.list_ui and not self.signal_callback:
+            return
+        if self.__last_signal_args.get((signal_name, index)) == args:
+            return
+        self.__last_signal_args[(signal_name, index)] = args
+
+        if self.signal_callback:
+            self.signal_callback(signal_name, index, args)
+        if self.list_ui:
+            signal = getattr(self.list_ui, signal_name)
+            if index is None:
+                signal.emit(*args)
+            else:
+                signal.emit(index, *args)
+
+    @staticmethod
+    def _progress_bar(current: int, total: int) -> str:
+        curr_bar = int(50 * current // total)
+        rest_bar = int(50 - curr_bar)
+        return (f"\rFirmware Update: [{'=' * curr_bar}>{'.' * rest_bar}] {100 * current / total:3.1f}%")
+
+
+class PageFlashMultiUpdater(FirmwareMultiUpdater):
+    """Multi updater of the updaters flashing pages over json frames
+
+    Holds the flash settings the module and network updaters share, and
+    hands them to the updater of each port.
+    """
+
+    def __init__(self, module_firmware_path):
+        super().__init__(module_firmware_path)
+        self.burst_mode = False
+        self.burst_chunk_frame_num = None
+        self.delta_mode = False
+        self.retry_budgets = None
+
+    def set_burst_mode(self, burst_mode: bool, chunk_frame_num: int = None):
+        self.burst_mode = burst_mode
+        self.burst_chunk_frame_num = chunk_frame_num
+
+    def set_delta_mode(self, delta_mode: bool):
+        # Only rewrite the pages whose crc differs on the module
+        self.delta_mode = delta_mode
+
+    def set_retry_budgets(self, retry_budgets: dict = None):
+        # Operation name to (attempts, base_delay), see RetryPolicy.BUDGETS
+        self.retry_budgets = retry_budgets
+
+    def _worker_settings(self) -> dict:
+        settings = super()._worker_settings()
+        settings.update({
+            "set_burst_mode": (self.burst_mode, self.burst_chunk_frame_num),
+            "set_delta_mode": (self.delta_mode, ),
+            "set_retry_budgets": (self.retry_budgets, ),
+        })
+        return settings
+
+    def _configure_updater(self, updater) -> None:
+        updater.set_raise_error(False)
+        updater.set_burst_mode(self.burst_mode, self.burst_chunk_frame_num)
+        updater.set_delta_mode(self.delta_mode)
+        updater.set_retry_budgets(self.retry_budgets)
@@ -1,5 +1,4 @@
 import json
-import sys
 import threading as th
 import time
 from io import open
@@ -7,10 +6,15 @@ from os import path
 
 from serial.serialutil import SerialException
 
+from modi2_firmware_updater.core.multi_updater import PageFlashMultiUpdater
+from modi2_firmware_updater.util.crc_util import calc_crc32, calc_crc64
 from modi2_firmware_updater.util.message_util import parse_message, unpack_data
+from modi2_firmware_updater.util.metrics_util import UpdateMetrics
 from modi2_firmware_updater.util.modi_winusb.modi_serialport import ModiSerialPort, list_modi_serialports
 from modi2_firmware_updater.util.module_util import Module, get_module_type_from_uuid
-from modi2_firmware_updater.util.platform_util import delay
+from modi2_firmware_updater.util.firmware_util import get_firmware_frames, get_firmware_plan, get_flash_layout
+from modi2_firmware_updater.util.platform_util import PacingBudget, Pacer
+from modi2_firmware_updater.util.retry_util import RetryPolicy
 
 
 class NetworkFirmwareUpdater(ModiSerialPort):
@@ -61,15 +65,38 @@ class NetworkFirmwareUpdater(ModiSerialPort):
 
         self.module_firmware_path = module_firmware_path
 
+        self.burst_mode = False
+        self.burst_chunk_frame_num = None
+        self.pacing = None
+        self.pacer = Pacer()
+        self.delta_mode = False
+        self.retry_policy = RetryPolicy()
+        self.metrics = UpdateMetrics("network", self.port)
+
     def set_print(self, print):
         self.print = print
 
     def set_raise_error(self, raise_error_message):
         self.raise_error_message = raise_error_message
 
+    def set_burst_mode(self, burst_mode, chunk_frame_num=None):
+        # Send each page in bulk writes of chunk_frame_num frames (whole page if None)
+        self.burst_mode = burst_mode
+        self.burst_chunk_frame_num = chunk_frame_num
+        self.pacing = PacingBudget(self.baudrate) if burst_mode else None
+
+    def set_delta_mode(self, delta_mode):
+        # Check the crc of every page on the module first and only rewrite the pages that differ
+        self.delta_mode = delta_mode
+
+    def set_retry_budgets(self, retry_budgets=None):
+        # Operation name to (attempts, base_delay), see RetryPolicy.BUDGETS
+        self.retry_policy = RetryPolicy(retry_budgets)
+
     def get_connected_module_info(self):
         timeout = 3
         init_time = time.time()
+        discovery_retry = self.retry_policy.budget("discovery")
         while True:
             self.__print("request uuid")
             self.send_request_network_uuid()
@@ -81,6 +108,8 @@ class NetworkFirmwareUpdater(ModiSerialPort):
 
             try:
                 if not recved:
+                    if not discovery_retry.failed():
+                        return None, None, None
                     continue
 
                 json_msg = json.loads(recved)
@@ -195,85 +224,104 @@ class NetworkFirmwareUpdater(ModiSerialPort):
         if self.is_open:
             self.write(send_pkt.encode("utf8"))
 
-    def set_firmware_command(self, oper_type, module_id, crc_val, page_addr):
+    def send_firmware_page(self, firmware_frames, page_begin, module_id):
+        data_messages = firmware_frames.page_frames(page_begin, module_id)
+        send_begin = time.perf_counter()
+        if self.burst_mode:
+            self.write_paced(data_messages, self.pacing, self.burst_chunk_frame_num)
+        else:
+            for data_message in data_messages:
+                if self.is_open:
+                    self.write(data_message)
+                self.pacer.wait(0.001)
+        self.metrics.add_duration("data", time.perf_counter() - send_begin, *self.__module_labels())
+        self.metrics.add_bytes(sum(map(len, data_messages)), *self.__module_labels())
+
+    def set_firmware_command(self, oper_type, module_id, crc_val, page_addr, response_timeout=5):
+        # A single attempt, the callers retry within self.retry_policy
+        command_begin = time.perf_counter()
         self.send_firmware_command(oper_type, module_id, crc_val, page_addr)
-        ret = self.receive_firmware_command_response()
-        if not ret and oper_type == "erase":
-            retry_count = 0
-            max_retry = 5
-            while not ret:
-                self.send_firmware_command(oper_type, module_id, crc_val, page_addr)
-                ret = self.receive_firmware_command_response()
-                retry_count += 1
-                if retry_count > max_retry:
-                    break
-        return ret
+        success = self.receive_firmware_command_response(timeout=response_timeout)
+        seconds = time.perf_counter() - command_begin
+        self.metrics.add_duration(oper_type, seconds, *self.__module_labels())
+        self.metrics.observe_latency(oper_type, seconds)
+        return success
+
+    def __module_labels(self):
+        # (type, uuid) the metrics of the network or camera module are recorded under
+        return ("network" if self.is_network else "camera", self.network_uuid)
+
+    def get_matching_pages(self, module_id, plan):
+        # Pages the module already holds (crc check passes on its flash), empty if not in delta mode
+        matching_pages = set()
+        if not self.delta_mode:
+            return matching_pages
+
+        for page_begin in plan.page_begins:
+            # a mismatch is answered right away, no need for the long command timeout
+            if self.set_firmware_command("crc", module_id, plan.checksums[page_begin], plan.page_address(page_begin), response_timeout=0.5):
+                matching_pages.add(page_begin)
+        self.__print(f"Module ({module_id}) holds {len(matching_pages)} page(s) of the image already")
+        return matching_pages
 
     def set_firmware_data(self, module_id, seq_num, bin_data, checksum):
         self.send_firmware_data(module_id, seq_num, bin_data)
         return self.calc_crc64(bin_data, checksum)
 
     def set_end_flash_data(self, module_id, end_flash_data):
-        end_flash_success = False
-        page_retry_count = 0
-        page_retry_max_count = 10
+        with self.metrics.phase("end_flash", *self.__module_labels()):
+            end_flash_success = self.retry_policy.call("end_flash", self.__write_end_flash_data, module_id, end_flash_data)
+        if not end_flash_success:
+            self.update_error = -1
+            self.update_error_message = "End flash error"
+            return False
+        self.__print(f"End flash is written for network ({module_id})")
+        return True
+
+    def __write_end_flash_data(self, module_id, end_flash_data):
         erase_page_num = 2
 
-        while not end_flash_success:
-            # Erase page (send erase request and receive erase response)
-            erase_page_success = self.set_firmware_command(
-                oper_type="erase",
-                module_id=module_id,
-                crc_val=erase_page_num,
-                page_addr=0x0801F800
+        # Erase page (send erase request and receive erase response)
+        erase_page_success = self.set_firmware_command(
+            oper_type="erase",
+            module_id=module_id,
+            crc_val=erase_page_num,
+            page_addr=0x0801F800
+        )
+        if not erase_page_success:
+            return False
+
+        # Send data
+        checksum = 0
+        for end_flash_ptr in range(0, len(end_flash_data), 8):
+            curr_data = end_flash_data[end_flash_ptr : end_flash_ptr + 8]
+            checksum = self.set_firmware_data(
+                module_id,
+                seq_num=end_flash_ptr // 8,
+                bin_data=curr_data,
+                checksum=checksum
             )
+            time.sleep(0.001)
 
-            # erase_page_success = self.set_firmware_command("erase", module_id, 0, 0x0801F800)
-            if not erase_page_success:
-                self.update_error = -1
-                self.update_error_message = "End erase error"
-                return False
-
-            # Send data
-            checksum = 0
-            for end_flash_ptr in range(0, len(end_flash_data), 8):
-                curr_data = end_flash_data[end_flash_ptr : end_flash_ptr + 8]
-                checksum = self.set_firmware_data(
-                    module_id,
-                    seq_num=end_flash_ptr // 8,
-                    bin_data=curr_data,
-                    checksum=checksum
-                )
-                time.sleep(0.001)
-            # checksum = self.set_firmware_data(module_id, 0, end_flash_data, 0)
-
-            # CRC on current page (send CRC request and receive CRC response)
-            crc_page_success = self.set_firmware_command("crc", module_id, checksum, 0x0801F800)
-            if not crc_page_success:
-                if self.update_error == -1:
-                    return False
-                else:
-                    page_retry_count += 1
-                    if page_retry_count > page_retry_max_count:
-                        self.update_error = -1
-                        self.update_error_message = "End crc error"
-                        return False
-                    continue
-            else:
-                page_retry_count = 0
-
-            end_flash_success = True
-        self.__print(f"End flash is written for network ({module_id})")
-        return True
+        # CRC on current page (send CRC request and receive CRC response)
+        return self.set_firmware_command("crc", module_id, checksum, 0x0801F800)
 
     def update_module_firmware(self, firmware_version_info):
+        try:
+            self.__update_module_firmware(firmware_version_info)
+        finally:
+            self.metrics.set_retries(self.retry_policy.snapshot())
+            self.metrics.finish()
+
+    def __update_module_firmware(self, firmware_version_info):
         self.__print("update_module_firmware")
         self.update_in_progress = True
         self.progress = 0
         self.firmware_version_info = firmware_version_info
 
         self.__print("get network info")
-        self.network_uuid, self.network_version, self.is_network = self.get_connected_module_info()
+        with self.metrics.phase("discovery"):
+            self.network_uuid, self.network_version, self.is_network = self.get_connected_module_info()
 
         if self.network_uuid:
             self.network_id = self.network_uuid & 0xFFF
@@ -281,6 +329,7 @@ class NetworkFirmwareUpdater(ModiSerialPort):
             self.network_id = 0xFFF
 
         self.__print("set network module to bootloader")
+        entry_begin = time.perf_counter()
         self.send_set_network_module_state(self.network_id, Module.UPDATE_FIRMWARE, Module.PNP_OFF)
         time.sleep(0.2)
 
@@ -296,13 +345,12 @@ class NetworkFirmwareUpdater(ModiSerialPort):
         timeout = 10
         init_time = time.time()
         is_timeout = False
-        retry = 0
-        max_retry = 5
+        discovery_retry = self.retry_policy.budget("discovery")
         while True:
             recved = self.wait_for_json()
             if not recved:
-                retry += 1
-                if retry > max_retry:
+                # wait_for_json already waited, no backoff on top of it
+                if not discovery_retry.failed(sleep=False):
                     is_timeout = True
                     break
                 continue
@@ -333,6 +381,7 @@ class NetworkFirmwareUpdater(ModiSerialPort):
                 self.__print("json parse error: " + str(jde))
 
             time.sleep(0.01)
+        self.metrics.add_duration("bootloader_entry", time.perf_counter() - entry_begin)
 
         if is_timeout:
             self.update_in_progress = False
@@ -358,91 +407,78 @@ class NetworkFirmwareUpdater(ModiSerialPort):
 
         self.update_in_progress = False
 
-    def update_network_module(self, module_id):
-        root_path = path.join(self.module_firmware_path, "network", "e103", self.firmware_version_info["network"]["app"])
-        bin_path = path.join(root_path, "network.bin")
-        with open(bin_path, "rb") as bin_file:
-            bin_buffer = bin_file.read()
-
-        # Init metadata of the bytes loaded
-        page_size = 0x800
-        flash_memory_addr = 0x08000000
-        erase_page_num = 2
-
-        bin_size = sys.getsizeof(bin_buffer)
-        bin_begin = page_size
-        bin_end = bin_size - ((bin_size - bin_begin) % page_size)
-
-        page_offset = 0x8800
-        page_begin = bin_begin
-
-        erase_error_limit = 2
-        erase_error_count = 0
-        crc_error_limit = 2
-        crc_error_count = 0
-        while page_begin < bin_end :
+    def __flash_plan(self, module_type, module_id, plan):
+        # Erase, write and crc check the pages of plan, False once a retry budget is exhausted
+        bin_end = plan.bin_end
+        firmware_frames = get_firmware_frames(plan.image, plan.page_size, fixed_length=False)
+        matching_pages = self.get_matching_pages(module_id, plan)
+
+        erase_retry = self.retry_policy.budget("erase")
+        crc_retry = self.retry_policy.budget("crc")
+        page_index = 0
+        while page_index < len(plan.page_begins):
+            page_begin = plan.page_begins[page_index]
             progress = 100 * page_begin // bin_end
             self.progress = progress
 
-            self.__print(f"\rUpdating network ({module_id}) {self.__progress_bar(page_begin, bin_end)} {progress}%", end="")
+            self.__print(f"\rUpdating {module_type} ({module_id}) {self.__progress_bar(page_begin, bin_end)} {progress}%", end="")
 
-            page_end = page_begin + page_size
-            curr_page = bin_buffer[page_begin:page_end]
-
-            # Skip current page if empty
-            if curr_page == bytes(len(curr_page)):
-                page_begin = page_begin + page_size
-                time.sleep(0.02)
+            if page_begin in matching_pages:
+                # the module already holds this page
+                page_index += 1
                 continue
 
             erase_page_success = self.set_firmware_command(
                 oper_type="erase",
                 module_id=module_id,
-                crc_val=erase_page_num,
-                page_addr=flash_memory_addr + page_begin + page_offset
+                crc_val=plan.layout.erase_page_num,
+                page_addr=plan.page_address(page_begin)
             )
 
             if not erase_page_success:
-                erase_error_count = erase_error_count + 1
-                if erase_error_count > erase_error_limit:
-                    erase_error_count = 0
-                    self.has_update_error = True
-                    self.update_error_message = f"network ({module_id}) erase flash failed."
-                    break
+                if not erase_retry.failed():
+                    self.update_error_message = f"{module_type} ({module_id}) erase flash failed."
+                    return False
                 continue
-            else:
-                erase_error_count = 0
+            erase_retry.succeeded()
 
-            checksum = 0
-            for curr_ptr in range(0, page_size, 8):
-                if page_begin + curr_ptr >= bin_size:
-                    break
-
-                curr_data = curr_page[curr_ptr : curr_ptr + 8]
-                checksum = self.set_firmware_data(module_id, curr_ptr // 8, curr_data, checksum)
-                delay(0.001)
+            checksum = plan.checksums[page_begin]
+            self.send_firmware_page(firmware_frames, page_begin, module_id)
 
             # CRC on current page (send CRC request / receive CRC response)
             crc_page_success = self.set_firmware_command(
                 oper_type="crc",
                 module_id=module_id,
                 crc_val=checksum,
-                page_addr=flash_memory_addr + page_begin + page_offset
+                page_addr=plan.page_address(page_begin)
             )
 
-            if crc_page_success:
-                crc_error_count = 0
-            else:
-                crc_error_count = crc_error_count + 1
-                if crc_error_count > crc_error_limit:
-                    crc_error_count = 0
-                    self.has_update_error = True
+            if self.burst_mode:
+                if crc_page_success:
+                    self.pacing.page_passed()
+                else:
+                    self.pacing.page_failed()
+
+            if not crc_page_success:
+                if not crc_retry.failed():
                     self.update_error_message = "Check crc failed."
-                    break
+                    return False
                 continue
+            crc_retry.succeeded()
 
-            page_begin = page_begin + page_size
-            time.sleep(0.01)
+            page_index += 1
+        return True
+
+    def update_network_module(self, module_id):
+        root_path = path.join(self.module_firmware_path, "network", "e103", self.firmware_version_info["network"]["app"])
+        bin_path = path.join(root_path, "network.bin")
+        with open(bin_path, "rb") as bin_file:
+            bin_buffer = bin_file.read()
+
+        # Init metadata of the bytes loaded
+        plan = get_firmware_plan(bin_buffer, get_flash_layout("network", "app"))
+        if not self.__flash_plan("network", module_id, plan):
+            self.has_update_error = True
 
         self.progress = 99
         self.__print(f"\rUpdating network ({module_id}) {self.__progress_bar(99, 100)} 99%")
@@ -482,6 +518,7 @@ class NetworkFirmwareUpdater(ModiSerialPort):
         self.__print(f"Firmware update is done for network ({module_id})")
 
         # Reboot all connected modules
+        reboot_begin = time.perf_counter()
         self.send_set_module_state(0xFFF, Module.REBOOT, Module.PNP_OFF)
         self.__print("Reboot message has been sent to all connected modules")
 
@@ -494,6 +531,7 @@ class NetworkFirmwareUpdater(ModiSerialPort):
         time.sleep(1)
 
         self.close()
+        self.metrics.add_duration("reboot", time.perf_counter() - reboot_begin)
 
         return not self.has_update_error
 
@@ -504,84 +542,9 @@ class NetworkFirmwareUpdater(ModiSerialPort):
             bin_buffer = bin_file.read()
 
         # Init metadata of the bytes loaded
-        page_size = 0x800
-        flash_memory_addr = 0x08000000
-        erase_page_num = 2
-
-        bin_size = sys.getsizeof(bin_buffer)
-        bin_begin = page_size
-        bin_end = bin_size - ((bin_size - bin_begin) % page_size)
-
-        page_offset = 0x8800
-        page_begin = bin_begin
-
-        erase_error_limit = 2
-        erase_error_count = 0
-        crc_error_limit = 2
-        crc_error_count = 0
-        while page_begin < bin_end :
-            progress = 100 * page_begin // bin_end
-            self.progress = progress
-
-            self.__print(f"\rUpdating camera ({module_id}) {self.__progress_bar(page_begin, bin_end)} {progress}%", end="")
-
-            page_end = page_begin + page_size
-            curr_page = bin_buffer[page_begin:page_end]
-
-            # Skip current page if empty
-            if curr_page == bytes(len(curr_page)):
-                page_begin = page_begin + page_size
-                time.sleep(0.02)
-                continue
-
-            erase_page_success = self.set_firmware_command(
-                oper_type="erase",
-                module_id=module_id,
-                crc_val=erase_page_num,
-                page_addr=flash_memory_addr + page_begin + page_offset
-            )
-
-            if not erase_page_success:
-                erase_error_count = erase_error_count + 1
-                if erase_error_count > erase_error_limit:
-                    erase_error_count = 0
-                    self.has_update_error = True
-                    self.update_error_message = f"camera ({module_id}) erase flash failed."
-                    break
-                continue
-            else:
-                erase_error_count = 0
-
-            checksum = 0
-            for curr_ptr in range(0, page_size, 8):
-                if page_begin + curr_ptr >= bin_size:
-                    break
-
-                curr_data = curr_page[curr_ptr : curr_ptr + 8]
-                checksum = self.set_firmware_data(module_id, curr_ptr // 8, curr_data, checksum)
-                delay(0.001)
-
-            # CRC on current page (send CRC request / receive CRC response)
-            crc_page_success = self.set_firmware_command(
-                oper_type="crc",
-                module_id=module_id,
-                crc_val=checksum,
-                page_addr=flash_memory_addr + page_begin + page_offset
-            )
-
-            if crc_page_success:
-                crc_error_count = 0
-            else:
-                crc_error_count = crc_error_count + 1
-                if crc_error_count > crc_error_limit:
-                    crc_error_count = 0
-                    self.has_update_error = True
-                    self.update_error_message = "Check crc failed."
-                    break
-                continue
-
-            page_begin = page_begin + page_size
-            time.sleep(0.01)
+        plan = get_firmware_plan(bin_buffer, get_flash_layout("camera", "app"))
+        if not self.__flash_plan("camera", module_id, plan):
+            self.has_update_error = True
 
         self.progress = 99
         self.__print(f"\rUpdating camera ({module_id}) {self.__progress_bar(99, 100)} 99%")
@@ -621,6 +584,7 @@ class NetworkFirmwareUpdater(ModiSerialPort):
         self.__print(f"Firmware update is done for camera ({module_id})")
 
         # Reboot all connected modules
+        reboot_begin = time.perf_counter()
         self.send_set_module_state(0xFFF, Module.REBOOT, Module.PNP_OFF)
         self.__print("Reboot message has been sent to all connected modules")
 
@@ -633,47 +597,27 @@ class NetworkFirmwareUpdater(ModiSerialPort):
         time.sleep(1)
 
         self.close()
+        self.metrics.add_duration("reboot", time.perf_counter() - reboot_begin)
 
         return not self.has_update_error
 
     def read_json(self):
-        json_pkt = b""
-        while json_pkt != b"{":
-            if not self.is_open:
-                return None
-            json_pkt = self.read()
-            if json_pkt == b"":
-                return None
-            time.sleep(0.001)
-        json_pkt += self.read_until(b"}")
-        return json_pkt.decode("utf8")
+        if not self.is_open:
+            return None
+        json_pkt = self.read_frame()
+        return json_pkt.decode("utf8") if json_pkt else None
 
     def wait_for_json(self, timeout=2):
-        json_msg = self.read_json()
-        init_time = time.time()
-        while not json_msg:
-            json_msg = self.read_json()
-            time.sleep(0.001)
-            if time.time() - init_time > timeout:
-                return None
-        return json_msg
+        if not self.is_open:
+            return None
+        json_pkt = self.read_frame(timeout)
+        return json_pkt.decode("utf8") if json_pkt else None
 
     def calc_crc32(self, data: bytes, crc: int) -> int:
-        crc ^= int.from_bytes(data, byteorder="little", signed=False)
-
-        for _ in range(32):
-            if crc & (1 << 31) != 0:
-                crc = (crc << 1) ^ 0x4C11DB7
-            else:
-                crc <<= 1
-            crc &= 0xFFFFFFFF
-
-        return crc
+        return calc_crc32(data, crc)
 
     def calc_crc64(self, data, checksum):
-        checksum = self.calc_crc32(data[:4], checksum)
-        checksum = self.calc_crc32(data[4:], checksum)
-        return checksum
+        return calc_crc64(data, checksum)
 
     def __progress_bar(self, current, total):
         curr_bar = 50 * current // total
@@ -685,55 +629,20 @@ class NetworkFirmwareUpdater(ModiSerialPort):
             print(data, end)
 
 
-class NetworkFirmwareMultiUpdater():
-    def __init__(self, module_firmware_path):
-        self.update_in_progress = False
-        self.ui = None
-        self.list_ui = None
-        self.task_end_callback = None
-        self.module_firmware_path = module_firmware_path
-
-    def set_ui(self, ui, list_ui=None):
-        self.ui = ui
-        self.list_ui = list_ui
-
-    def set_task_end_callback(self, task_end_callback):
-        self.task_end_callback = task_end_callback
-
+class NetworkFirmwareMultiUpdater(PageFlashMultiUpdater):
     def update_module_firmware(self, modi_ports, firmware_version_info={}):
-        self.network_updaters = []
-        self.network_uuid = []
-        self.state = []
-
-        for i, modi_port in enumerate(modi_ports):
-            if i > 9:
-                break
-            try:
-                network_updater = NetworkFirmwareUpdater(
-                    device=modi_port,
-                    module_firmware_path=self.module_firmware_path
-                )
-                network_updater.set_print(False)
-                network_updater.set_raise_error(False)
-            except Exception:
-                print("open " + modi_port + " error")
-            else:
-                self.network_updaters.append(network_updater)
-                self.state.append(0)
-                self.network_uuid.append('')
-
-        if self.list_ui:
-            self.list_ui.set_device_num(len(self.network_updaters))
-            self.list_ui.ui.close_button.setEnabled(False)
-
-        self.update_in_progress = True
+        if self._in_processes(modi_ports):
+            self._begin_update(len(modi_ports))
+            if self.ui:
+                self.__set_progress_text(0)
+            self._update_in_processes("update_module_firmware", modi_ports, (firmware_version_info, ), "\nFirmware update is complete!!")
+            return
 
-        for index, network_updater in enumerate(self.network_updaters):
-            th.Thread(
-                target=network_updater.update_module_firmware,
-                args=(firmware_version_info, ),
-                daemon=True
-            ).start()
+        self.modi_ports = list(modi_ports)
+        self.network_updaters = [None] * len(self.modi_ports)
+        self.network_uuid = [''] * len(self.modi_ports)
+        self.state = [-1] * len(self.modi_ports)
+        self._begin_update(len(self.modi_ports))
 
         if self.ui:
             if self.ui.is_english:
@@ -741,15 +650,22 @@ class NetworkFirmwareMultiUpdater():
             else:
                 self.ui.update_network_module_button.setText("네트워크/카메라 모듈 업데이트가 진행중입니다. (0%)")
 
-        delay = 0.01
+        delay = 0.1
+        last_progress_bar = None
         while True:
+            self._start_queued_updaters(-1, (0, ), lambda index, modi_port: self.__start_updater(index, modi_port, firmware_version_info))
+
             is_done = True
             total_progress = 0
             for index, network_updater in enumerate(self.network_updaters):
-                if network_updater.network_uuid and len(self.network_uuid[index]) == 0:
+                if self.state[index] == -1:
+                    # queued
+                    is_done = False
+                    continue
+
+                if network_updater is not None and network_updater.network_uuid and len(self.network_uuid[index]) == 0:
                     self.network_uuid[index] = f'0x{network_updater.network_uuid:X}'
-                    if self.list_ui:
-                        self.list_ui.network_uuid_signal.emit(index, self.network_uuid[index])
+                    self._emit("network_uuid_signal", index, self.network_uuid[index])
 
                 if self.state[index] == 0:
                     # update modules
@@ -758,10 +674,7 @@ class NetworkFirmwareMultiUpdater():
                         current_module_progress = network_updater.progress
                         total_progress += current_module_progress / len(self.network_updaters)
 
-                        if self.list_ui:
-                            if len(self.network_uuid[index]):
-                                self.list_ui.network_uuid_signal.emit(index, self.network_uuid[index])
-                            self.list_ui.progress_signal.emit(index, int(current_module_progress))
+                        self._emit("progress_signal", index, int(current_module_progress))
                     else:
                         total_progress += 100 / len(self.network_updaters)
                         self.state[index] = 1
@@ -770,48 +683,67 @@ class NetworkFirmwareMultiUpdater():
                     total_progress += 100 / len(self.network_updaters)
                     if network_updater.update_error == 1:
                         # update success
-                        if self.list_ui:
-                            self.list_ui.network_state_signal.emit(index, 0)
-                            self.list_ui.progress_signal.emit(index, 100)
+                        self._emit("network_state_signal", index, 0)
+                        self._emit("progress_signal", index, 100)
                     else:
                         print("\n" + network_updater.update_error_message + "\n")
                         # update error
-                        if self.list_ui:
-                            self.list_ui.network_state_signal.emit(index, -1)
-                            self.list_ui.error_message_signal.emit(index, network_updater.update_error_message)
+                        self._emit("network_state_signal", index, -1)
+                        self._emit("error_message_signal", index, network_updater.update_error_message)
 
                     self.state[index] = 2
                 elif self.state[index] == 2:
                     total_progress += 100 / len(self.network_updaters)
 
-                time.sleep(0.001)
-
             if len(self.network_updaters):
-                print(f"{self.__progress_bar(total_progress, 100)}", end="")
+                progress_bar = self._progress_bar(total_progress, 100)
+                if progress_bar != last_progress_bar:
+                    print(progress_bar, end="")
+                    last_progress_bar = progress_bar
                 if self.ui:
-                    if self.ui.is_english:
-                        self.ui.update_network_module_button.setText(f"Network/Camera module update is in progress. ({int(total_progress)}%)")
-                    else:
-                        self.ui.update_network_module_button.setText(f"네트워크/카메라 모듈 업데이트가 진행중입니다. ({int(total_progress)}%)")
+                    self.__set_progress_text(total_progress)
 
-                if self.list_ui:
-                    self.list_ui.total_progress_signal.emit(int(total_progress))
-                    self.list_ui.total_status_signal.emit("Update...")
+                self._emit("total_progress_signal", None, int(total_progress))
+                self._emit("total_status_signal", None, "Update...")
 
             if is_done:
                 break
 
             time.sleep(delay)
 
-        self.update_in_progress = False
-
-        if self.task_end_callback:
-            self.task_end_callback(self.list_ui)
+        self._end_update("\nFirmware update is complete!!")
+        self._report_metrics([network_updater.metrics if network_updater else None for network_updater in self.network_updaters])
 
-        print("\nFirmware update is complete!!")
+    def _show_total_progress(self, total_progress: int) -> None:
+        print(self._progress_bar(total_progress, 100), end="")
+        if self.ui:
+            self.__set_progress_text(total_progress)
 
-    @staticmethod
-    def __progress_bar(current: int, total: int) -> str:
-        curr_bar = int(50 * current // total)
-        rest_bar = int(50 - curr_bar)
-        return (f"\rFirmware Update: [{'=' * curr_bar}>{'.' * rest_bar}] {100 * current / total:3.1f}%")
+    def __set_progress_text(self, total_progress):
+        if self.ui.is_english:
+            self.ui.update_network_module_button.setText(f"Network/Camera module update is in progress. ({int(total_progress)}%)")
+        else:
+            self.ui.update_network_module_button.setText(f"네트워크/카메라 모듈 업데이트가 진행중입니다. ({int(total_progress)}%)")
+
+    def __start_updater(self, index, modi_port, firmware_version_info) -> bool:
+        # A port is only opened once it gets a slot, so queued ports hold no threads or buffers
+        try:
+            network_updater = NetworkFirmwareUpdater(
+                device=modi_port,
+                module_firmware_path=self.module_firmware_path
+            )
+            network_updater.set_print(False)
+            self._configure_updater(network_updater)
+        except Exception:
+            self.state[index] = 2
+            self._report_open_error(index, modi_port)
+            return False
+
+        self.network_updaters[index] = network_updater
+        self.state[index] = 0
+        th.Thread(
+            target=network_updater.update_module_firmware,
+            args=(firmware_version_info, ),
+            daemon=True
+        ).start()
+        return True
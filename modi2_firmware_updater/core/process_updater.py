@@ -0,0 +1,117 @@
+import math
+import multiprocessing as mp
+import threading as th
+import time
+from multiprocessing.connection import wait
+
+# Progress of a shard covers its own ports only, so these are merged by the coordinator
+TOTAL_SIGNALS = ("total_progress_signal", "total_status_signal")
+
+
+def split_ports(modi_ports: list, process_num: int) -> list:
+    """Split ports in contiguous groups, one per worker process
+
+    :param modi_ports: Ports to update
+    :param process_num: Maximum number of worker processes
+    :return: List of (first index, ports) of each group
+    """
+    shard_size = math.ceil(len(modi_ports) / process_num)
+    return [
+        (offset, modi_ports[offset:offset + shard_size])
+        for offset in range(0, len(modi_ports), shard_size)
+    ]
+
+
+def run_shard(updater_class, module_firmware_path, settings, method_name, modi_ports, args, connection):
+    # Entry point of a worker process, runs a multi updater on its group of ports
+    # and sends every list ui signal back over the connection
+    threads_before = set(th.enumerate())
+
+    updater = updater_class(module_firmware_path)
+    for setter_name, setter_args in settings.items():
+        getattr(updater, setter_name)(*setter_args)
+    updater.set_signal_callback(lambda signal_name, index, signal_args: connection.send((signal_name, index, signal_args)))
+    try:
+        getattr(updater, method_name)(modi_ports, *args)
+
+        # Updaters reboot their modules and close their port after reporting the result,
+        # give them the time to do so before the process exits
+        deadline = time.perf_counter() + 10
+        for thread in set(th.enumerate()) - threads_before:
+            thread.join(max(0, deadline - time.perf_counter()))
+    finally:
+        connection.close()
+
+
+def run_in_processes(
+    updater_class,
+    module_firmware_path,
+    settings: dict,
+    method_name: str,
+    modi_ports: list,
+    args: tuple,
+    process_num: int,
+    signal_callback,
+) -> None:
+    """Run a multi updater over worker processes, each updating a group of ports
+
+    Python level work of the updaters (json, crc, polling) is then spread over
+    cores instead of sharing one interpreter lock.
+
+    :param updater_class: Multi updater class, instantiated in every worker
+    :param module_firmware_path: Firmware path given to the multi updater
+    :param settings: Setter name to arguments, called on the multi updater of every worker
+    :param method_name: Update method of the multi updater
+    :param modi_ports: Ports to update
+    :param args: Arguments of the update method following the ports
+    :param process_num: Maximum number of worker processes
+    :param signal_callback: Called with (signal_name, index, args) for every list ui signal,
+        index being the position of the port in modi_ports
+    """
+    # Forking a process running Qt and serial threads is unsafe, always start fresh interpreters
+    context = mp.get_context("spawn")
+
+    shards = dict()
+    for offset, shard_ports in split_ports(modi_ports, process_num):
+        parent_connection, child_connection = context.Pipe(duplex=False)
+        process = context.Process(
+            target=run_shard,
+            args=(updater_class, module_firmware_path, settings, method_name, shard_ports, args, child_connection),
+            daemon=True,
+        )
+        process.start()
+        child_connection.close()
+        shards[parent_connection] = (process, offset, len(shard_ports))
+
+    shard_progress = {connection: 0 for connection in shards}
+    network_states = dict()
+    connections = list(shards)
+    while connections:
+        for connection in wait(connections):
+            process, offset, port_num = shards[connection]
+            try:
+                signal_name, index, signal_args = connection.recv()
+            except EOFError:
+                connections.remove(connection)
+                process.join()
+                if process.exitcode != 0:
+                    # the worker died, ports without a result are reported as failed
+                    for index in range(offset, offset + port_num):
+                        if index not in network_states:
+                            signal_callback("network_state_signal", index, (-1, ))
+                            signal_callback("error_message_signal", index, ("Update process error", ))
+                    shard_progress[connection] = 100
+                continue
+
+            if signal_name == "total_progress_signal":
+                shard_progress[connection] = signal_args[0]
+                total_progress = sum(
+                    shard_progress[connection] * shards[connection][2] for connection in shards
+                ) / len(modi_ports)
+                signal_callback(signal_name, None, (int(total_progress), ))
+            elif signal_name in TOTAL_SIGNALS:
+                signal_callback(signal_name, None, signal_args)
+            else:
+                if signal_name == "network_state_signal":
+                    network_states[offset + index] = signal_args[0]
+                signal_callback(signal_name, offset + index, signal_args)
@@ -0,0 +1,183 @@
+"""Headless MODI+ firmware updater, reporting its progress as json lines on stdout
+
+Only the core updaters are imported, and only those a command needs, so it
+runs without PyQt5 and without network access:
+
+    python execute_headless_updater.py modules --port /dev/ttyACM0 --max-concurrency 4
+    python execute_headless_updater.py full-refresh --firmware-version-file firmware_version.json
+
+Every line on stdout is a json object with an "event" field:
+
+- start: command, steps and ports of the run
+- signal: a signal of an updater (see set_signal_callback), with its step, port and args
+- result: outcome of a step on each port
+- end: whether every step succeeded on every port
+- error: the run could not start
+
+What the updaters print goes to stderr. The exit code is 0 if every port
+was updated, 1 otherwise.
+"""
+import argparse
+import json
+import os
+import sys
+import threading as th
+import time
+
+# Steps run by each command, in order
+COMMANDS = {
+    "network": ("network", ),
+    "esp32": ("esp32", ),
+    "modules": ("modules", ),
+    "delete-user-code": ("delete-user-code", ),
+    "full-refresh": ("network", "esp32", "modules"),
+}
+
+ASSETS_FIRMWARE_PATH = os.path.join(os.path.dirname(__file__), "assets", "firmware")
+LOCAL_FIRMWARE_PATH = os.path.join(os.path.expanduser("~"), "Documents", "modi+ firmware updater")
+MODULE_FIRMWARE_DIRECTORY = "module_firmware"
+
+
+class JsonLinesWriter:
+    """Json lines of the run, written to a file by any thread"""
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.__lock = th.Lock()
+
+    def write(self, event: str, **fields) -> None:
+        line = json.dumps(dict(event=event, time=round(time.time(), 3), **fields), separators=(",", ":"))
+        with self.__lock:
+            self.output_file.write(line + "\n")
+            self.output_file.flush()
+
+
+def default_firmware_paths() -> tuple:
+    # Same lookup as the gui: the firmware downloaded by the firmware manager if any, else the bundled one
+    local_version_path = os.path.join(LOCAL_FIRMWARE_PATH, "firmware_version.json")
+    if os.path.isfile(local_version_path):
+        return os.path.join(LOCAL_FIRMWARE_PATH, MODULE_FIRMWARE_DIRECTORY), local_version_path
+    return os.path.join(ASSETS_FIRMWARE_PATH, MODULE_FIRMWARE_DIRECTORY), os.path.join(ASSETS_FIRMWARE_PATH, "firmware_version.json")
+
+
+def redirect_stdout_to_stderr():
+    """Keep stdout for the json lines, everything else printed goes to stderr
+
+    Done on the file descriptors, so that the worker processes of the updaters
+    print to stderr as well.
+
+    :return: File writing to the original stdout
+    """
+    sys.stdout.flush()
+    json_fd = os.dup(1)
+    os.dup2(2, 1)
+    return os.fdopen(json_fd, "w")
+
+
+def make_updater(step: str, module_firmware_path: str, args):
+    # Updaters are imported on first use, a command only loads what it runs
+    if step == "network":
+        from modi2_firmware_updater.core.network_updater import NetworkFirmwareMultiUpdater
+        updater = NetworkFirmwareMultiUpdater(module_firmware_path)
+    elif step in ("esp32", "delete-user-code"):
+        from modi2_firmware_updater.core.esp32_updater import ESP32FirmwareMultiUploder
+        updater = ESP32FirmwareMultiUploder(module_firmware_path)
+    else:
+        from modi2_firmware_updater.core.module_updater import ModuleFirmwareMultiUpdater
+        updater = ModuleFirmwareMultiUpdater(module_firmware_path)
+        if args.checkpoint_path:
+            updater.set_checkpoint_path(args.checkpoint_path)
+        updater.set_force_update(args.force)
+    updater.set_max_concurrency(args.max_concurrency)
+    updater.set_process_num(args.processes)
+    updater.set_metrics_output(args.metrics_json_lines, args.metrics_prometheus)
+    return updater
+
+
+def run_step(step: str, modi_ports: list, module_firmware_path: str, firmware_version_info: dict, writer: JsonLinesWriter, args) -> bool:
+    """Run one step of a command on every port
+
+    :return: True if the step succeeded on every port
+    """
+    # network_state_signal is 0 on success and -1 on error, a port that never reported failed
+    port_states = [None] * len(modi_ports)
+
+    def on_signal(signal_name, index, signal_args):
+        if signal_name == "network_state_signal" and index is not None:
+            port_states[index] = signal_args[0]
+        writer.write(
+            "signal", step=step, signal=signal_name, index=index,
+            port=None if index is None else modi_ports[index], args=list(signal_args),
+        )
+
+    updater = make_updater(step, module_firmware_path, args)
+    updater.set_signal_callback(on_signal)
+    if step == "esp32":
+        updater.update_firmware(modi_ports, False, firmware_version_info)
+    elif step == "delete-user-code":
+        updater.update_firmware(modi_ports, True, firmware_version_info)
+    else:
+        updater.update_module_firmware(modi_ports, firmware_version_info)
+
+    results = {modi_port: port_states[index] == 0 for index, modi_port in enumerate(modi_ports)}
+    writer.write("result", step=step, ports=results)
+    return all(results.values())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless MODI+ firmware updater, progress as json lines on stdout")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    command_help = {
+        "network": "Update the network or camera module",
+        "esp32": "Update the ESP32 of the network or camera module",
+        "modules": "Update the general modules",
+        "delete-user-code": "Rewrite the ESP32 interpreter, deleting the user code",
+        "full-refresh": "Update the network or camera module, its ESP32, then the general modules",
+    }
+    for command, help_text in command_help.items():
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument("--port", dest="ports", action="append", help="Port to update, repeat for more (all MODI+ ports if omitted)")
+        subparser.add_argument("--firmware-version-file", help="firmware_version.json giving the version of each firmware")
+        subparser.add_argument("--firmware-path", help="Directory of the firmware binaries (module_firmware)")
+        subparser.add_argument("--max-concurrency", type=int, default=None, help="Ports updated at once (no limit if omitted)")
+        subparser.add_argument("--processes", type=int, default=None, help="Worker processes the ports are spread over")
+        subparser.add_argument("--force", action="store_true", help="Flash the general modules even if their firmware is up to date")
+        subparser.add_argument("--checkpoint-path", help="Directory of the module update checkpoints, to resume interrupted updates")
+        subparser.add_argument("--metrics-json-lines", help="File the update metrics are appended to as json lines")
+        subparser.add_argument("--metrics-prometheus", help="Prometheus text file of the update metrics")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    writer = JsonLinesWriter(redirect_stdout_to_stderr())
+
+    module_firmware_path, firmware_version_path = default_firmware_paths()
+    module_firmware_path = args.firmware_path or module_firmware_path
+    firmware_version_path = args.firmware_version_file or firmware_version_path
+    try:
+        with open(firmware_version_path, "r") as firmware_version_file:
+            firmware_version_info = json.load(firmware_version_file)
+    except (OSError, ValueError) as e:
+        writer.write("error", message=f"Cannot read {firmware_version_path}: {e}")
+        return 1
+
+    modi_ports = args.ports
+    if not modi_ports:
+        from modi2_firmware_updater.util.modi_winusb.modi_serialport import list_modi_serialports
+        modi_ports = list_modi_serialports()
+    if not modi_ports:
+        writer.write("error", message="No MODI+ port is connected")
+        return 1
+
+    steps = COMMANDS[args.command]
+    writer.write("start", command=args.command, steps=list(steps), ports=modi_ports, firmware_path=module_firmware_path)
+    success = True
+    for step in steps:
+        success = run_step(step, modi_ports, module_firmware_path, firmware_version_info, writer, args) and success
+    writer.write("end", command=args.command, success=success)
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
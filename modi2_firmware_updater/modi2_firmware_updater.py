@@ -17,7 +17,7 @@ from modi2_firmware_updater.core.network_updater import NetworkFirmwareMultiUpda
 from modi2_firmware_updater.firmware_manager import FirmwareManagerForm
 from modi2_firmware_updater.update_list_form import ESP32UpdateListForm, ModuleUpdateListForm
 from modi2_firmware_updater.util.modi_winusb.modi_serialport import list_modi_serialports
-from modi2_firmware_updater.util.platform_util import is_raspberrypi, set_delay_option
+from modi2_firmware_updater.util.platform_util import is_raspberrypi
 
 
 class StdoutRedirect(QObject):
@@ -259,10 +259,6 @@ class Form(QDialog):
         self.refresh_button_text()
         self.refresh_console()
 
-        # Set delay option
-        delay_option = self.is_multi
-        set_delay_option(delay_option)
-
         # check app update
         self.check_app_update()
 
@@ -436,6 +432,9 @@ class Form(QDialog):
 
         def run_task(self, modi_ports, firmware_version_info):
             self.firmware_updater = ModuleFirmwareMultiUpdater(self.module_firmware_path)
+            self.firmware_updater.set_checkpoint_path(os.path.join(self.local_firmware_path, "checkpoints"))
+            # the update button has no skip option, it always reflashes every module
+            self.firmware_updater.set_force_update(True)
             self.firmware_updater.set_task_end_callback(self.__reset_ui)
 
             if self.is_multi:
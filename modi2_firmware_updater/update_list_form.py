@@ -2,19 +2,36 @@ import os
 
 from PyQt5 import QtGui, uic
 from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtWidgets import QDialog
+from PyQt5.QtWidgets import QDialog, QGridLayout, QHBoxLayout, QLabel, QProgressBar
 
 from modi2_firmware_updater.util.module_util import get_module_type_from_uuid
 from modi2_firmware_updater.util.platform_util import is_raspberrypi
 
 
+def create_label(text=""):
+    label = QLabel(text)
+    label.setAlignment(Qt.AlignCenter)
+    return label
+
+
+def create_progress_bar():
+    progress_bar = QProgressBar()
+    progress_bar.setValue(0)
+    progress_bar.setTextVisible(False)
+    return progress_bar
+
+
 class ESP32UpdateListForm(QDialog):
+    DEVICE_ROW_SIZE = 10
+
     network_state_signal = pyqtSignal(int, int)
     network_uuid_signal = pyqtSignal(int, str)
     progress_signal = pyqtSignal(int, int)
     total_progress_signal = pyqtSignal(int)
     total_status_signal = pyqtSignal(str)
     error_message_signal = pyqtSignal(int, str)
+    # set_device_num may add rows of widgets, so the updater threads ask for it through a signal
+    device_num_signal = pyqtSignal(int)
 
     def __init__(self, path_dict={}):
         QDialog.__init__(self)
@@ -98,25 +115,59 @@ class ESP32UpdateListForm(QDialog):
         self.total_progress_signal.connect(self.total_progress_value_changed)
         self.total_status_signal.connect(self.total_progress_status_changed)
         self.error_message_signal.connect(self.set_error_message)
+        self.device_num_signal.connect(self.set_device_num)
 
         self.device_num = 0
-        self.device_max_num = 10
 
         if is_raspberrypi():
-            for i in range(0, 10):
-                font = self.ui_progress_value_list[i].font()
-                font.setPointSize(9)
-                self.ui_progress_list[i].setFixedWidth(80)
-                self.ui_progress_value_list[i].setFont(font)
-                self.ui_error_message_list[i].setFont(font)
-                self.ui_network_id_list[i].setFont(font)
+            for i in range(0, len(self.ui_icon_list)):
+                self.__set_small_font(i)
+
+    def __set_small_font(self, index):
+        font = self.ui_progress_value_list[index].font()
+        font.setPointSize(9)
+        self.ui_progress_list[index].setFixedWidth(80)
+        self.ui_progress_value_list[index].setFont(font)
+        self.ui_error_message_list[index].setFont(font)
+        self.ui_network_id_list[index].setFont(font)
+
+    def __add_device_row(self):
+        # The ui file holds the first row of devices, further rows are built the same way below it
+        row_layout = QHBoxLayout()
+        for i in range(0, self.DEVICE_ROW_SIZE):
+            if i:
+                row_layout.addStretch()
+            grid_layout = QGridLayout()
+            icon = create_label("Image")
+            network_id = create_label("Network ID")
+            progress = create_progress_bar()
+            progress_value = create_label("0%")
+            error_message = create_label()
+            grid_layout.addWidget(icon, 0, 0)
+            grid_layout.addWidget(network_id, 1, 0)
+            grid_layout.addWidget(progress, 2, 0)
+            grid_layout.addWidget(progress_value, 2, 1)
+            grid_layout.addWidget(error_message, 3, 0)
+            row_layout.addLayout(grid_layout)
+
+            self.ui_icon_list.append(icon)
+            self.ui_network_id_list.append(network_id)
+            self.ui_progress_list.append(progress)
+            self.ui_progress_value_list.append(progress_value)
+            self.ui_error_message_list.append(error_message)
+            if is_raspberrypi():
+                self.__set_small_font(len(self.ui_icon_list) - 1)
+
+        # keep the total status row at the bottom
+        main_layout = self.ui.layout()
+        main_layout.insertLayout(main_layout.count() - 1, row_layout)
 
     def reset_device_list(self):
         self.device_num = 0
         self.ui.progress_bar_total.setValue(0)
         self.ui.total_status.setText("")
 
-        for i in range(0, 10):
+        for i in range(0, len(self.ui_icon_list)):
             icon_path = os.path.join(self.component_path, "modules", "network_none.png")
             pixmap = QtGui.QPixmap()
             pixmap.load(icon_path)
@@ -128,6 +179,8 @@ class ESP32UpdateListForm(QDialog):
             self.ui_network_id_list[i].setText("not connected")
 
     def set_device_num(self, num):
+        while len(self.ui_icon_list) < num:
+            self.__add_device_row()
         self.reset_device_list()
         self.device_num = num
         for i in range(0, self.device_num):
@@ -194,6 +247,8 @@ class ESP32UpdateListForm(QDialog):
 
 
 class ModuleUpdateListForm(QDialog):
+    DEVICE_ROW_SIZE = 10
+
     network_state_signal = pyqtSignal(int, int)
     network_uuid_signal = pyqtSignal(int, str)
     current_module_changed_signal = pyqtSignal(int, str)
@@ -201,6 +256,8 @@ class ModuleUpdateListForm(QDialog):
     total_progress_signal = pyqtSignal(int)
     total_status_signal = pyqtSignal(str)
     error_message_signal = pyqtSignal(int, str)
+    # set_device_num may add rows of widgets, so the updater threads ask for it through a signal
+    device_num_signal = pyqtSignal(int)
 
     def __init__(self, path_dict={}):
         QDialog.__init__(self)
@@ -322,27 +379,70 @@ class ModuleUpdateListForm(QDialog):
         self.total_progress_signal.connect(self.total_progress_value_changed)
         self.total_status_signal.connect(self.total_progress_status_changed)
         self.error_message_signal.connect(self.set_error_message)
+        self.device_num_signal.connect(self.set_device_num)
 
         self.device_num = 0
-        self.device_max_num = 10
 
         if is_raspberrypi():
-            for i in range(0, 10):
-                font = self.ui_current_progress_list[i].font()
-                font.setPointSize(9)
-                self.ui_current_progress_list[i].setFixedWidth(80)
-                self.ui_total_progress_list[i].setFixedWidth(80)
-                self.ui_current_progress_value_list[i].setFont(font)
-                self.ui_total_progress_value_list[i].setFont(font)
-                self.ui_error_message_list[i].setFont(font)
-                self.ui_network_id_list[i].setFont(font)
+            for i in range(0, len(self.ui_icon_list)):
+                self.__set_small_font(i)
+
+    def __set_small_font(self, index):
+        font = self.ui_current_progress_list[index].font()
+        font.setPointSize(9)
+        self.ui_current_progress_list[index].setFixedWidth(80)
+        self.ui_total_progress_list[index].setFixedWidth(80)
+        self.ui_current_progress_value_list[index].setFont(font)
+        self.ui_total_progress_value_list[index].setFont(font)
+        self.ui_error_message_list[index].setFont(font)
+        self.ui_network_id_list[index].setFont(font)
+
+    def __add_device_row(self):
+        # The ui file holds the first row of devices, further rows are built the same way below it
+        row_layout = QHBoxLayout()
+        for i in range(0, self.DEVICE_ROW_SIZE):
+            if i:
+                row_layout.addStretch()
+            grid_layout = QGridLayout()
+            icon = create_label("Image")
+            network_id = create_label("Network ID")
+            current_icon = create_label("Image")
+            current_progress = create_progress_bar()
+            current_progress_value = create_label("0%")
+            total_progress = create_progress_bar()
+            total_progress_value = create_label("0%")
+            error_message = create_label()
+            grid_layout.addWidget(icon, 0, 1)
+            grid_layout.addWidget(network_id, 1, 1)
+            grid_layout.addWidget(current_icon, 2, 0)
+            grid_layout.addWidget(current_progress, 2, 1)
+            grid_layout.addWidget(current_progress_value, 2, 2)
+            grid_layout.addWidget(total_progress, 3, 1)
+            grid_layout.addWidget(total_progress_value, 3, 2)
+            grid_layout.addWidget(error_message, 4, 1)
+            row_layout.addLayout(grid_layout)
+
+            self.ui_icon_list.append(icon)
+            self.ui_network_id_list.append(network_id)
+            self.ui_current_icon_list.append(current_icon)
+            self.ui_current_progress_list.append(current_progress)
+            self.ui_current_progress_value_list.append(current_progress_value)
+            self.ui_total_progress_list.append(total_progress)
+            self.ui_total_progress_value_list.append(total_progress_value)
+            self.ui_error_message_list.append(error_message)
+            if is_raspberrypi():
+                self.__set_small_font(len(self.ui_icon_list) - 1)
+
+        # keep the total status row at the bottom
+        main_layout = self.ui.layout()
+        main_layout.insertLayout(main_layout.count() - 1, row_layout)
 
     def reset_device_list(self):
         self.device_num = 0
         self.ui.progress_bar_total.setValue(0)
         self.ui.total_status.setText("")
 
-        for i in range(0, 10):
+        for i in range(0, len(self.ui_icon_list)):
             if is_raspberrypi():
                 icon_path = os.path.join(self.component_path, "modules", "network_none_28.png")
             else:
@@ -365,6 +465,8 @@ class ModuleUpdateListForm(QDialog):
             self.ui_network_id_list[i].setText("not connected")
 
     def set_device_num(self, num):
+        while len(self.ui_icon_list) < num:
+            self.__add_device_row()
         self.reset_device_list()
         self.device_num = num
         for i in range(0, self.device_num):
@@ -0,0 +1,75 @@
+import json
+import os
+import threading as th
+
+
+class FlashCheckpoints:
+    """Last crc-verified page of the interrupted firmware updates
+
+    A checkpoint is keyed by the module uuid, the image digest and the flash
+    layout, so it is only used to resume the very image it was saved for.
+    Every planned page up to the checkpoint page has passed its crc check.
+
+    Without checkpoint_path the checkpoints only live as long as the updater,
+    with it each module gets a json file there and a later session resumes too.
+
+    :param checkpoint_path: Directory the checkpoints are kept in, memory only if None
+    """
+
+    def __init__(self, checkpoint_path: str = None):
+        self.checkpoint_path = checkpoint_path
+        self.__checkpoints = dict()
+        self.__lock = th.Lock()
+
+    @staticmethod
+    def __key(plan) -> dict:
+        return {"image": plan.digest, "layout": repr(plan.layout)}
+
+    def __file_path(self, uuid: int) -> str:
+        return os.path.join(self.checkpoint_path, f"{uuid:012X}.json")
+
+    def load(self, uuid: int, plan):
+        """Page to resume the image of plan from
+
+        :param uuid: Uuid of the module
+        :param plan: FirmwarePlan of the image
+        :return: page_begin of the last verified page, None if there is no checkpoint
+        """
+        with self.__lock:
+            checkpoint = self.__checkpoints.get(uuid)
+        if checkpoint is None and self.checkpoint_path:
+            try:
+                with open(self.__file_path(uuid), "r") as checkpoint_file:
+                    checkpoint = json.load(checkpoint_file)
+            except (OSError, ValueError):
+                checkpoint = None
+        if not checkpoint or checkpoint.get("key") != self.__key(plan):
+            return None
+        page_begin = checkpoint.get("page_begin")
+        return page_begin if page_begin in plan.checksums else None
+
+    def save(self, uuid: int, plan, page_begin: int) -> None:
+        checkpoint = {"key": self.__key(plan), "page_begin": page_begin}
+        with self.__lock:
+            self.__checkpoints[uuid] = checkpoint
+        if not self.checkpoint_path:
+            return
+        try:
+            os.makedirs(self.checkpoint_path, exist_ok=True)
+            # written aside then renamed, an interrupted write leaves the previous checkpoint
+            temp_path = self.__file_path(uuid) + ".tmp"
+            with open(temp_path, "w") as checkpoint_file:
+                json.dump(checkpoint, checkpoint_file)
+            os.replace(temp_path, self.__file_path(uuid))
+        except OSError:
+            pass
+
+    def clear(self, uuid: int) -> None:
+        with self.__lock:
+            self.__checkpoints.pop(uuid, None)
+        if not self.checkpoint_path:
+            return
+        try:
+            os.remove(self.__file_path(uuid))
+        except OSError:
+            pass
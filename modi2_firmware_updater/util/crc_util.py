@@ -0,0 +1,88 @@
+import struct
+
+# CRC-32 as computed by the STM32/GD32 hardware CRC unit of the module
+# bootloaders: MSB first, no reflection, no final xor, fed one little-endian
+# 32-bit word at a time.
+CRC32_POLYNOMIAL = 0x04C11DB7
+
+
+def __shift_word(value: int) -> int:
+    for _ in range(32):
+        if value & 0x80000000:
+            value = ((value << 1) ^ CRC32_POLYNOMIAL) & 0xFFFFFFFF
+        else:
+            value = (value << 1) & 0xFFFFFFFF
+    return value
+
+
+# Slice-by-4 tables. Shifting a word through the polynomial is linear over
+# GF(2), so the result for a whole word is the xor of the results for each of
+# its bytes in place.
+__TABLE_0 = tuple(__shift_word(byte) for byte in range(256))
+__TABLE_1 = tuple(__shift_word(byte << 8) for byte in range(256))
+__TABLE_2 = tuple(__shift_word(byte << 16) for byte in range(256))
+__TABLE_3 = tuple(__shift_word(byte << 24) for byte in range(256))
+
+
+def calc_crc32(data: bytes, crc: int = 0) -> int:
+    """Feed up to 4 bytes of data into the checksum
+
+    :param data: Data of up to 4 bytes, read as a little-endian word
+    :param crc: Running checksum
+    :return: Updated checksum
+    """
+    value = (crc ^ int.from_bytes(data, byteorder="little", signed=False)) & 0xFFFFFFFF
+    return (
+        __TABLE_0[value & 0xFF]
+        ^ __TABLE_1[(value >> 8) & 0xFF]
+        ^ __TABLE_2[(value >> 16) & 0xFF]
+        ^ __TABLE_3[value >> 24]
+    )
+
+
+def calc_crc64(data: bytes, crc: int = 0) -> int:
+    """Feed one 8-byte firmware data frame into the checksum
+
+    :param data: Frame payload of up to 8 bytes
+    :param crc: Running checksum
+    :return: Updated checksum
+    """
+    crc = calc_crc32(data[:4], crc)
+    crc = calc_crc32(data[4:], crc)
+    return crc
+
+
+def calc_page_crc(data: bytes, crc: int = 0, page_size: int = None) -> int:
+    """Checksum of a whole page, as sent in the "crc" firmware command
+
+    Equivalent to calling calc_crc64 on every 8-byte frame of the page. A
+    short last frame is zero padded, and when page_size is given the page is
+    zero padded up to that size.
+
+    :param data: Page data
+    :param crc: Initial checksum
+    :param page_size: Size the page is padded to, in bytes
+    :return: Page checksum
+    """
+    table_0, table_1, table_2, table_3 = __TABLE_0, __TABLE_1, __TABLE_2, __TABLE_3
+
+    length = len(data)
+    word_num = length // 4
+    for value in struct.unpack_from(f"<{word_num}I", data):
+        value ^= crc
+        crc = (
+            table_0[value & 0xFF]
+            ^ table_1[(value >> 8) & 0xFF]
+            ^ table_2[(value >> 16) & 0xFF]
+            ^ table_3[value >> 24]
+        )
+
+    if length % 4:
+        crc = calc_crc32(data[word_num * 4:], crc)
+        word_num += 1
+
+    total_word_num = (max(length, page_size or 0) + 7) // 8 * 2
+    for _ in range(word_num, total_word_num):
+        crc = table_0[crc & 0xFF] ^ table_1[(crc >> 8) & 0xFF] ^ table_2[(crc >> 16) & 0xFF] ^ table_3[crc >> 24]
+
+    return crc
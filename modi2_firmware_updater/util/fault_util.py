@@ -0,0 +1,260 @@
+import heapq
+import itertools
+import json
+import random
+import threading as th
+import time
+from base64 import b64decode, b64encode
+
+from modi2_firmware_updater.util.modi_winusb.modi_serialport import ModiSerialPort, pop_frame
+
+# States of the firmware state message (0x0C) a module answers erase and crc commands with
+CRC_ERROR = 4
+CRC_COMPLETE = 5
+ERASE_ERROR = 6
+ERASE_COMPLETE = 7
+
+
+class FaultInjection:
+    """Faults injected in the json frames of a port, drawn from a seeded generator
+
+    Every frame written or received may be dropped, corrupted (one bit flipped)
+    or duplicated. Received frames may also be delayed by delay, or stall the
+    port: nothing more is received for stall_time. Erase and crc responses
+    reporting success are turned into ERASE_ERROR and CRC_ERROR at their own
+    rates. Rates are per frame, from 0 to 1.
+
+    The same seed gives the same faults to the same traffic.
+
+    :param seed: Seed of the draws
+    """
+
+    FAULTS = ("drop", "corrupt", "duplicate", "delay", "stall", "crc_error", "erase_error")
+
+    def __init__(
+        self, drop_rate: float = 0.0, corrupt_rate: float = 0.0, duplicate_rate: float = 0.0,
+        delay_rate: float = 0.0, delay: float = 0.05, stall_rate: float = 0.0, stall_time: float = 0.5,
+        crc_error_rate: float = 0.0, erase_error_rate: float = 0.0, seed=0,
+    ):
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.duplicate_rate = duplicate_rate
+        self.delay_rate = delay_rate
+        self.delay = delay
+        self.stall_rate = stall_rate
+        self.stall_time = stall_time
+        self.crc_error_rate = crc_error_rate
+        self.erase_error_rate = erase_error_rate
+        self.seed = seed
+
+        self.random = random.Random(seed)
+        self.counters = {fault: 0 for fault in self.FAULTS}
+        self.__lock = th.Lock()
+
+    def settings(self) -> dict:
+        return {
+            "drop_rate": self.drop_rate,
+            "corrupt_rate": self.corrupt_rate,
+            "duplicate_rate": self.duplicate_rate,
+            "delay_rate": self.delay_rate,
+            "delay": self.delay,
+            "stall_rate": self.stall_rate,
+            "stall_time": self.stall_time,
+            "crc_error_rate": self.crc_error_rate,
+            "erase_error_rate": self.erase_error_rate,
+            "seed": self.seed,
+        }
+
+    def for_port(self, port: str) -> "FaultInjection":
+        # Same settings and counters, with draws of its own seeded by the port, for one port of a multi updater
+        fault_injection = FaultInjection(**dict(self.settings(), seed=f"{self.seed}:{port}"))
+        fault_injection.counters = self.counters
+        fault_injection.__lock = self.__lock
+        return fault_injection
+
+    def draw(self, fault: str, rate: float) -> bool:
+        """Whether fault hits the current frame, counted if it does"""
+        if rate <= 0:
+            return False
+        with self.__lock:
+            hit = self.random.random() < rate
+            if hit:
+                self.counters[fault] += 1
+        return hit
+
+    def corrupt(self, frame: bytes) -> bytes:
+        # Flip one bit of the frame body, the braces are kept so the frame is still cut out of the stream
+        with self.__lock:
+            index = self.random.randrange(1, len(frame) - 1) if len(frame) > 2 else 0
+            bit = self.random.randrange(8)
+        corrupted = bytearray(frame)
+        corrupted[index] ^= 1 << bit
+        return bytes(corrupted)
+
+    def snapshot(self) -> dict:
+        """Count of each fault injected so far"""
+        with self.__lock:
+            return dict(self.counters)
+
+
+class FaultInjectingPort:
+    """Serial port whose json frames go through a FaultInjection
+
+    Wraps the pyserial (or winusb) port of a ModiSerialPort. Written data
+    holding no complete frame is passed on untouched, and so is anything but
+    read, write and the buffer calls.
+
+    :param serial_port: Port the frames go through
+    :param fault_injection: Faults to inject
+    """
+
+    def __init__(self, serial_port, fault_injection: FaultInjection):
+        self.serial_port = serial_port
+        self.fault_injection = fault_injection
+        # Received bytes not yet cut into frames, frames held back as (release time, order, frame), frames released
+        self.__recv_buffer = bytearray()
+        self.__held_frames = []
+        self.__held_order = itertools.count()
+        self.__ready = bytearray()
+        self.__stalled_until = 0.0
+        self.__read_lock = th.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.serial_port, name)
+
+    @property
+    def port(self):
+        return self.serial_port.port
+
+    @port.setter
+    def port(self, value):
+        self.serial_port.port = value
+
+    @property
+    def baudrate(self):
+        return self.serial_port.baudrate
+
+    @baudrate.setter
+    def baudrate(self, value):
+        self.serial_port.baudrate = value
+
+    @property
+    def timeout(self):
+        return self.serial_port.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.serial_port.timeout = value
+
+    @property
+    def write_timeout(self):
+        return self.serial_port.write_timeout
+
+    @write_timeout.setter
+    def write_timeout(self, value):
+        self.serial_port.write_timeout = value
+
+    def write(self, data):
+        buffer = bytearray(data)
+        frame = pop_frame(buffer, ModiSerialPort.MAX_FRAME_SIZE)
+        if frame is None:
+            return self.serial_port.write(data)
+        faulty_data = bytearray()
+        while frame is not None:
+            for faulty_frame in self.__mangle(frame):
+                faulty_data += faulty_frame
+            frame = pop_frame(buffer, ModiSerialPort.MAX_FRAME_SIZE)
+        if faulty_data:
+            self.serial_port.write(bytes(faulty_data))
+        return len(data)
+
+    def read(self, size=1):
+        with self.__read_lock:
+            self.__receive(block=not self.__ready)
+            if size is None:
+                size = len(self.__ready)
+            data = bytes(self.__ready[:size])
+            del self.__ready[:size]
+            return data
+
+    def read_all(self):
+        with self.__read_lock:
+            self.__receive(block=False)
+            data = bytes(self.__ready)
+            self.__ready.clear()
+            return data
+
+    def inWaiting(self):
+        with self.__read_lock:
+            self.__receive(block=False)
+            return len(self.__ready)
+
+    @property
+    def in_waiting(self):
+        return self.inWaiting()
+
+    def flushInput(self):
+        with self.__read_lock:
+            self.__recv_buffer.clear()
+            self.__held_frames.clear()
+            self.__ready.clear()
+            self.serial_port.flushInput()
+
+    def __mangle(self, frame: bytes) -> list:
+        fault_injection = self.fault_injection
+        if fault_injection.draw("drop", fault_injection.drop_rate):
+            return []
+        if fault_injection.draw("corrupt", fault_injection.corrupt_rate):
+            frame = fault_injection.corrupt(frame)
+        if fault_injection.draw("duplicate", fault_injection.duplicate_rate):
+            return [frame, frame]
+        return [frame]
+
+    def __inject_error_state(self, frame: bytes) -> bytes:
+        fault_injection = self.fault_injection
+        if not (fault_injection.crc_error_rate or fault_injection.erase_error_rate) or b'"c":12,' not in frame:
+            return frame
+        try:
+            message = json.loads(frame)
+            data = bytearray(b64decode(message["b"]))
+            state = data[4]
+        except (ValueError, KeyError, IndexError):
+            return frame
+        if state == CRC_COMPLETE and fault_injection.draw("crc_error", fault_injection.crc_error_rate):
+            state = CRC_ERROR
+        elif state == ERASE_COMPLETE and fault_injection.draw("erase_error", fault_injection.erase_error_rate):
+            state = ERASE_ERROR
+        else:
+            return frame
+        data[4] = state
+        message["b"] = b64encode(bytes(data)).decode("utf8")
+        return json.dumps(message, separators=(",", ":")).encode("utf8")
+
+    def __receive(self, block: bool) -> None:
+        # Block for a byte only when nothing is held back, a held frame is released by the next call anyway
+        waiting = self.serial_port.inWaiting()
+        if waiting or (block and not self.__held_frames):
+            data = self.serial_port.read(waiting or 1)
+            if data:
+                self.__recv_buffer += data
+        elif block:
+            time.sleep(min(self.serial_port.timeout or 0, max(0.0, self.__held_frames[0][0] - time.perf_counter())))
+
+        fault_injection = self.fault_injection
+        now = time.perf_counter()
+        frame = pop_frame(self.__recv_buffer, ModiSerialPort.MAX_FRAME_SIZE)
+        while frame is not None:
+            frame = self.__inject_error_state(frame)
+            release_time = now
+            if fault_injection.draw("delay", fault_injection.delay_rate):
+                release_time += fault_injection.delay
+            if fault_injection.draw("stall", fault_injection.stall_rate):
+                self.__stalled_until = max(self.__stalled_until, now + fault_injection.stall_time)
+            # Nothing received during a stall comes through before it ends
+            release_time = max(release_time, self.__stalled_until)
+            for faulty_frame in self.__mangle(frame):
+                heapq.heappush(self.__held_frames, (release_time, next(self.__held_order), faulty_frame))
+            frame = pop_frame(self.__recv_buffer, ModiSerialPort.MAX_FRAME_SIZE)
+
+        while self.__held_frames and self.__held_frames[0][0] <= now:
+            self.__ready += heapq.heappop(self.__held_frames)[2]
@@ -0,0 +1,267 @@
+import hashlib
+import threading as th
+from base64 import b64encode
+from collections import OrderedDict
+from dataclasses import dataclass
+from os import path
+
+from modi2_firmware_updater.util.crc_util import calc_page_crc
+
+FLASH_MEMORY_ADDRESS = 0x08000000
+
+# Modules built on the e103 MCU, every other module uses the e230
+E103_MODULE_TYPES = ("speaker", "display", "env", "network", "camera")
+
+# Images kept by each cache below, enough for every module type of one run
+FIRMWARE_CACHE_SIZE = 16
+
+
+@dataclass(frozen=True)
+class FlashLayout:
+    """Where a firmware image is written in the flash of a module
+
+    :param page_size: Flash page size
+    :param bin_begin: Offset of the first page of the image to write
+    :param page_offset: Flash offset of the image, from FLASH_MEMORY_ADDRESS
+    :param erase_page_num: Pages erased by one erase command
+    :param end_flash_address: Address of the end-flash (version info) page
+    :param skip_addresses: Page addresses that are never written
+    :param boot_address: Entry address written in the end-flash data
+    """
+
+    page_size: int
+    bin_begin: int
+    page_offset: int
+    erase_page_num: int
+    end_flash_address: int
+    skip_addresses: tuple
+    boot_address: int
+
+    def bin_end(self, bin_size: int) -> int:
+        # End of the page holding the last byte of the image
+        return bin_size + (-(bin_size - self.bin_begin) % self.page_size)
+
+    def page_address(self, page_begin: int) -> int:
+        return FLASH_MEMORY_ADDRESS + self.page_offset + page_begin
+
+
+__FLASH_LAYOUTS = {
+    ("e230", "app"): FlashLayout(0x400, 0x400, 0x4C00, 1, 0x0800F800, (0x0800F800, ), 0x08005000),
+    ("e230", "bootloader"): FlashLayout(0x400, 0x0, 0x1000, 1, 0x0800F800, (0x0800F800, 0x08004C00), 0x08001000),
+    ("e230", "second_bootloader"): FlashLayout(0x400, 0x400, 0x4C00, 1, 0x0800F800, (0x0800F800, 0x08004800), 0x08005000),
+    ("e103", "app"): FlashLayout(0x800, 0x800, 0x8800, 2, 0x0801F800, (0x0801F800, ), 0x08009000),
+    ("e103", "bootloader"): FlashLayout(0x800, 0x0, 0x1000, 2, 0x0801F800, (0x0801F800, 0x08008800), 0x08001000),
+    ("e103", "second_bootloader"): FlashLayout(0x800, 0x800, 0x8800, 2, 0x0801F800, (0x0801F800, 0x08008800), 0x08009000),
+}
+
+
+# Time a module may take to erase one erase unit (erase_page_num counts these units),
+# added to the response timeout of multi-page erase commands
+ERASE_UNIT_TIME = 0.04
+
+
+def get_module_mcu(module_type: str) -> str:
+    return "e103" if module_type in E103_MODULE_TYPES else "e230"
+
+
+def get_flash_layout(module_type: str, section: str) -> FlashLayout:
+    """Flash layout of a firmware section of a module
+
+    :param module_type: Type of the module, e.g. "button"
+    :param section: "app", "bootloader" or "second_bootloader"
+    :return: FlashLayout of the section
+    """
+    return __FLASH_LAYOUTS[(get_module_mcu(module_type), section)]
+
+
+def get_firmware_bin_path(module_firmware_path: str, module_type: str, section: str, version: str) -> str:
+    """Path of the binary of a firmware section in the firmware directory
+
+    :param module_firmware_path: Root of the downloaded firmwares
+    :param module_type: Type of the module
+    :param section: "app", "bootloader" or "second_bootloader"
+    :param version: Version directory of the firmware
+    :return: Path of the binary
+    """
+    if section == "app":
+        return path.join(module_firmware_path, module_type, version, f"{module_type.lower()}.bin")
+    mcu = get_module_mcu(module_type)
+    return path.join(module_firmware_path, "bootloader", mcu, version, f"{section}_{mcu}.bin")
+
+
+def get_version_value(version_info: str) -> int:
+    """Version as packed in MODI+ messages, 3 bits major, 5 bits minor and 8 bits patch
+
+    :param version_info: Version string such as "v1.2.3" or "v1.2.3-beta"
+    :return: Packed version
+    """
+    version_digits = [int(digit) for digit in version_info.lstrip("v").split("-")[0].split(".")]
+    return version_digits[0] << 13 | version_digits[1] << 8 | version_digits[2]
+
+
+def get_end_flash_data(layout: FlashLayout, verify_header: int, os_version: int = 0, app_version: int = 0) -> bytearray:
+    """End-flash data written once a firmware section has been flashed
+
+    :param layout: FlashLayout of the flashed section
+    :param verify_header: 0xAA if the section was written successfully, 0xFF otherwise
+    :param os_version: Packed os version
+    :param app_version: Packed app version
+    :return: 16 bytes of end-flash data
+    """
+    end_flash_data = bytearray(16)
+    end_flash_data[0] = verify_header
+    end_flash_data[6:8] = os_version.to_bytes(2, "little")
+    end_flash_data[8:10] = app_version.to_bytes(2, "little")
+    end_flash_data[12:16] = layout.boot_address.to_bytes(4, "little")
+    return end_flash_data
+
+
+class FirmwareFrames:
+    """Firmware data frames (0x0B) of a binary image, encoded once per page
+
+    A data frame only depends on the page content and its sequence number,
+    so the json of every frame is rendered ahead of time around a hole for
+    the destination module id.
+
+    :param bin_buffer: Content of the firmware binary
+    :param page_size: Flash page size of the target module
+    :param fixed_length: Always report a length of 8 bytes, even for a short
+        last frame, as ModuleFirmwareUpdater does
+    """
+
+    def __init__(self, bin_buffer: bytes, page_size: int, fixed_length: bool = True):
+        self.page_size = page_size
+        self.__frames = dict()
+
+        for page_begin in range(0, len(bin_buffer), page_size):
+            page = bin_buffer[page_begin:page_begin + page_size]
+            heads = []
+            tails = []
+            for curr_ptr in range(0, page_size, 8):
+                curr_data = page[curr_ptr:curr_ptr + 8]
+                length = 8 if fixed_length else len(curr_data)
+                heads.append(b'{"c":11,"s":%d,"d":' % (curr_ptr // 8))
+                tails.append(b',"b":"%s","l":%d}' % (b64encode(curr_data), length))
+            self.__frames[page_begin] = tuple(zip(heads, tails))
+
+    def page_frames(self, page_begin: int, module_id: int) -> list:
+        """Data frames of the page at page_begin addressed to module_id
+
+        :param page_begin: Offset of the page in the binary
+        :param module_id: Destination module id
+        :return: One encoded json frame per 8 bytes of the page
+        """
+        module_id_bytes = b"%d" % module_id
+        return [head + module_id_bytes + tail for head, tail in self.__frames[page_begin]]
+
+
+def __get_cached(cache: OrderedDict, key, build):
+    # Least recently used entries are dropped past FIRMWARE_CACHE_SIZE
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache[key] = value
+        if len(cache) > FIRMWARE_CACHE_SIZE:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return value
+
+
+__firmware_frames_cache = OrderedDict()
+__firmware_frames_lock = th.Lock()
+
+
+def get_firmware_frames(bin_buffer: bytes, page_size: int, fixed_length: bool = True) -> FirmwareFrames:
+    """Compiled frames of an image, shared by every updater flashing it
+
+    :param bin_buffer: Content of the firmware binary
+    :param page_size: Flash page size of the target module
+    :param fixed_length: See FirmwareFrames
+    :return: FirmwareFrames of the image
+    """
+    key = (bin_buffer, page_size, fixed_length)
+    with __firmware_frames_lock:
+        return __get_cached(__firmware_frames_cache, key, lambda: FirmwareFrames(bin_buffer, page_size, fixed_length))
+
+
+class FirmwarePlan:
+    """Pages of a firmware image as written with a flash layout
+
+    Computed once per image and layout, so that flash loops only walk over
+    precomputed offsets and checksums.
+
+    :param bin_buffer: Content of the firmware binary
+    :param layout: FlashLayout the image is written with
+    """
+
+    def __init__(self, bin_buffer: bytes, layout: FlashLayout):
+        page_size = layout.page_size
+        self.layout = layout
+        self.page_size = page_size
+        self.bin_begin = layout.bin_begin
+        self.bin_end = layout.bin_end(len(bin_buffer))
+        # A short last page is zero padded, as its checksum is computed
+        self.image = bytes(bin_buffer) + bytes(self.bin_end - len(bin_buffer))
+        self.digest = hashlib.sha256(self.image).hexdigest()
+
+        image = memoryview(self.image)
+        # empty_mask[i] tells if the i-th page from bin_begin is blank (all 0x00 or all 0xFF)
+        self.empty_mask = tuple(
+            self.image.count(0, page_begin, page_begin + page_size) == page_size
+            or self.image.count(0xFF, page_begin, page_begin + page_size) == page_size
+            for page_begin in range(self.bin_begin, self.bin_end, page_size)
+        )
+        # Offsets of the pages that get written, blank pages and skip_addresses left out
+        self.page_begins = tuple(
+            page_begin
+            for page_begin, is_empty in zip(range(self.bin_begin, self.bin_end, page_size), self.empty_mask)
+            if not is_empty and layout.page_address(page_begin) not in layout.skip_addresses
+        )
+        self.checksums = {
+            page_begin: calc_page_crc(image[page_begin:page_begin + page_size], page_size=page_size)
+            for page_begin in self.page_begins
+        }
+
+    def page_address(self, page_begin: int) -> int:
+        return self.layout.page_address(page_begin)
+
+    def erase_runs(self, max_run_pages: int, skip_pages=()) -> list:
+        """Contiguous runs of written pages, each erased by a single erase command
+
+        :param max_run_pages: Longest run, in pages of page_size
+        :param skip_pages: Offsets of further pages to leave out
+        :return: List of (page_begin, page_num) of each run
+        """
+        runs = []
+        run_begin = None
+        run_pages = 0
+        for page_begin in self.page_begins:
+            if page_begin in skip_pages:
+                continue
+            contiguous = run_begin is not None and page_begin == run_begin + run_pages * self.page_size
+            if not contiguous or run_pages == max_run_pages:
+                if run_begin is not None:
+                    runs.append((run_begin, run_pages))
+                run_begin = page_begin
+                run_pages = 0
+            run_pages += 1
+        if run_begin is not None:
+            runs.append((run_begin, run_pages))
+        return runs
+
+
+__firmware_plan_cache = OrderedDict()
+__firmware_plan_lock = th.Lock()
+
+
+def get_firmware_plan(bin_buffer: bytes, layout: FlashLayout) -> FirmwarePlan:
+    """Page plan of an image, shared by every updater flashing it with this layout
+
+    :param bin_buffer: Content of the firmware binary
+    :param layout: FlashLayout the image is written with
+    :return: FirmwarePlan of the image
+    """
+    key = (bin_buffer, layout)
+    with __firmware_plan_lock:
+        return __get_cached(__firmware_plan_cache, key, lambda: FirmwarePlan(bin_buffer, layout))
@@ -0,0 +1,201 @@
+import json
+import os
+import threading as th
+import time
+from contextlib import contextmanager
+
+
+class UpdateMetrics:
+    """Phase durations, bytes sent, retries and response latencies of the update of one port
+
+    Durations are summed per module and phase: discovery, bootloader_entry, erase,
+    data, crc, end_flash, reboot, esp32_write and esp32_verify. Phases of the whole
+    port (discovery, bootloader entry, module reboot) have no module. The end_flash phase covers the erase and
+    crc commands of the end-flash page, which are counted under erase and crc too.
+
+    :param updater: "module", "network" or "esp32"
+    :param port: Serial port of the update
+    """
+
+    # Upper bounds of the response latency histogram buckets, in seconds
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, updater: str, port: str = None):
+        self.updater = updater
+        self.port = port
+        self.durations = dict()
+        self.bytes_sent = dict()
+        self.latencies = dict()
+        self.retries = dict()
+        self.done = th.Event()
+        self.__lock = th.Lock()
+
+    @contextmanager
+    def phase(self, phase: str, module_type: str = "", module_uuid: int = None):
+        phase_begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_duration(phase, time.perf_counter() - phase_begin, module_type, module_uuid)
+
+    def add_duration(self, phase: str, seconds: float, module_type: str = "", module_uuid: int = None) -> None:
+        key = (module_type, module_uuid, phase)
+        with self.__lock:
+            self.durations[key] = self.durations.get(key, 0.0) + seconds
+
+    def add_bytes(self, byte_num: int, module_type: str = "", module_uuid: int = None) -> None:
+        key = (module_type, module_uuid)
+        with self.__lock:
+            self.bytes_sent[key] = self.bytes_sent.get(key, 0) + byte_num
+
+    def observe_latency(self, operation: str, seconds: float) -> None:
+        with self.__lock:
+            histogram = self.latencies.get(operation)
+            if histogram is None:
+                histogram = self.latencies[operation] = {"buckets": [0] * len(self.LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+            for bucket_index, upper_bound in enumerate(self.LATENCY_BUCKETS):
+                if seconds <= upper_bound:
+                    histogram["buckets"][bucket_index] += 1
+                    break
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def set_retries(self, retry_counters: dict) -> None:
+        # RetryPolicy.snapshot() of the updater
+        with self.__lock:
+            self.retries = retry_counters
+
+    def finish(self) -> None:
+        # Set by the updater once its last phase is over
+        self.done.set()
+
+    def to_record(self) -> dict:
+        """Json compatible record of the metrics, one line of the json-lines output"""
+
+        def module_fields(module_type, module_uuid):
+            return {"module_type": module_type, "module_uuid": "" if module_uuid is None else f"0x{module_uuid:X}"}
+
+        with self.__lock:
+            return {
+                "updater": self.updater,
+                "port": self.port,
+                "phases": [
+                    dict(module_fields(module_type, module_uuid), phase=phase, seconds=round(seconds, 6))
+                    for (module_type, module_uuid, phase), seconds in self.durations.items()
+                ],
+                "bytes_sent": [
+                    dict(module_fields(module_type, module_uuid), bytes=byte_num)
+                    for (module_type, module_uuid), byte_num in self.bytes_sent.items()
+                ],
+                "latency": {
+                    operation: {
+                        "buckets": dict(zip(map(str, self.LATENCY_BUCKETS), histogram["buckets"])),
+                        "sum": round(histogram["sum"], 6),
+                        "count": histogram["count"],
+                    }
+                    for operation, histogram in self.latencies.items()
+                },
+                "retries": {operation: dict(counters) for operation, counters in self.retries.items()},
+            }
+
+
+def collect_records(port_metrics: list, timeout: float = 10) -> list:
+    """Records of the metrics of each port, once its updater is done
+
+    :param port_metrics: UpdateMetrics of each port, None for a port never opened
+    :param timeout: Time all the updaters are given to finish, together
+    :return: to_record() of each port in order, None where port_metrics is None
+    """
+    deadline = time.perf_counter() + timeout
+    records = []
+    for metrics in port_metrics:
+        if metrics is None:
+            records.append(None)
+            continue
+        metrics.done.wait(max(0, deadline - time.perf_counter()))
+        records.append(metrics.to_record())
+    return records
+
+
+def __prometheus_labels(**labels) -> str:
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def format_prometheus(records: list) -> str:
+    """Prometheus text exposition of metrics records
+
+    :param records: UpdateMetrics.to_record() of each port
+    :return: Content of a Prometheus text file
+    """
+    lines = [
+        "# HELP modi_update_phase_seconds_total Time spent in each update phase.",
+        "# TYPE modi_update_phase_seconds_total counter",
+    ]
+    for record in records:
+        for phase in record["phases"]:
+            labels = __prometheus_labels(
+                updater=record["updater"], port=record["port"], module_type=phase["module_type"], module_uuid=phase["module_uuid"], phase=phase["phase"]
+            )
+            lines.append(f"modi_update_phase_seconds_total{labels} {phase['seconds']}")
+
+    lines += [
+        "# HELP modi_update_bytes_sent_total Bytes sent to flash each module.",
+        "# TYPE modi_update_bytes_sent_total counter",
+    ]
+    for record in records:
+        for bytes_sent in record["bytes_sent"]:
+            labels = __prometheus_labels(
+                updater=record["updater"], port=record["port"], module_type=bytes_sent["module_type"], module_uuid=bytes_sent["module_uuid"]
+            )
+            lines.append(f"modi_update_bytes_sent_total{labels} {bytes_sent['bytes']}")
+
+    lines += [
+        "# HELP modi_update_retries_total Retry outcomes of each operation.",
+        "# TYPE modi_update_retries_total counter",
+    ]
+    for record in records:
+        for operation, counters in record["retries"].items():
+            for outcome, count in counters.items():
+                labels = __prometheus_labels(updater=record["updater"], port=record["port"], operation=operation, outcome=outcome)
+                lines.append(f"modi_update_retries_total{labels} {count}")
+
+    lines += [
+        "# HELP modi_update_response_latency_seconds Response time of the module commands.",
+        "# TYPE modi_update_response_latency_seconds histogram",
+    ]
+    for record in records:
+        for operation, histogram in record["latency"].items():
+            cumulative_count = 0
+            for upper_bound, count in histogram["buckets"].items():
+                cumulative_count += count
+                labels = __prometheus_labels(updater=record["updater"], port=record["port"], operation=operation, le=upper_bound)
+                lines.append(f"modi_update_response_latency_seconds_bucket{labels} {cumulative_count}")
+            labels = __prometheus_labels(updater=record["updater"], port=record["port"], operation=operation, le="+Inf")
+            lines.append(f"modi_update_response_latency_seconds_bucket{labels} {histogram['count']}")
+            labels = __prometheus_labels(updater=record["updater"], port=record["port"], operation=operation)
+            lines.append(f"modi_update_response_latency_seconds_sum{labels} {histogram['sum']}")
+            lines.append(f"modi_update_response_latency_seconds_count{labels} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(records: list, json_lines_path: str = None, prometheus_path: str = None) -> None:
+    """Append the records of a run to a json-lines file and replace a Prometheus text file with them
+
+    :param records: UpdateMetrics.to_record() of each port
+    :param json_lines_path: File every record is appended to as one json line, skipped if None
+    :param prometheus_path: Prometheus text file of the run, skipped if None
+    """
+    run = time.strftime("%Y-%m-%dT%H:%M:%S")
+    if json_lines_path:
+        with open(json_lines_path, "a") as json_lines_file:
+            for record in records:
+                json_lines_file.write(json.dumps(dict(record, run=run), separators=(",", ":")) + "\n")
+    if prometheus_path:
+        # written aside then renamed, so a scraper never reads half a file
+        temp_path = prometheus_path + ".tmp"
+        with open(temp_path, "w") as prometheus_file:
+            prometheus_file.write(format_prometheus(records))
+        os.replace(temp_path, prometheus_path)
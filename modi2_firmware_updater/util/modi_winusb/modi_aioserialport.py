@@ -0,0 +1,181 @@
+import asyncio
+import os
+import sys
+from collections import deque
+
+import serial
+
+from modi2_firmware_updater.util.modi_winusb.modi_serialport import ModiSerialPort, pop_frame
+
+
+class AsyncModiSerialPort():
+    """asyncio counterpart of ModiSerialPort for POSIX serial devices
+
+    pyserial only configures the tty. Its file descriptor is then switched to
+    non-blocking mode and served by the reader and writer callbacks of the
+    running event loop, so a port needs no thread of its own.
+    """
+
+    MAX_FRAME_SIZE = ModiSerialPort.MAX_FRAME_SIZE
+
+    def __init__(self, port=None, baudrate=921600):
+        self._port = port
+        self._baudrate = baudrate
+
+        self.serial_port = None
+        self.is_open = False
+        self.frame_callback = None
+
+        self._loop = None
+        self._fd = None
+        self._recv_buffer = bytearray()
+        self._send_buffer = bytearray()
+        self._frames = deque()
+        self._frame_waiter = None
+        self._drain_waiter = None
+
+    def open(self, port=None):
+        """Open the port, must be called from a running event loop"""
+        if sys.platform.startswith("win"):
+            raise NotImplementedError("AsyncModiSerialPort needs a POSIX serial device")
+
+        if port is not None:
+            self._port = port
+        self._loop = asyncio.get_running_loop()
+        self.serial_port = serial.Serial(port=self._port, baudrate=self._baudrate, timeout=0, write_timeout=0, exclusive=True)
+        self._fd = self.serial_port.fileno()
+        os.set_blocking(self._fd, False)
+
+        self._recv_buffer = bytearray()
+        self._send_buffer = bytearray()
+        self._frames.clear()
+        self._loop.add_reader(self._fd, self.__on_readable)
+        self.is_open = True
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.is_open = False
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        self.serial_port.close()
+        for waiter in (self._frame_waiter, self._drain_waiter):
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    def set_frame_callback(self, frame_callback):
+        # Hand every received frame to frame_callback instead of queueing it for read_frame
+        self.frame_callback = frame_callback
+
+    def write(self, data):
+        """Queue data for sending, written straight away when the device accepts it"""
+        if not self.is_open:
+            raise Exception("serialport is not opened")
+        if type(data) is str:
+            data = data.encode("utf8")
+
+        if not self._send_buffer:
+            try:
+                written = os.write(self._fd, data)
+            except BlockingIOError:
+                written = 0
+            data = data[written:]
+            if not data:
+                return
+            self._loop.add_writer(self._fd, self.__on_writable)
+        self._send_buffer += data
+
+    async def drain(self):
+        """Wait until every queued byte has been handed to the device"""
+        if not self._send_buffer or not self.is_open:
+            return
+        if self._drain_waiter is None or self._drain_waiter.done():
+            self._drain_waiter = self._loop.create_future()
+        await self._drain_waiter
+
+    async def write_paced(self, frames, pacing, chunk_frame_num=None):
+        """Write frames in bulk chunks spaced by a pacing budget, as ModiSerialPort.write_paced
+
+        :param frames: Encoded frames to send
+        :param pacing: PacingBudget giving the time each chunk may take
+        :param chunk_frame_num: Frames per write, all of them if None
+        """
+        chunk_frame_num = chunk_frame_num or len(frames)
+        deadline = self._loop.time()
+        for chunk_begin in range(0, len(frames), chunk_frame_num):
+            chunk_frames = frames[chunk_begin:chunk_begin + chunk_frame_num]
+            chunk = b"".join(chunk_frames)
+            deadline += pacing.chunk_budget(len(chunk), len(chunk_frames))
+            self.write(chunk)
+            await self.drain()
+            delay = deadline - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def read_frame(self, timeout=None):
+        """Read one complete json frame
+
+        :param timeout: Seconds to wait for a frame, forever if None
+        :return: Frame bytes, or None if no frame arrived in time
+        """
+        if not self.is_open:
+            raise Exception("serialport is not opened")
+        if not self._frames:
+            self._frame_waiter = self._loop.create_future()
+            try:
+                await asyncio.wait_for(self._frame_waiter, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self._frame_waiter = None
+        return self._frames.popleft() if self._frames else None
+
+    def __on_readable(self):
+        try:
+            data = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            # the device is gone
+            self.close()
+            return
+        if not data:
+            # end of file, the device is gone as well
+            self.close()
+            return
+
+        self._recv_buffer += data
+        frame = pop_frame(self._recv_buffer, self.MAX_FRAME_SIZE)
+        while frame is not None:
+            if self.frame_callback:
+                self.frame_callback(frame)
+            else:
+                self._frames.append(frame)
+            frame = pop_frame(self._recv_buffer, self.MAX_FRAME_SIZE)
+
+        if self._frames and self._frame_waiter is not None and not self._frame_waiter.done():
+            self._frame_waiter.set_result(None)
+
+    def __on_writable(self):
+        try:
+            written = os.write(self._fd, self._send_buffer)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.close()
+            return
+        del self._send_buffer[:written]
+        if self._send_buffer:
+            return
+
+        self._loop.remove_writer(self._fd)
+        if self._drain_waiter is not None and not self._drain_waiter.done():
+            self._drain_waiter.set_result(None)
+
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def baudrate(self):
+        return self._baudrate
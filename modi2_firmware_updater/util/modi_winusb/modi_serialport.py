@@ -1,9 +1,12 @@
+import errno
 import sys
 import time
 
 import serial
 import serial.tools.list_ports as stl
 
+from modi2_firmware_updater.util.platform_util import sleep_until
+
 
 def list_modi_serialports():
     info_list = []
@@ -23,10 +26,40 @@ def list_modi_serialports():
     return info_list
 
 
+def pop_frame(buffer: bytearray, max_frame_size: int):
+    """Remove the first complete json frame, from '{' to '}', from a receive buffer
+
+    Bytes before the frame are dropped, and so is an unterminated frame once it
+    grows past max_frame_size.
+
+    :param buffer: Received bytes, consumed in place
+    :param max_frame_size: Longest expected frame
+    :return: Frame bytes, or None if the buffer holds no complete frame
+    """
+    begin = buffer.find(b"{")
+    if begin < 0:
+        buffer.clear()
+        return None
+    end = buffer.find(b"}", begin)
+    if end < 0:
+        if len(buffer) - begin > max_frame_size:
+            begin += 1
+        del buffer[:begin]
+        return None
+    # A frame cut short by noise is superseded by the next opening brace
+    begin = buffer.rfind(b"{", begin, end)
+    frame = bytes(buffer[begin:end + 1])
+    del buffer[:end + 1]
+    return frame
+
+
 class ModiSerialPort():
     SERIAL_MODE_COMPORT = 1
     SERIAL_MODI_WINUSB = 2
 
+    # A MODI+ json frame is about 50 bytes, anything longer without a closing brace is noise
+    MAX_FRAME_SIZE = 4096
+
     def __init__(self, port=None, baudrate=921600, timeout=0.2, write_timeout=None):
         self.type = self.SERIAL_MODE_COMPORT
         self._port = port
@@ -36,6 +69,7 @@ class ModiSerialPort():
 
         self.serial_port = None
         self._is_open = False
+        self._recv_buffer = bytearray()
 
         if self._port is not None:
             self.open(self._port)
@@ -56,6 +90,7 @@ class ModiSerialPort():
             ser = serial.Serial(port=self._port, baudrate=self._baudrate, timeout=self._timeout, write_timeout=self._write_timeout, exclusive=True)
             self.serial_port = ser
 
+        self._recv_buffer = bytearray()
         self.is_open = True
 
     def close(self):
@@ -69,9 +104,33 @@ class ModiSerialPort():
             data = data.encode("utf8")
         self.serial_port.write(data)
 
+    def write_paced(self, frames, pacing, chunk_frame_num=None):
+        """Write frames in a few bulk writes, spaced by a pacing budget
+
+        :param frames: Encoded frames to send
+        :param pacing: PacingBudget giving the time each chunk may take
+        :param chunk_frame_num: Frames per write, all of them if None
+        """
+        chunk_frame_num = chunk_frame_num or len(frames)
+        deadline = time.perf_counter()
+        for chunk_begin in range(0, len(frames), chunk_frame_num):
+            chunk_frames = frames[chunk_begin:chunk_begin + chunk_frame_num]
+            chunk = b"".join(chunk_frames)
+            # Time spent inside write counts against the budget
+            deadline += pacing.chunk_budget(len(chunk), len(chunk_frames))
+            self.write(chunk)
+            sleep_until(deadline)
+
     def read(self, size=1):
         if not self.is_open:
             raise Exception("serialport is not opened")
+        if self._recv_buffer:
+            # Serve bytes already drained by read_frame or read_until first
+            if size is None:
+                size = len(self._recv_buffer)
+            data = bytes(self._recv_buffer[:size])
+            del self._recv_buffer[:size]
+            return data
         if size is None and self.type == self.SERIAL_MODE_COMPORT:
             size = 1
         return self.serial_port.read(size)
@@ -81,26 +140,71 @@ class ModiSerialPort():
             raise Exception("serialport is not opened")
 
         lenterm = len(expected)
-        line = bytearray()
         modi_timeout = self.Timeout(self._timeout)
         while True:
-            c = self.read(1)
-            if c:
-                line += c
-                if line[-lenterm:] == expected:
-                    break
-                if size is not None and len(line) >= size:
-                    break
-            else:
+            index = self._recv_buffer.find(expected)
+            if index >= 0:
+                end = index + lenterm
+                break
+            if size is not None and len(self._recv_buffer) >= size:
+                end = size
                 break
-            if modi_timeout.expired():
+            if not self.__fill_buffer() or modi_timeout.expired():
+                end = len(self._recv_buffer)
                 break
-        return bytes(line)
+        if size is not None:
+            end = min(end, size)
+        line = bytes(self._recv_buffer[:end])
+        del self._recv_buffer[:end]
+        return line
+
+    def read_frame(self, timeout=None):
+        """Read one complete json frame, from '{' to '}'
+
+        :param timeout: Seconds to wait for a frame, the port timeout if None
+        :return: Frame bytes, or None if no frame arrived in time
+        """
+        if not self.is_open:
+            raise Exception("serialport is not opened")
+
+        end_time = time.monotonic() + (self._timeout if timeout is None else timeout)
+        frame = pop_frame(self._recv_buffer, self.MAX_FRAME_SIZE)
+        while frame is None:
+            self.__fill_buffer()
+            frame = pop_frame(self._recv_buffer, self.MAX_FRAME_SIZE)
+            if frame is None and time.monotonic() >= end_time:
+                break
+        return frame
+
+    def frames(self, timeout=None):
+        """Iterate over received json frames until no frame arrives within timeout"""
+        frame = self.read_frame(timeout)
+        while frame is not None:
+            yield frame
+            frame = self.read_frame(timeout)
+
+    def __fill_buffer(self):
+        # Block for the first byte only, then drain whatever else has arrived
+        if self.type == self.SERIAL_MODE_COMPORT:
+            waiting = self.serial_port.inWaiting()
+            data = self.serial_port.read(waiting or 1)
+            if data and not waiting:
+                waiting = self.serial_port.inWaiting()
+                if waiting:
+                    data += self.serial_port.read(waiting)
+        else:
+            data = self.serial_port.read(1)
+        if not data:
+            return 0
+        self._recv_buffer += data
+        return len(data)
 
     def read_all(self):
         if not self.is_open:
             raise Exception("serialport is not opened")
-        return self.serial_port.read_all()
+        data = bytes(self._recv_buffer)
+        self._recv_buffer.clear()
+        return data + self.serial_port.read_all()
 
     def flush(self):
         if not self.is_open:
@@ -110,6 +214,7 @@ class ModiSerialPort():
     def flushInput(self):
         if not self.is_open:
             raise Exception("serialport is not opened")
+        self._recv_buffer.clear()
         self.serial_port.flushInput()
 
     def flushOutput(self):
@@ -120,12 +225,21 @@ class ModiSerialPort():
     def setDTR(self, state):
         if not self.is_open:
             raise Exception("serialport is not opened")
-        self.serial_port.setDTR(state)
+        self.__set_modem_line(self.serial_port.setDTR, state)
 
     def setRTS(self, state):
         if not self.is_open:
             raise Exception("serialport is not opened")
-        self.serial_port.setRTS(state)
+        self.__set_modem_line(self.serial_port.setRTS, state)
+
+    @staticmethod
+    def __set_modem_line(set_line, state):
+        # Ports without modem lines (pseudo-terminals) refuse the ioctl, as pyserial tolerates when opening them
+        try:
+            set_line(state)
+        except OSError as e:
+            if e.errno not in (errno.ENOTTY, errno.EINVAL):
+                raise
 
     def inWaiting(self):
         if not self.is_open:
@@ -133,7 +247,7 @@ class ModiSerialPort():
 
         waiting = None
         if self.type == self.SERIAL_MODE_COMPORT:
-            waiting = self.serial_port.inWaiting()
+            waiting = self.serial_port.inWaiting() + len(self._recv_buffer)
         return waiting
 
     @property
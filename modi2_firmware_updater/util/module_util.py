@@ -1,3 +1,4 @@
+import threading as th
 import time
 from os import path
 from typing import Union
@@ -223,3 +224,95 @@ class Module:
             (property_type, None, self.prop_samp_freq, None),
         )
         self._conn.send(req_prop_msg)
+
+
+class ModuleRecord:
+    """Module found on a network during a firmware update
+
+    :param int module_id: The id of the module.
+    :param int module_uuid: The uuid of the module.
+    :param str module_type: The type of the module.
+    """
+
+    __slots__ = ("id", "uuid", "type", "version", "state", "level", "retry", "state_times", "state_changed")
+
+    def __init__(self, module_id: int = None, module_uuid: int = None, module_type: str = None):
+        self.id = module_id
+        self.uuid = module_uuid
+        self.type = module_type
+        # packed application version the module reported, None if it only showed up in its bootloader
+        self.version = None
+        self.state = None
+        self.level = None
+        self.retry = 0
+        # last time (perf_counter) each state has been entered
+        self.state_times = dict()
+        self.state_changed = th.Condition()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(id={self.id}, uuid=0x{self.uuid or 0:X}, type={self.type}, state={self.state}, level={self.level})"
+
+    def set_state(self, state: int) -> None:
+        with self.state_changed:
+            self.state = state
+            self.state_times[state] = time.perf_counter()
+            self.state_changed.notify_all()
+
+    def wait_for_state(self, states: tuple, timeout: float):
+        # Returns the matched state, or None when the timeout expires first
+        with self.state_changed:
+            self.state_changed.wait_for(lambda: self.state in states, timeout)
+            return self.state if self.state in states else None
+
+    def state_time(self, state: int):
+        # Time (perf_counter) the module last entered the state, None if it never did
+        return self.state_times.get(state)
+
+
+class ModuleRegistry:
+    """Modules of a network indexed by id and by uuid
+
+    Frames are handled by the receive thread while the update runs in another
+    one, so every access is locked and iteration goes over a snapshot.
+    """
+
+    def __init__(self):
+        self.__lock = th.Lock()
+        self.__modules_by_id = dict()
+        self.__modules_by_uuid = dict()
+
+    def __len__(self):
+        return len(self.__modules_by_uuid)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def add(self, module_id: int, module_uuid: int, module_type: str):
+        """Register a module unless its uuid is already known
+
+        :return: The new ModuleRecord, or None if the module was registered before
+        """
+        with self.__lock:
+            if module_uuid in self.__modules_by_uuid:
+                return None
+            module_info = ModuleRecord(module_id, module_uuid, module_type)
+            self.__modules_by_uuid[module_uuid] = module_info
+            # the first module keeps an id shared by two uuids, as the list lookup did
+            self.__modules_by_id.setdefault(module_id, module_info)
+            return module_info
+
+    def get_by_id(self, module_id: int):
+        return self.__modules_by_id.get(module_id)
+
+    def get_by_uuid(self, module_uuid: int):
+        return self.__modules_by_uuid.get(module_uuid)
+
+    def snapshot(self) -> list:
+        # Modules in discovery order, safe to iterate while frames keep coming
+        with self.__lock:
+            return list(self.__modules_by_uuid.values())
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__modules_by_id.clear()
+            self.__modules_by_uuid.clear()
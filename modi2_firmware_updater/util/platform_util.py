@@ -1,7 +1,8 @@
+import sys
 import time
 
 
-delay_option = False
+__timer_resolution = None
 
 
 def is_raspberrypi():
@@ -9,17 +10,78 @@ def is_raspberrypi():
     return platform.uname().node == 'raspberrypi'
 
 
-def set_delay_option(option):
-    global delay_option
-    delay_option = option
+def timer_resolution():
+    """Measured granularity of time.sleep on this machine, in seconds"""
+    global __timer_resolution
 
+    if __timer_resolution is None:
+        if sys.platform.startswith("win"):
+            # Ask for the 1 ms multimedia timer instead of the 15.6 ms default tick
+            import ctypes
+            ctypes.windll.winmm.timeBeginPeriod(1)
+        samples = []
+        for _ in range(5):
+            init_time = time.perf_counter()
+            time.sleep(0.0001)
+            samples.append(time.perf_counter() - init_time)
+        __timer_resolution = sorted(samples)[len(samples) // 2]
+    return __timer_resolution
 
-def delay(span):
-    global delay_option
 
-    if delay_option:
-        time.sleep(span)
-    else:
-        init_time = time.perf_counter()
-        while time.perf_counter() - init_time < span:
-            pass
+def sleep_until(deadline):
+    """Sleep until time.perf_counter() reaches deadline, without spinning
+
+    A remaining time below the timer resolution is not slept at all, the
+    caller's next deadline absorbs it.
+    """
+    remaining = deadline - time.perf_counter()
+    if remaining > timer_resolution() / 2:
+        time.sleep(remaining)
+
+
+class Pacer:
+    """Deadline based spacing of consecutive writes
+
+    Each wait advances a deadline by the requested interval and sleeps only
+    when the caller is ahead of it by more than the timer resolution, so
+    sub-millisecond spacing averages out over a few frames instead of being
+    busy-waited frame by frame. A caller falling behind by more than max_lag
+    restarts from the current time rather than bursting to catch up.
+    """
+
+    def __init__(self, max_lag=0.01):
+        self.max_lag = max_lag
+        self.deadline = None
+
+    def wait(self, interval):
+        now = time.perf_counter()
+        if self.deadline is None or now - self.deadline > self.max_lag:
+            self.deadline = now
+        self.deadline += interval
+        sleep_until(self.deadline)
+
+
+class PacingBudget:
+    """Pacing of burst firmware writes
+
+    A chunk of frames is given the time the serial link needs to carry its
+    bytes, and at least frame_interval per frame so the network module can
+    forward them on the CAN bus. The frame interval backs off when a page
+    fails its CRC check and creeps back down while pages go through.
+    """
+
+    def __init__(self, baudrate, frame_interval=0.0005, max_frame_interval=0.002):
+        self.baudrate = baudrate
+        self.min_frame_interval = frame_interval
+        self.max_frame_interval = max_frame_interval
+        self.frame_interval = frame_interval
+
+    def chunk_budget(self, byte_num, frame_num):
+        # 10 bits on the wire per byte (start, 8 data, stop)
+        return max(byte_num * 10 / self.baudrate, frame_num * self.frame_interval)
+
+    def page_passed(self):
+        self.frame_interval = max(self.frame_interval * 0.95, self.min_frame_interval)
+
+    def page_failed(self):
+        self.frame_interval = min(self.frame_interval * 2, self.max_frame_interval)
@@ -0,0 +1,106 @@
+import random
+import threading as th
+import time
+
+
+class RetryBudget:
+    """Consecutive failed attempts of one operation, bounded by its RetryPolicy
+
+    :param policy: RetryPolicy the budget is drawn from
+    :param operation: Name of the operation, as in RetryPolicy.BUDGETS
+    """
+
+    def __init__(self, policy, operation: str):
+        self.policy = policy
+        self.operation = operation
+        self.attempts = policy.budgets[operation][0]
+        self.failures = 0
+        # backoff to wait before the next attempt
+        self.delay = 0.0
+
+    def failed(self, sleep: bool = True) -> bool:
+        """Record a failed attempt
+
+        :param sleep: Sleep the backoff here, else the caller waits self.delay itself
+        :return: True if the operation may be attempted again, False once its budget is spent
+        """
+        self.failures += 1
+        if self.failures >= self.attempts:
+            self.delay = 0.0
+            self.policy.count(self.operation, "exhausted")
+            return False
+        self.delay = self.policy.backoff(self.operation, self.failures)
+        self.policy.count(self.operation, "retries")
+        if sleep and self.delay:
+            time.sleep(self.delay)
+        return True
+
+    def succeeded(self) -> None:
+        self.failures = 0
+        self.delay = 0.0
+        self.policy.count(self.operation, "successes")
+
+
+class RetryPolicy:
+    """Bounded retries with jittered exponential backoff, for every flash operation
+
+    Each operation gets a number of attempts in a row and the backoff before
+    its first retry, doubled on each further retry up to max_delay. The
+    backoff is shortened by up to jitter (a fraction of it) at random, so
+    modules failing together do not retry in lockstep.
+
+    :param budgets: Operation name to (attempts, base_delay), overriding BUDGETS
+    :param max_delay: Longest backoff, in seconds
+    :param jitter: Fraction of each backoff drawn at random
+    """
+
+    # Operation name to (attempts, base_delay)
+    BUDGETS = {
+        "erase": (3, 0.01),
+        "crc": (3, 0.01),
+        "end_flash": (3, 0.05),
+        "discovery": (8, 0.1),
+    }
+
+    def __init__(self, budgets: dict = None, max_delay: float = 0.8, jitter: float = 0.5):
+        self.budgets = dict(self.BUDGETS)
+        if budgets:
+            self.budgets.update(budgets)
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.counters = {operation: {"successes": 0, "retries": 0, "exhausted": 0} for operation in self.budgets}
+        self.__lock = th.Lock()
+
+    def budget(self, operation: str) -> RetryBudget:
+        return RetryBudget(self, operation)
+
+    def backoff(self, operation: str, failures: int) -> float:
+        delay = min(self.max_delay, self.budgets[operation][1] * 2 ** (failures - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def count(self, operation: str, counter: str) -> None:
+        with self.__lock:
+            self.counters[operation][counter] += 1
+
+    def call(self, operation: str, func, *args, exceptions: tuple = (), **kwargs):
+        """Call func until it returns a truthy value or the budget of operation is spent
+
+        :param exceptions: Exceptions of func counted as a failed attempt
+        :return: Last result of func, None if it raised
+        """
+        budget = self.budget(operation)
+        while True:
+            try:
+                result = func(*args, **kwargs)
+            except exceptions:
+                result = None
+            if result:
+                budget.succeeded()
+                return result
+            if not budget.failed():
+                return result
+
+    def snapshot(self) -> dict:
+        """Counters of each operation: successes, retries and exhausted budgets"""
+        with self.__lock:
+            return {operation: dict(counters) for operation, counters in self.counters.items()}